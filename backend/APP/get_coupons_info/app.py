@@ -1,12 +1,17 @@
-import json
 import os
 import logging
 
-from common import (common_const, utils)
+from common import (common_const, invocation, utils)
+from common.registry import LazyRegistry
 from validation.smart_register_param_check import SmartRegisterParamCheck
-from smart_register.smart_register_coupon_info import SmartRegisterCouponInfo
 
 LOGGER_LEVEL = os.environ.get("LOGGER_LEVEL")
+# レスポンスをブラウザ・CDNでキャッシュする秒数（0の場合は毎回ETagで再検証）
+CACHE_CONTROL_MAX_AGE_SECONDS = int(
+    os.environ.get("CACHE_CONTROL_MAX_AGE_SECONDS", 0))
+# キャッシュの有効期限後、古いレスポンスを返しつつ再検証する秒数
+CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS = int(
+    os.environ.get("CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS", 0))
 
 # ログ出力の設定
 logger = logging.getLogger()
@@ -15,10 +20,14 @@ if LOGGER_LEVEL == 'DEBUG':
 else:
     logger.setLevel(logging.INFO)
 
-# テーブル操作クラスの初期化
-coupon_info_table = SmartRegisterCouponInfo()
+# テーブル操作クラス（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'coupon_info_table',
+    'smart_register.smart_register_coupon_info:SmartRegisterCouponInfo')
 
 
+@invocation.handler
 def lambda_handler(event, context):
     """
     使用可能なクーポン情報を返す
@@ -49,13 +58,17 @@ def lambda_handler(event, context):
         return utils.create_error_response(error_msg_disp, status=400)  # noqa: E501
 
     try:
-        item_info = coupon_info_table.scan_not_deleted()
+        # ページ単位で書き込み、1ページ分のクーポン情報のみ保持する
+        body = utils.dumps_json_array(
+            resources.coupon_info_table.iter_not_deleted_pages())
     except Exception as e:
         logger.exception('Occur Exception: %s', e)
         return utils.create_error_response('Error')
 
-    response = utils.create_success_response(
-        json.dumps(item_info, default=utils.decimal_to_int,
-                   ensure_ascii=False))
+    response = utils.create_success_response(body)
     logger.debug('response: %s', response)
-    return response
+    response = utils.cache_response(
+        response, event, CACHE_CONTROL_MAX_AGE_SECONDS,
+        CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS)
+    # クーポン一覧は件数に応じて大きくなるため圧縮して返却する
+    return utils.compress_response(response, event)
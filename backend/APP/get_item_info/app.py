@@ -2,12 +2,17 @@ import json
 import os
 import logging
 
-from common import (common_const, utils)
+from common import (common_const, invocation, utils)
+from common.registry import LazyRegistry
 from validation.smart_register_param_check import SmartRegisterParamCheck
-from smart_register.smart_register_item_info import SmartRegisterItemInfo
-from smart_register.smart_register_coupon_info import SmartRegisterCouponInfo
 
 LOGGER_LEVEL = os.environ.get("LOGGER_LEVEL")
+# レスポンスをブラウザ・CDNでキャッシュする秒数（0の場合は毎回ETagで再検証）
+CACHE_CONTROL_MAX_AGE_SECONDS = int(
+    os.environ.get("CACHE_CONTROL_MAX_AGE_SECONDS", 0))
+# キャッシュの有効期限後、古いレスポンスを返しつつ再検証する秒数
+CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS = int(
+    os.environ.get("CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS", 0))
 
 # ログ出力の設定
 logger = logging.getLogger()
@@ -16,11 +21,34 @@ if LOGGER_LEVEL == 'DEBUG':
 else:
     logger.setLevel(logging.INFO)
 
-# テーブル操作クラスの初期化
-item_info_table = SmartRegisterItemInfo()
-coupon_info_table = SmartRegisterCouponInfo()
+# 商品情報として取得する属性
+ITEM_INFO_FIELDS = [
+    'itemName', 'itemPrice', 'imageUrl',
+    'couponId', 'discountRate', 'discountWay',
+]
+# 未登録の商品として返却する値
+ERROR_PRODUCT = {
+    'Name': 'ERROR',
+    'Price': 'ERROR',
+    'ImageUrl': 'ERROR'
+}
 
+# テーブル操作クラス・バーコードの事前チェック（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'item_info_table',
+    'smart_register.smart_register_item_info:SmartRegisterItemInfo')
+resources.register(
+    'coupon_info_table',
+    'smart_register.smart_register_coupon_info:SmartRegisterCouponInfo')
+# 読み取りミス・未登録のバーコードをテーブル参照前に判定する
+resources.register(
+    'barcode_prefilter',
+    'validation.barcode_filter:BarcodePrefilter.from_environment',
+    lambda: resources.item_info_table.scan_barcodes())
 
+
+@invocation.handler
 def lambda_handler(event, context):
     """
     読み取ったバーコードの商品情報を返す
@@ -52,8 +80,13 @@ def lambda_handler(event, context):
 
     barcode = params['barcode']
     logger.debug(barcode)
+    if reason := resources.barcode_prefilter.check(barcode):
+        logger.info('未登録のバーコードです: %s (%s)', barcode, reason)
+        return utils.create_success_response(
+            json.dumps(ERROR_PRODUCT, ensure_ascii=False))
     try:
-        item_info = item_info_table.get_item(barcode)
+        item_info = resources.item_info_table.get_item(
+            barcode, fields=ITEM_INFO_FIELDS)
         if item_info:
             target_product = {
                 'Name': item_info['itemName'],
@@ -62,17 +95,14 @@ def lambda_handler(event, context):
             }
             # クーポン保持している商品はクーポン情報を返却
             if ('couponId' in params) and params['couponId']:
-                coupon_info = coupon_info_table.get_item(item_info['couponId'])
+                coupon_info = resources.coupon_info_table.get_item(
+                    item_info['couponId'], fields=['couponId'])
                 if coupon_info:
                     target_product['discountRate'] = item_info['discountRate'] if 'discountRate' in item_info.keys() else None  # noqa: E501
                     target_product['discountWay'] = item_info['discountWay'] if 'discountWay' in item_info.keys() else None  # noqa: E501
         else:
             # 未登録データの場合はERRORを返す
-            target_product = {
-                'Name': 'ERROR',
-                'Price': 'ERROR',
-                'ImageUrl': 'ERROR'
-            }
+            target_product = ERROR_PRODUCT
     except Exception as e:
         logger.exception('Occur Exception: %s', e)
         return utils.create_error_response('Error')
@@ -81,4 +111,9 @@ def lambda_handler(event, context):
         json.dumps(target_product, default=utils.decimal_to_int,
                    ensure_ascii=False))
     logger.debug('response: %s', response)
-    return response
+    # 未登録の商品は、登録後すぐに取得できるようキャッシュしない
+    if target_product is ERROR_PRODUCT:
+        return response
+    return utils.cache_response(
+        response, event, CACHE_CONTROL_MAX_AGE_SECONDS,
+        CACHE_CONTROL_STALE_WHILE_REVALIDATE_SECONDS)
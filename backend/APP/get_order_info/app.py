@@ -2,14 +2,16 @@ import json
 import os
 import logging
 
-from common import (common_const, line, utils)
+from common import (common_const, invocation, line, utils)
+from common.registry import LazyRegistry
 from validation.smart_register_param_check import SmartRegisterParamCheck
-from smart_register.smart_register_order_info import SmartRegisterOrderInfo
 
 
 # 環境変数
 LIFF_CHANNEL_ID = int(os.environ.get("LIFF_CHANNEL_ID"))
 LOGGER_LEVEL = os.environ.get("LOGGER_LEVEL")
+# ページ取得時の既定の件数（limit未指定の場合）
+ORDER_PAGE_DEFAULT_LIMIT = int(os.environ.get("ORDER_PAGE_DEFAULT_LIMIT", 20))
 
 # ログ出力の設定
 logger = logging.getLogger()
@@ -18,10 +20,48 @@ if LOGGER_LEVEL == 'DEBUG':
 else:
     logger.setLevel(logging.INFO)
 
-# テーブル操作クラスの初期化
-order_info_table = SmartRegisterOrderInfo()
+# テーブル操作クラス（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'order_info_table',
+    'smart_register.smart_register_order_info:SmartRegisterOrderInfo')
 
 
+def get_order_page(params, fields, summary=False):
+    """
+    注文履歴を注文日時順に1ページ分取得する
+    Parameters
+    ----------
+        params : dict
+            リクエストパラメータ
+            limit : 取得件数（未指定の場合はORDER_PAGE_DEFAULT_LIMIT）
+            cursor : 前ページのnextCursor（未指定の場合は先頭から取得）
+            order : desc（新しい順、既定）/ asc（古い順）
+        fields : list
+            取得する属性名のリスト（Noneの場合は全属性）
+        summary : bool
+            注文履歴の要約を取得する場合はTrue
+    Returns
+    -------
+        page : dict
+            items : 注文情報のリスト
+            nextCursor : 次ページのカーソル（最終ページの場合はNone）
+    """
+    limit = int(params.get('limit', ORDER_PAGE_DEFAULT_LIMIT))
+    exclusive_start_key = (utils.decode_cursor(params['cursor'])
+                           if 'cursor' in params else None)
+    items, last_evaluated_key = (
+        resources.order_info_table.query_page_by_user(
+            params['userId'], limit, exclusive_start_key,
+            ascending=params.get('order') == 'asc', fields=fields,
+            summary=summary))
+    return {
+        'items': items,
+        'nextCursor': utils.encode_cursor(last_evaluated_key),
+    }
+
+
+@invocation.handler
 def lambda_handler(event, context):
     """
     ユーザーまたは注文IDをもとに購入履歴を取得する
@@ -62,19 +102,38 @@ def lambda_handler(event, context):
         logger.error(error_msg_disp)
         return utils.create_error_response(error_msg_disp, status=400)  # noqa: E501
 
+    # 取得する属性の指定（未指定の場合は注文履歴の既定の属性）
+    fields = params['fields'].split(',') if 'fields' in params else None
+    # 要約の場合は注文日時・金額・購入点数のみ返却し、
+    # 注文明細はレシート表示時にorderIdを指定して取得する
+    summary = params.get('summary') == 'true'
+
     # 注文履歴を取得
     try:
         if 'orderId' in params:
-            order_info = order_info_table.query_index_hash_range(
-                params['userId'], params['orderId'])
+            order_info = resources.order_info_table.query_index_hash_range(
+                params['userId'], params['orderId'], fields)
+            body = json.dumps(order_info, default=utils.decimal_to_int,
+                              ensure_ascii=False)
+        elif 'limit' in params or 'cursor' in params:
+            body = json.dumps(get_order_page(params, fields, summary),
+                              default=utils.decimal_to_int,
+                              ensure_ascii=False)
+        elif summary:
+            body = utils.dumps_json_array(
+                resources.order_info_table.iter_summary_pages(
+                    params['userId'], ascending=params.get('order') == 'asc',
+                    fields=fields))
         else:
-            order_info = order_info_table.query_index_hash(params['userId'])
+            # 全件の場合はページ単位で書き込み、1ページ分の注文情報のみ保持する
+            body = utils.dumps_json_array(
+                resources.order_info_table.iter_index_hash_pages(
+                    params['userId'], fields=fields))
 
     except Exception as e:
         logger.exception('Occur Exception: %s', e)
         return utils.create_error_response('Error')
 
-    response = utils.create_success_response(
-        json.dumps(order_info, default=utils.decimal_to_int,
-                   ensure_ascii=False))
-    return response
+    response = utils.create_success_response(body)
+    # 購入履歴は件数に応じて大きくなるため圧縮して返却する
+    return utils.compress_response(response, event)
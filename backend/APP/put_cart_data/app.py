@@ -2,21 +2,14 @@ import json
 import logging
 import os
 import uuid
-import math
-import requests
-import sys
-import time
-from decimal import Decimal
 from datetime import (datetime, timedelta)
 from dateutil.tz import gettz
 from botocore.exceptions import ClientError
 
-from common import (common_const, line, utils, flex_message)
+from common import (common_const, invocation, line, receipt_queue, utils)
+from common.pricing import calc_amount
+from common.registry import LazyRegistry
 from validation.smart_register_param_check import SmartRegisterParamCheck
-from smart_register.smart_register_item_info import SmartRegisterItemInfo
-from smart_register.smart_register_order_info import SmartRegisterOrderInfo
-from smart_register.smart_register_coupon_info import SmartRegisterCouponInfo
-from common.channel_access_token import ChannelAccessToken
 
 
 # 環境変数の取得
@@ -24,26 +17,24 @@ LIFF_CHANNEL_ID = int(os.environ.get("LIFF_CHANNEL_ID"))
 LIFF_URL = os.environ.get("LIFF_URL")
 DETAILS_PASS = os.environ.get("DETAILS_PASS")
 LOGGER_LEVEL = os.environ.get("LOGGER_LEVEL")
-# 定数の定義
-DISCOUNT_BY_PERCENTAGE = 1
-DISCOUNT_BY_PRICE = 2
 # ログ出力の設定
 logger = logging.getLogger()
 if LOGGER_LEVEL == 'DEBUG':
     logger.setLevel(logging.DEBUG)
 else:
     logger.setLevel(logging.INFO)
-# LINEリソースの宣言
-OA_CHANNEL_ID = os.getenv('OA_CHANNEL_ID', None)
-if OA_CHANNEL_ID is None:
-    logger.error('Specify CHANNEL_ID as environment variable.')
-    sys.exit(1)
 
-# テーブル操作クラスの初期化
-item_info_table = SmartRegisterItemInfo()
-order_info_table = SmartRegisterOrderInfo()
-coupon_info_table = SmartRegisterCouponInfo()
-accesstoken_table = ChannelAccessToken()
+# テーブル操作クラス・外部APIクライアント（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'item_info_table',
+    'smart_register.smart_register_item_info:SmartRegisterItemInfo')
+resources.register(
+    'order_info_table',
+    'smart_register.smart_register_order_info:SmartRegisterOrderInfo')
+resources.register(
+    'coupon_info_table',
+    'smart_register.smart_register_coupon_info:SmartRegisterCouponInfo')
 
 
 def create_payment_info(params, now):
@@ -64,13 +55,14 @@ def create_payment_info(params, now):
     """
     order_id = str(uuid.uuid4())
     user_id = params['userId']
-    order_items = get_order_item_info(params['items'])
+    coupon_infos = get_coupon_info(params)
+    order_items = get_order_item_info(params['items'], coupon_infos)
     amount_discount_way = None
     amount_discount_rate = None
     # クーポンがある場合は、クーポン情報を付与して合計金額を算出
     if 'couponId' in params :
         if params['couponId']:
-            amount_coupon_info = coupon_info_table.get_item(params['couponId'])
+            amount_coupon_info = coupon_infos[params['couponId']]
             amount_discount_way = amount_coupon_info['discountWay']
             amount_discount_rate = amount_coupon_info['discountRate']
     amount = calc_amount(order_items, amount_discount_way, amount_discount_rate)
@@ -91,18 +83,20 @@ def create_payment_info(params, now):
     }
     logger.debug('order_info: %s', order_info)
     try:
-        order_info_table.put_item(**order_info)
-        # ０円決済の場合はメッセージ送信
+        resources.order_info_table.put_item(**order_info)
+        # ０円決済の場合はレシート送信依頼
         if amount <= 0:
             msg_info = {'orderId': order_id,
                         'userId': user_id, 
                         'amount': amount}
-            send_messages(msg_info, now.strftime('%Y/%m/%d %H:%M:%S'))
+            receipt_queue.enqueue_receipt_safely(
+                msg_info, now.strftime('%Y/%m/%d %H:%M:%S'),
+                LIFF_URL + DETAILS_PASS + '?orderId=' + order_id)
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
             logger.error("ID[%s]は重複しています。", order_id)
             order_info['order_id'] = str(uuid.uuid4())
-            order_info_table.put_item(**order_info)
+            resources.order_info_table.put_item(**order_info)
         raise
 
     # 決済金額が０円の場合は、フロント側で動作制御できるようorderIdをNullで返却
@@ -110,76 +104,8 @@ def create_payment_info(params, now):
     return order_id
 
 
-def send_messages(order_info, datetime_now):
-    """
-    OAへメッセージを送信をする
-    Parameters
-    ----------
-        order_info:dict
-            該当ユーザーの注文情報
-        datetime_now:string
-            決済日時
-    Returns
-    -------
-        なし
-    """
-    # DBより短期チャネルアクセストークンを取得
-    channel_access_token = accesstoken_table.get_item(OA_CHANNEL_ID)
-    if channel_access_token is None:
-        logger.error(
-            'CHANNEL_ACCESS_TOKEN in Specified CHANNEL_ID: %s is not exist.',
-            OA_CHANNEL_ID)
-    else:
-        order_id = order_info['orderId']
-        details_url = LIFF_URL + DETAILS_PASS + '?orderId=' + order_id
-        flex_obj = flex_message.create_receipt(order_info, datetime_now, details_url)
-
-        line.send_push_message(
-            channel_access_token['channelAccessToken'],
-            flex_obj, order_info['userId'])
-
-
-def calc_amount(order_items, amount_discount_way=None, amount_discount_rate=None):
-    """
-    注文合計金額を算出する
-    割引計算は切り捨て処理を行う
-    Parameters
-    ----------
-    order_items : dict
-        追加する注文情報
-    amount_discount_way: int
-        合計金額に対するクーポンの割引種別
-    amount_discount_rate: int
-        合計金額に対するクーポンの割引率/額
-    Returns
-    -------
-    amount : decimal
-        注文合計金額
-    """
-    amount = 0
-    # 商品単位割引計算
-    for item in order_items:
-        price = item['itemPrice']
-        if 'discountWay' in item:
-            if item['discountWay'] == DISCOUNT_BY_PRICE:
-                price = price - item['discountRate']
-            elif item['discountWay'] == DISCOUNT_BY_PERCENTAGE:
-                price = float(price) * (1 - float(item['discountRate']) * 0.01)
-        amount = amount + float(price) * float(item['quantity'])
-    # 全体割引計算
-    if amount_discount_way:
-        if amount_discount_way == DISCOUNT_BY_PRICE:
-            amount = amount - float(amount_discount_rate)
-        elif amount_discount_way == DISCOUNT_BY_PERCENTAGE:
-            amount = float(amount) * (1 - float(amount_discount_rate) * 0.01)
-    amount = Decimal(math.floor(amount))
-    # 0以下の場合は０円とする
-    amount = 0 if amount <= 0 else amount
-    return amount
-
-
 def set_order_item(barcode, item_name, item_price, quantity, item_url,
-                   coupon_id=None):
+                   coupon_id=None, coupon_info=None):
     """
     DB登録の形式に1商品情報のデータセットする
 
@@ -197,6 +123,8 @@ def set_order_item(barcode, item_name, item_price, quantity, item_url,
         商品画像URL
     coupon_id : String
         クーポンID
+    coupon_info : dict
+        クーポン情報
 
     Returns
     -------
@@ -212,16 +140,38 @@ def set_order_item(barcode, item_name, item_price, quantity, item_url,
         'couponId': coupon_id,
     }
 
-    # 商品のクーポン情報を取得
+    # 商品のクーポン情報を設定
     if coupon_id:
-        coupon_info = coupon_info_table.get_item(coupon_id)
         order_item['discountWay'] = coupon_info['discountWay']
         order_item['discountRate'] = coupon_info['discountRate']
 
     return order_item
 
 
-def get_order_item_info(items):
+def get_coupon_info(params):
+    """
+    カート内の商品単位・合計金額のクーポン情報をまとめて取得する
+
+    Parameters
+    ----------
+    params : dict
+        postで送られてきたbodyの中身
+
+    Returns
+    -------
+    coupon_infos:dict
+        クーポンIDをキーとするクーポン情報
+    """
+    coupon_ids = [item['couponId'] for item in params['items']]
+    if 'couponId' in params:
+        coupon_ids.append(params['couponId'])
+
+    return resources.coupon_info_table.batch_get_items(
+        [coupon_id for coupon_id in coupon_ids if coupon_id],
+        fields=['discountWay', 'discountRate'])
+
+
+def get_order_item_info(items, coupon_infos):
     """
     barcodeを元に注文登録用の商品情報を取得する
 
@@ -229,6 +179,8 @@ def get_order_item_info(items):
     ----------
     item : list
         postで送られてきたbodyの中身
+    coupon_infos : dict
+        クーポンIDをキーとするクーポン情報
 
     Returns
     -------
@@ -236,12 +188,18 @@ def get_order_item_info(items):
         注文商品情報
     """
     order_items = []    # DBに登録する商品リスト
+    # カート内の商品情報を一括取得
+    item_infos = resources.item_info_table.batch_get_items(
+        [item['barcode'] for item in items],
+        fields=['itemName', 'itemPrice', 'imageUrl'])
     for item in items:
         barcode = item['barcode']
-        item_info = item_info_table.get_item(barcode)
+        item_info = item_infos[barcode]
+        coupon_id = item['couponId']
         order_item = set_order_item(
             barcode, item_info['itemName'], item_info['itemPrice'],
-            item['quantity'], item_info['imageUrl'], item['couponId']
+            item['quantity'], item_info['imageUrl'], coupon_id,
+            coupon_infos[coupon_id] if coupon_id else None
         )
 
         order_items.append(order_item)
@@ -251,7 +209,8 @@ def get_order_item_info(items):
 
 def update_payment_info(params, now):
     """
-    注文情報を更新する
+    未会計の注文情報を更新する
+    注文IDが未登録・会計済みの場合は新規登録する
 
     Parameters
     ----------
@@ -263,17 +222,18 @@ def update_payment_info(params, now):
     Returns
     -------
     string
-        更新したドキュメントのorderId
+        更新・登録したドキュメントのorderId
     """
     order_id = params['orderId']
     user_id = params['userId']
-    order_items = get_order_item_info(params['items'])
+    coupon_infos = get_coupon_info(params)
+    order_items = get_order_item_info(params['items'], coupon_infos)
     # クーポンがある場合は、クーポン情報を付与して合計金額を算出
     amount_discount_way = None
     amount_discount_rate = None
     if 'couponId' in params:
         if params['couponId']:
-            amount_coupon_info = coupon_info_table.get_item(params['couponId'])
+            amount_coupon_info = coupon_infos[params['couponId']]
             amount_discount_way = amount_coupon_info['discountWay']
             amount_discount_rate = amount_coupon_info['discountRate']
     amount = calc_amount(order_items, amount_discount_way, amount_discount_rate)
@@ -282,21 +242,22 @@ def update_payment_info(params, now):
         str(now.replace(hour=0, minute=0, second=0, microsecond=0) +
             timedelta(days=1)),
         '%Y-%m-%d %H:%M:%S%z').timestamp())
-    try:
-        order_info_table.update_item(order_id, order_items, amount, delete_day,
-                                     amount_discount_way, amount_discount_rate)
-        # ０円決済の場合はメッセージ送信
-        if amount <= 0:
-            msg_info = {'orderId': order_id,
-                        'userId': user_id, 
-                        'amount': amount}
-            send_messages(msg_info, now.strftime('%Y/%m/%d %H:%M:%S'))
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':  # noqa: E501
-            logger.error(
-                "会計済みか、注文IDが誤っています。[order_id: %s]",
-                order_id)
-        raise
+    upserted_order_id = resources.order_info_table.upsert_item(
+        order_id, user_id, order_items, amount,
+        amount_discount_way, amount_discount_rate, delete_day)
+    if upserted_order_id != order_id:
+        logger.info(
+            "会計済みか、注文IDが誤っているため新規登録しました。[order_id: %s]",
+            order_id)
+        order_id = upserted_order_id
+    # ０円決済の場合はレシート送信依頼
+    if amount <= 0:
+        msg_info = {'orderId': order_id,
+                    'userId': user_id,
+                    'amount': amount}
+        receipt_queue.enqueue_receipt_safely(
+            msg_info, now.strftime('%Y/%m/%d %H:%M:%S'),
+            LIFF_URL + DETAILS_PASS + '?orderId=' + order_id)
 
     # 決済金額が０円の場合は、フロント側で動作制御できるようorderIdをNullで返却
     order_id = None if amount <= 0 else order_id
@@ -320,14 +281,13 @@ def put_order(params):
     now = datetime.now(gettz('Asia/Tokyo'))
 
     if 'orderId' in params and params['orderId']:
-        # 注文IDが存在しない場合は新規登録とする
-        order_info = order_info_table.get_item(params['orderId'])
-        if order_info:
-            return update_payment_info(params, now)
+        # 存在確認は行わず、条件付き書き込みで更新・新規登録を判定する
+        return update_payment_info(params, now)
 
     return create_payment_info(params, now)
 
 
+@invocation.handler
 def lambda_handler(event, context):
     """
     注文情報を登録する
@@ -344,7 +304,7 @@ def lambda_handler(event, context):
     """
     # パラメータログ
     logger.info(event)
-    body = json.loads(event['body'])
+    body = json.loads(utils.get_request_body(event))
 
     if body is None:
         error_msg_display = common_const.const.MSG_ERROR_NOPARAM
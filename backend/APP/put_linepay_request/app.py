@@ -3,10 +3,9 @@ import os
 import logging
 
 
-from linepay import LinePayApi
-from common import (common_const, line, utils)
+from common import (common_const, invocation, line, utils)
+from common.registry import LazyRegistry
 from validation.smart_register_param_check import SmartRegisterParamCheck
-from smart_register.smart_register_order_info import SmartRegisterOrderInfo
 
 # 環境変数
 LIFF_CHANNEL_ID = int(os.environ.get("LIFF_CHANNEL_ID"))
@@ -24,8 +23,6 @@ if (os.environ.get("LINE_PAY_IS_SANDBOX") == 'True'
     LINE_PAY_IS_SANDBOX = True
 else:
     LINE_PAY_IS_SANDBOX = False
-api = LinePayApi(LINE_PAY_CHANNEL_ID,
-                 LINE_PAY_CHANNEL_SECRET, is_sandbox=LINE_PAY_IS_SANDBOX)
 
 # ログ出力の設定
 logger = logging.getLogger()
@@ -34,8 +31,17 @@ if LOGGER_LEVEL == 'DEBUG':
 else:
     logger.setLevel(logging.INFO)
 
-# AWSリソースの生成
-order_info_table = SmartRegisterOrderInfo()
+# テーブル操作クラス・外部APIクライアント（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'order_info_table',
+    'smart_register.smart_register_order_info:SmartRegisterOrderInfo')
+resources.register(
+    'line_pay_api',
+    'linepay:LinePayApi',
+    LINE_PAY_CHANNEL_ID,
+    LINE_PAY_CHANNEL_SECRET,
+    is_sandbox=LINE_PAY_IS_SANDBOX)
 
 
 def update_orderinfo(order_id):
@@ -49,9 +55,10 @@ def update_orderinfo(order_id):
     -------
         なし
     """
-    order_info_table.update_date(order_id)
+    resources.order_info_table.update_date(order_id)
 
 
+@invocation.handler
 def lambda_handler(event, context):
     """
     LINE Pay API(reserve)の通信結果を返す
@@ -68,7 +75,7 @@ def lambda_handler(event, context):
     """
     # パラメータログ
     logger.info(event)
-    req_body = json.loads(event['body'])
+    req_body = json.loads(utils.get_request_body(event))
 
     if req_body is None:
         error_msg_display = common_const.const.MSG_ERROR_NOPARAM
@@ -99,7 +106,8 @@ def lambda_handler(event, context):
 
     try:
         # 注文履歴から決済金額を取得
-        order_info = order_info_table.get_item(order_id)
+        order_info = resources.order_info_table.get_item(
+            order_id, fields=['amount'])
         amount = int(order_info['amount'])
         # LINE Pay API通信データを用意
         body = {
@@ -131,7 +139,7 @@ def lambda_handler(event, context):
                 }
             }
         }
-        api_response = api.request(body)
+        api_response = resources.line_pay_api.request(body)
 
     except Exception as e:
         logger.exception('Occur Exception: %s', e)
@@ -0,0 +1,132 @@
+import json
+import os
+import logging
+import sys
+
+from common import flex_message, invocation
+from common.registry import LazyRegistry
+
+# 環境変数
+LOGGER_LEVEL = os.environ.get("LOGGER_LEVEL")
+LINE_PAY_ORDER_INFO_DB = os.environ.get("LINE_PAY_ORDER_INFO_DB")
+CHANNEL_ACCESS_TOKEN_DB = os.environ.get("CHANNEL_ACCESS_TOKEN_DB")
+# 送信中の記録を中断とみなして引き継ぐまでの秒数
+# ※Lambdaのタイムアウトより長く、キューの可視性タイムアウトより短くします
+RECEIPT_CLAIM_TIMEOUT_SECONDS = int(
+    os.environ.get("RECEIPT_CLAIM_TIMEOUT_SECONDS", 60))
+
+# ログ出力の設定
+logger = logging.getLogger()
+if LOGGER_LEVEL == 'DEBUG':
+    logger.setLevel(logging.DEBUG)
+else:
+    logger.setLevel(logging.INFO)
+# LINEリソースの宣言
+OA_CHANNEL_ID = os.getenv('OA_CHANNEL_ID', None)
+if OA_CHANNEL_ID is None:
+    logger.error('Specify CHANNEL_ID as environment variable.')
+    sys.exit(1)
+
+# テーブル操作クラス・外部APIクライアント（初回使用時に生成）
+resources = LazyRegistry()
+resources.register(
+    'order_info_table',
+    'smart_register.smart_register_order_info:SmartRegisterOrderInfo')
+resources.register(
+    'token_provider',
+    'common.channel_access_token_provider:ChannelAccessTokenProvider',
+    OA_CHANNEL_ID)
+
+
+def send_receipt(message):
+    """
+    OAへレシートを送信をする
+    ※注文情報に送信中であることを記録してから送信し、成功後に送信済み日時を
+    ※記録するため、同じ注文のメッセージを複数回受信しても送信済みの場合は
+    ※送信しません
+    ※送信に失敗した場合は記録を削除し、例外を送出します（キューで再試行）
+    ※送信中にタイムアウトした場合も、RECEIPT_CLAIM_TIMEOUT_SECONDS経過後に
+    ※再試行で送信します
+    Parameters
+    ----------
+        message:dict
+            レシート送信依頼（common.receipt_queue.build_message）
+    Returns
+    -------
+        sent:bool
+            送信した場合はTrue、送信済みの場合はFalse
+    """
+    order_id = message['orderId']
+    # トークンが取得できない場合は送信済みにせず再試行する
+    if not resources.token_provider.get_token():
+        raise Exception(
+            'CHANNEL_ACCESS_TOKEN in Specified CHANNEL_ID: %s is not exist.'
+            % OA_CHANNEL_ID)
+    if not resources.order_info_table.claim_receipt(
+            order_id, RECEIPT_CLAIM_TIMEOUT_SECONDS):
+        order_info = resources.order_info_table.get_item(
+            order_id, ['orderId', 'receiptSentDateTime'])
+        if not order_info or 'receiptSentDateTime' in order_info:
+            logger.info('レシート送信済みのためスキップします: %s', order_id)
+            return False
+        # 他の処理が送信中の場合は、送信の完了・中断を待って再試行する
+        raise Exception('Receipt for order %s is being sent.' % order_id)
+
+    flex_obj = flex_message.create_receipt(
+        message, message['paidDateTime'], message['detailsUrl'])
+    try:
+        # 短期チャネルアクセストークンはメモリ上にキャッシュしたものを使用する
+        resources.token_provider.send_push_message(
+            flex_obj, message['userId'])
+    except Exception as e:
+        resources.order_info_table.release_receipt(order_id)
+        raise e
+    resources.order_info_table.complete_receipt(order_id)
+    return True
+
+
+def process_records(records):
+    """
+    レシート送信依頼をまとめて処理する
+    Parameters
+    ----------
+        records:list
+            SQSイベントのRecords（messageId, body）
+    Returns
+    -------
+        failures:list
+            処理に失敗したメッセージID
+    """
+    failures = []
+    for record in records:
+        try:
+            send_receipt(json.loads(record['body']))
+        except Exception as e:
+            logger.exception('レシート送信に失敗しました: %s %s',
+                             record['messageId'], e)
+            failures.append(record['messageId'])
+    return failures
+
+
+@invocation.handler
+def lambda_handler(event, context):
+    """
+    キューに登録されたレシート送信依頼を処理する
+    Parameters
+    ----------
+        event : dict
+            SQSイベント
+        context : dict
+            コンテキスト内容。
+    Returns
+    -------
+        response : dict
+            失敗したメッセージ（batchItemFailures）
+            ※失敗したメッセージのみキューに戻り、再試行されます
+    """
+    records = event.get('Records', [])
+    failures = process_records(records)
+    logger.info('receipts: %s processed, %s failed',
+                len(records) - len(failures), len(failures))
+    return {'batchItemFailures': [
+        {'itemIdentifier': message_id} for message_id in failures]}
@@ -2,23 +2,75 @@
 DynamoDB操作用基底モジュール
 
 """
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import queue
+import threading
+import time
+
+from aws import resources
+from aws.dynamodb import metrics, retry
 
 # ログ出力の設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# BatchGetItem 1リクエストあたりの最大キー数
+BATCH_GET_ITEM_MAX_KEYS = 100
+# UnprocessedKeys の再試行回数と初回待機秒数
+BATCH_GET_ITEM_MAX_RETRIES = 5
+BATCH_GET_ITEM_RETRY_BASE_SECONDS = 0.05
+# 並列スキャンの既定セグメント数（並列度）
+PARALLEL_SCAN_SEGMENTS = int(
+    os.environ.get('DYNAMODB_PARALLEL_SCAN_SEGMENTS', 4))
+
 
 class DynamoDB:
     """DynamoDB操作用基底クラス"""
-    __slots__ = ['_db', '_table_name']
+    __slots__ = ['_db', '_table_name', '_refresh_table']
 
     def __init__(self, table_name):
         """初期化メソッド"""
         self._table_name = table_name
-        self._db = boto3.resource('dynamodb')
+        self._db = resources.get_resource('dynamodb')
+        self._refresh_table = None
+
+    def _call(self, operation, **kwargs):
+        """
+        再試行ポリシーに従ってテーブル操作を実行する
+        ※計測が有効な場合は消費キャパシティと所要時間を記録します
+
+        Parameters
+        ----------
+        operation : callable
+            実行するテーブル操作（self._table.put_itemなど）
+        **kwargs
+            operationに渡すパラメータ
+
+        Returns
+        -------
+        response : dict
+            レスポンス情報
+
+        """
+        if not metrics.ENABLED:
+            return retry.call(operation, self._table_name, **kwargs)
+
+        kwargs.setdefault('ReturnConsumedCapacity', 'INDEXES')
+        response = None
+        start = time.perf_counter()
+        try:
+            response = retry.call(operation, self._table_name, **kwargs)
+        finally:
+            metrics.record(
+                self._table_name, metrics.find_caller(self, __file__),
+                kwargs.get('IndexName'),
+                getattr(operation, '__name__', ''), response,
+                time.perf_counter() - start)
+
+        return response
 
     def _put_item(self, item):
         """
@@ -36,7 +88,8 @@ class DynamoDB:
 
         """
         try:
-            response = self._table.put_item(
+            response = self._call(
+                self._table.put_item,
                 Item=self._replace_data_for_dynamodb(item))
         except Exception as e:
             raise e
@@ -65,11 +118,11 @@ class DynamoDB:
 
         """
         try:
-            response = self._table.update_item(Key=key,
-                                               UpdateExpression=expression,
-                                               ExpressionAttributeValues=self._replace_data_for_dynamodb(  # noqa: E501
-                                                   expression_value),
-                                               ReturnValues=return_value)
+            response = self._call(self._table.update_item, Key=key,
+                                  UpdateExpression=expression,
+                                  ExpressionAttributeValues=self._replace_data_for_dynamodb(  # noqa: E501
+                                      expression_value),
+                                  ReturnValues=return_value)
         except Exception as e:
             raise e
 
@@ -106,7 +159,8 @@ class DynamoDB:
 
         """
         try:
-            response = self._table.update_item(
+            response = self._call(
+                self._table.update_item,
                 Key=key,
                 UpdateExpression=update_expression,
                 ConditionExpression=condition_expression,
@@ -136,13 +190,48 @@ class DynamoDB:
 
         """
         try:
-            response = self._table.delete_item(Key=key)
+            response = self._call(self._table.delete_item, Key=key)
         except Exception as e:
             raise e
 
         return response
 
-    def _get_item(self, key):
+    def _build_projection(self, fields):
+        """
+        取得する属性名のリストからProjectionExpressionを生成する
+        ※予約語（item等）に対応するため、属性名はすべてプレースホルダーに置換します
+        ※「item[0].itemName」のようなネストした属性も指定できます
+
+        Parameters
+        ----------
+        fields : list
+            取得する属性名のリスト
+
+        Returns
+        -------
+        projection_kwargs : dict
+            ProjectionExpressionとExpressionAttributeNames
+
+        """
+        names = {}
+        placeholders = {}
+        paths = []
+        for field in fields:
+            path = []
+            for part in field.split('.'):
+                name, bracket, index = part.partition('[')
+                if name not in placeholders:
+                    placeholders[name] = '#pj%d' % len(placeholders)
+                    names[placeholders[name]] = name
+                path.append(placeholders[name] + bracket + index)
+            paths.append('.'.join(path))
+
+        return {
+            'ProjectionExpression': ', '.join(paths),
+            'ExpressionAttributeNames': names,
+        }
+
+    def _get_item(self, key, fields=None):
         """
         アイテムを取得する
 
@@ -150,6 +239,8 @@ class DynamoDB:
         ----------
         key : dict
             取得するアイテムのキー
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -157,13 +248,170 @@ class DynamoDB:
             レスポンス情報
 
         """
+        get_kwargs = self._build_projection(fields) if fields else {}
         try:
-            response = self._table.get_item(Key=key)
+            response = self._call(
+                self._table.get_item, Key=key, **get_kwargs)
         except Exception as e:
             raise e
 
         return response.get('Item', {})
 
+    def _batch_get_item(self, key_name, key_values, fields=None):
+        """
+        BatchGetItemで複数アイテムを一括取得する
+        ※重複キーは除外し、100件ずつに分割してリクエストします
+        ※UnprocessedKeysは待機時間を延ばしながら再試行します
+
+        Parameters
+        ----------
+        key_name : str
+            パーティションキー名
+        key_values : list
+            取得するアイテムのキーの値のリスト
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+            キー属性は自動的に追加されます
+
+        Returns
+        -------
+        items : dict
+            キーの値をキー、アイテムを値とする辞書
+            存在しないアイテムは含まれない
+
+        """
+        # 順序を保ったまま重複を除外する
+        unique_values = list(dict.fromkeys(
+            value for value in key_values if value is not None))
+        projection_kwargs = {}
+        if fields:
+            projection_kwargs = self._build_projection(
+                [key_name] + [field for field in fields if field != key_name])
+        items = {}
+        for i in range(0, len(unique_values), BATCH_GET_ITEM_MAX_KEYS):
+            chunk = unique_values[i:i + BATCH_GET_ITEM_MAX_KEYS]
+            request_items = {
+                self._table_name: {
+                    'Keys': [{key_name: value} for value in chunk],
+                    **projection_kwargs,
+                }
+            }
+            retry_count = 0
+            while request_items:
+                try:
+                    response = self._call(
+                        self._db.batch_get_item, RequestItems=request_items)
+                except Exception as e:
+                    raise e
+
+                for item in response.get(
+                        'Responses', {}).get(self._table_name, []):
+                    items[item[key_name]] = item
+
+                request_items = response.get('UnprocessedKeys')
+                if not request_items:
+                    break
+                if retry_count >= BATCH_GET_ITEM_MAX_RETRIES:
+                    raise Exception(
+                        'UnprocessedKeys remain after %d retries: %s'
+                        % (retry_count, self._table_name))
+                retry.record_throttle(self._table_name)
+                time.sleep(
+                    BATCH_GET_ITEM_RETRY_BASE_SECONDS * (2 ** retry_count))
+                retry_count += 1
+
+        return items
+
+    def _paginate(self, operation, page_size=None, max_items=None,
+                  exclusive_start_key=None, **kwargs):
+        """
+        LastEvaluatedKeyをたどり、レスポンスをページ単位で順次取得する
+        ※次のページは前のページを消費した時点で取得します
+
+        Parameters
+        ----------
+        operation : callable
+            実行するテーブル操作（self._table.query, self._table.scan）
+        page_size : int, optional
+            1ページあたりの最大評価件数（Limit）, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        exclusive_start_key : dict, optional
+            取得を開始するキー, by default None
+        **kwargs
+            operationに渡すパラメータ
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報
+
+        """
+        remaining = max_items
+        if exclusive_start_key:
+            kwargs['ExclusiveStartKey'] = exclusive_start_key
+        while remaining is None or remaining > 0:
+            limits = [limit for limit in (page_size, remaining) if limit]
+            if limits:
+                kwargs['Limit'] = min(limits)
+            try:
+                response = self._call(operation, **kwargs)
+            except Exception as e:
+                raise e
+
+            yield response
+
+            if remaining is not None:
+                remaining -= response.get('Count', 0)
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key:
+                return
+            kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    def _iter_items(self, pages):
+        """
+        ページ単位のレスポンスからアイテムを1件ずつ取り出す
+
+        Parameters
+        ----------
+        pages : iterator
+            _paginateで取得したレスポンスのイテレータ
+
+        Yields
+        -------
+        item : dict
+            アイテム
+
+        """
+        for page in pages:
+            yield from page.get('Items', [])
+
+    def _query_iter(self, key, value, page_size=None, max_items=None):
+        """
+        queryメソッドを使用してアイテムを1件ずつ取得する
+
+        Parameters
+        ----------
+        key : str
+            キー名
+        value : object
+            検索する値
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+
+        Yields
+        -------
+        item : dict
+            対象アイテム
+
+        """
+        pages = self._paginate(
+            self._table.query, page_size, max_items,
+            KeyConditionExpression=Key(key).eq(value))
+        return self._iter_items(pages)
+
     def _query(self, key, value):
         """
         queryメソッドを使用してアイテムを取得する
@@ -179,16 +427,82 @@ class DynamoDB:
             対象アイテムのリスト
 
         """
-        try:
-            response = self._table.query(
-                KeyConditionExpression=Key(key).eq(value)
-            )
-        except Exception as e:
-            raise e
+        return list(self._query_iter(key, value))
+
+    def _query_index_pages(self, index, expression, expression_value={},
+                           page_size=None, max_items=None,
+                           exclusive_start_key=None, fields=None,
+                           scan_index_forward=True):
+        """
+        indexからアイテムをページ単位で取得する
 
-        return response['Items']
+        Parameters
+        ----------
+        index : str
+            index名
+        expression : str
+            検索対象の式
+        expression_value : dict
+            expression内で使用する変数名と値
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        exclusive_start_key : dict, optional
+            取得を開始するキー, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+        scan_index_forward : bool, optional
+            ソートキーの昇順の場合はTrue、降順の場合はFalse, by default True
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報
 
-    def _query_index(self, index, expression, expression_value={}):
+        """
+        query_kwargs = self._build_projection(fields) if fields else {}
+        return self._paginate(
+            self._table.query, page_size, max_items, exclusive_start_key,
+            IndexName=index,
+            KeyConditionExpression=expression,
+            ExpressionAttributeValues=self._replace_data_for_dynamodb(
+                expression_value),
+            ScanIndexForward=scan_index_forward,
+            **query_kwargs)
+
+    def _query_index_iter(self, index, expression, expression_value={},
+                          page_size=None, max_items=None, fields=None):
+        """
+        indexからアイテムを1件ずつ取得する
+
+        Parameters
+        ----------
+        index : str
+            index名
+        expression : str
+            検索対象の式
+        expression_value : dict
+            expression内で使用する変数名と値
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Yields
+        -------
+        item : dict
+            検索結果
+
+        """
+        return self._iter_items(self._query_index_pages(
+            index, expression, expression_value, page_size, max_items,
+            fields=fields))
+
+    def _query_index(self, index, expression, expression_value={},
+                     fields=None):
         """
         indexからアイテムを取得する
 
@@ -200,6 +514,8 @@ class DynamoDB:
             検索対象の式
         expression_value : dict
             expression内で使用する変数名と値
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -207,19 +523,214 @@ class DynamoDB:
             検索結果
 
         """
+        return list(self._query_index_iter(
+            index, expression, expression_value, fields=fields))
+
+    def _scan_pages(self, key=None, value=None, page_size=None,
+                    max_items=None, fields=None, **scan_kwargs):
+        """
+        scanメソッドを使用してページ単位でデータ取得
+
+        Parameters
+        ----------
+        key : str, optional
+            キー名, by default None
+        value : object, optional
+            検索する値, by default None
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+        **scan_kwargs
+            scanに渡すその他のパラメータ
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報
+
+        """
+        if value is not None:
+            scan_kwargs['FilterExpression'] = Attr(key).eq(value)
+        if fields:
+            scan_kwargs.update(self._build_projection(fields))
+
+        return self._paginate(
+            self._table.scan, page_size, max_items, **scan_kwargs)
+
+    def _scan_iter(self, key=None, value=None, page_size=None,
+                   max_items=None, fields=None):
+        """
+        scanメソッドを使用してデータを1件ずつ取得
+
+        Parameters
+        ----------
+        key : str, optional
+            キー名, by default None
+        value : object, optional
+            検索する値, by default None
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Yields
+        -------
+        item : dict
+            対象アイテム
+
+        """
+        return self._iter_items(
+            self._scan_pages(key, value, page_size, max_items, fields))
+
+    def _segment_table(self):
+        """
+        並列スキャンのスレッドで使用するテーブルを生成する
+        ※boto3のリソースはスレッドセーフではないため、スレッドごとのリソースを使用します
+
+        Returns
+        -------
+        table : dynamodb.Table
+            テーブルオブジェクト
+
+        """
+        return resources.get_thread_resource(
+            'dynamodb').Table(self._table_name)
+
+    def _snapshot_table(self):
+        """
+        スナップショット（SnapshotCache）の取得で使用するテーブルを取得する
+        ※メインスレッドでは共有のテーブルを使用し、裏での再取得スレッドでは
+        ※初回に生成した再取得専用のテーブルを使い続けます
+        ※SnapshotCacheは取得を同時に1スレッドでしか実行しないため、
+        ※再取得専用のテーブルが複数のスレッドから同時に使用されることはありません
+
+        Returns
+        -------
+        table : dynamodb.Table
+            テーブルオブジェクト
+
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self._db.Table(self._table_name)
+        if self._refresh_table is None:
+            self._refresh_table = resources.create_resource(
+                'dynamodb').Table(self._table_name)
+        return self._refresh_table
+
+    def _parallel_scan_pages(self, key=None, value=None, total_segments=None,
+                             max_workers=None, page_size=None, **scan_kwargs):
+        """
+        Segment/TotalSegmentsで分割したscanをスレッドプールで並列実行し、
+        取得できたページから順次返却する
+
+        Parameters
+        ----------
+        key : str, optional
+            キー名, by default None
+        value : object, optional
+            検索する値, by default None
+        total_segments : int, optional
+            分割数, by default PARALLEL_SCAN_SEGMENTS
+        max_workers : int, optional
+            スレッド数, by default total_segmentsと同数
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        **scan_kwargs
+            scanに渡すその他のパラメータ
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報（セグメント間の順序は不定）
+
+        """
+        total_segments = total_segments or PARALLEL_SCAN_SEGMENTS
+        if value is not None:
+            scan_kwargs['FilterExpression'] = Attr(key).eq(value)
+        if total_segments <= 1:
+            yield from self._paginate(
+                self._table.scan, page_size, **scan_kwargs)
+            return
+
+        # 未消費のページを溜め込みすぎないよう上限を設ける
+        pages = queue.Queue(maxsize=total_segments * 2)
+        stop = threading.Event()
+        segment_done = object()
+
+        def put(obj):
+            while not stop.is_set():
+                try:
+                    pages.put(obj, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan_segment(segment):
+            try:
+                table = self._segment_table()
+                for page in self._paginate(
+                        table.scan, page_size, Segment=segment,
+                        TotalSegments=total_segments, **scan_kwargs):
+                    if not put(page):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(segment_done)
+
+        executor = ThreadPoolExecutor(
+            max_workers=max_workers or total_segments)
         try:
-            response = self._table.query(
-                IndexName=index,
-                KeyConditionExpression=expression,
-                ExpressionAttributeValues=self._replace_data_for_dynamodb(
-                    expression_value),
-            )
-        except Exception as e:
-            raise e
+            for segment in range(total_segments):
+                executor.submit(scan_segment, segment)
+            finished = 0
+            while finished < total_segments:
+                page = pages.get()
+                if page is segment_done:
+                    finished += 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            # 途中で打ち切られた場合も各スレッドを停止させる
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def _parallel_scan_iter(self, key=None, value=None, total_segments=None,
+                            max_workers=None, page_size=None):
+        """
+        並列scanでデータを1件ずつ取得
 
-        return response['Items']
+        Parameters
+        ----------
+        key : str, optional
+            キー名, by default None
+        value : object, optional
+            検索する値, by default None
+        total_segments : int, optional
+            分割数, by default PARALLEL_SCAN_SEGMENTS
+        max_workers : int, optional
+            スレッド数, by default total_segmentsと同数
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+
+        Yields
+        -------
+        item : dict
+            対象アイテム（順序は不定）
 
-    def _scan(self, key, value=None):
+        """
+        return self._iter_items(self._parallel_scan_pages(
+            key, value, total_segments, max_workers, page_size))
+
+    def _scan(self, key, value=None, total_segments=None):
         """
         scanメソッドを使用してデータ取得
 
@@ -229,6 +740,8 @@ class DynamoDB:
             キー名
         value : object, optional
             検索する値, by default None
+        total_segments : int, optional
+            指定した場合は指定数のセグメントで並列scanする, by default None
 
         Returns
         -------
@@ -237,33 +750,31 @@ class DynamoDB:
 
 
         """
-        scan_kwargs = {}
-        if value is not None:
-            scan_kwargs['FilterExpression'] = Attr(key).eq(value)
-
-        try:
-            response = self._table.scan(**scan_kwargs)
-        except Exception as e:
-            raise e
+        if total_segments:
+            return list(self._parallel_scan_iter(key, value, total_segments))
+        return list(self._scan_iter(key, value))
 
-        return response['Items']
-
-    def _get_table_size(self):
+    def _get_table_size(self, total_segments=None):
         """
         アイテム数を取得する
 
+        Parameters
+        ----------
+        total_segments : int, optional
+            指定した場合は指定数のセグメントで並列scanする, by default None
+
         Returns
         -------
         count : int
             テーブルのアイテム数
 
         """
-        try:
-            response = self._table.scan(Select='COUNT')
-        except Exception as e:
-            raise e
-
-        return response.get('Count', 0)
+        if total_segments:
+            pages = self._parallel_scan_pages(
+                total_segments=total_segments, Select='COUNT')
+        else:
+            pages = self._scan_pages(Select='COUNT')
+        return sum(page.get('Count', 0) for page in pages)
 
     def _replace_data_for_dynamodb(self, value: dict):
         return value
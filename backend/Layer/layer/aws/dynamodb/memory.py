@@ -0,0 +1,1105 @@
+"""
+DynamoDBインメモリ実装モジュール
+※テスト・ベンチマーク用に、boto3のDynamoDBリソース（Table）と同じ呼び出し方で
+※プロセス内のメモリ上のテーブルを操作します
+
+使用例
+-------
+from aws import resources
+from aws.dynamodb.memory import MemoryDynamoDB
+
+db = MemoryDynamoDB(latency=0.005)
+db.create_smart_register_tables()
+db.load_seed_data('backend/APP/dynamodb_data')
+resources.register_resource('dynamodb', db)
+# 以降に生成したテーブル操作クラスはインメモリのテーブルを使用する
+
+環境変数 DYNAMODB_BACKEND=memory を指定した場合も、aws.resources が
+本モジュールのリソースを生成します（DYNAMODB_MEMORY_SEED_DIR で初期データを指定）。
+"""
+import copy
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from botocore.exceptions import ClientError
+
+# 初期データのディレクトリ名と、テーブル名を保持する環境変数の対応
+SEED_DIRECTORIES = {
+    'SmaRegiItemInfo': 'LINE_PAY_ITEM_INFO_DB',
+    'SmaRegiCouponInfo': 'LINE_PAY_COUPON_INFO_DB',
+    'SmaRegiOrderInfo': 'LINE_PAY_ORDER_INFO_DB',
+    'ChannelAccessToken': 'CHANNEL_ACCESS_TOKEN_DB',
+}
+BATCH_GET_ITEM_MAX_KEYS = 100
+
+_MISSING = object()
+
+
+def _client_error(code, message, operation_name):
+    return ClientError(
+        {'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+def _validation_error(message, operation_name=''):
+    return _client_error('ValidationException', message, operation_name)
+
+
+def _normalize(value):
+    """boto3のシリアライズに合わせて値を変換する（数値はDecimal型）"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        raise TypeError(
+            'Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (str, bytes, bytearray)):
+        return value
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {_normalize(v) for v in value}
+    raise TypeError('Unsupported type "%s" for value "%s"'
+                    % (type(value), value))
+
+
+def _sort_value(value):
+    # 型の異なる値を比較できるよう、型の順序を先頭に付与する
+    if isinstance(value, Decimal):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    if isinstance(value, (bytes, bytearray)):
+        return (2, bytes(value))
+    return (3, str(value))
+
+
+# ---------------------------------------------------------------------------
+# 式の解析
+# ---------------------------------------------------------------------------
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<number>\d+)
+    |(?P<name>\#[A-Za-z0-9_]+)
+    |(?P<value>:[A-Za-z0-9_]+)
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op><>|<=|>=|=|<|>|\(|\)|\[|\]|,|\.|\+|-)
+    )''', re.VERBOSE)
+_UPDATE_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise _validation_error(
+                'Invalid expression: %s' % expression)
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+def _get_path(item, path):
+    value = item
+    for kind, key in path:
+        if kind == 'attr':
+            if not isinstance(value, dict) or key not in value:
+                return _MISSING
+        else:
+            if not isinstance(value, list) or key >= len(value):
+                return _MISSING
+        value = value[key]
+    return value
+
+
+def _set_path(item, path, value):
+    target = item
+    for kind, key in path[:-1]:
+        target = target[key]
+    kind, key = path[-1]
+    if kind == 'index' and key >= len(target):
+        target.append(value)
+    else:
+        target[key] = value
+
+
+def _remove_path(item, path):
+    target = _get_path(item, path[:-1]) if len(path) > 1 else item
+    if target is _MISSING:
+        return
+    kind, key = path[-1]
+    if kind == 'attr' and isinstance(target, dict):
+        target.pop(key, None)
+    elif kind == 'index' and isinstance(target, list) and key < len(target):
+        del target[key]
+
+
+def _compare(operator, left, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == '<>'
+    if operator == '=':
+        return type(left) is type(right) and left == right
+    if operator == '<>':
+        return not (type(left) is type(right) and left == right)
+    if type(left) is not type(right) or isinstance(left, (dict, list, bool)):
+        return False
+    return {
+        '<': left < right,
+        '<=': left <= right,
+        '>': left > right,
+        '>=': left >= right,
+    }[operator]
+
+
+def _type_name(value):
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, Decimal):
+        return 'N'
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, set):
+        sample = next(iter(value), '')
+        return {str: 'SS', Decimal: 'NS'}.get(type(sample), 'BS')
+    return ''
+
+
+class _Parser:
+    """条件式・更新式・射影式の解析クラス"""
+
+    def __init__(self, expression, names=None, values=None):
+        self._tokens = _tokenize(expression)
+        self._position = 0
+        self._names = names or {}
+        self._values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+
+    # ---- トークン操作 ----
+    def _peek(self, offset=0):
+        index = self._position + offset
+        if index < len(self._tokens):
+            return self._tokens[index]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self._position += 1
+        return token
+
+    def _expect(self, text):
+        kind, token = self._next()
+        if token is None or token.upper() != text:
+            raise _validation_error(
+                'Invalid expression: expected %s, got %s' % (text, token))
+
+    def _is_keyword(self, text, offset=0):
+        kind, token = self._peek(offset)
+        return kind == 'ident' and token.upper() == text
+
+    def _at_end(self):
+        return self._position >= len(self._tokens)
+
+    # ---- パス・値 ----
+    def _name(self, token):
+        if token.startswith('#'):
+            if token not in self._names:
+                raise _validation_error(
+                    'An expression attribute name used in the document '
+                    'path is not defined; attribute name: %s' % token)
+            self.used_names.add(token)
+            return self._names[token]
+        return token
+
+    def path(self):
+        kind, token = self._next()
+        if kind not in ('name', 'ident'):
+            raise _validation_error('Invalid document path: %s' % token)
+        path = [('attr', self._name(token))]
+        while True:
+            kind, token = self._peek()
+            if token == '.':
+                self._next()
+                kind, token = self._next()
+                path.append(('attr', self._name(token)))
+            elif token == '[':
+                self._next()
+                kind, token = self._next()
+                path.append(('index', int(token)))
+                self._expect(']')
+            else:
+                return path
+
+    def _value(self, token):
+        if token not in self._values:
+            raise _validation_error(
+                'An expression attribute value used in expression is not '
+                'defined; attribute value: %s' % token)
+        self.used_values.add(token)
+        return self._values[token]
+
+    def operand(self):
+        kind, token = self._peek()
+        if kind == 'value':
+            self._next()
+            value = self._value(token)
+            return lambda item: value
+        if kind == 'ident' and token.lower() == 'size' \
+                and self._peek(1)[1] == '(':
+            self._next()
+            self._expect('(')
+            path = self.path()
+            self._expect(')')
+
+            def size(item):
+                value = _get_path(item, path)
+                if value is _MISSING or isinstance(value, (bool, Decimal)) \
+                        or value is None:
+                    return _MISSING
+                return Decimal(len(value))
+            return size
+        path = self.path()
+        return lambda item: _get_path(item, path)
+
+    # ---- 条件式 ----
+    def condition(self):
+        condition = self._or()
+        if not self._at_end():
+            raise _validation_error(
+                'Invalid expression: unexpected token %s' % self._peek()[1])
+        return condition
+
+    def _or(self):
+        left = self._and()
+        while self._is_keyword('OR'):
+            self._next()
+            right = self._and()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def _and(self):
+        left = self._not()
+        while self._is_keyword('AND'):
+            self._next()
+            right = self._not()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def _not(self):
+        if self._is_keyword('NOT'):
+            self._next()
+            inner = self._not()
+            return lambda item: not inner(item)
+        return self._primary()
+
+    def _primary(self):
+        kind, token = self._peek()
+        if token == '(':
+            self._next()
+            inner = self._or()
+            self._expect(')')
+            return inner
+        if kind == 'ident' and self._peek(1)[1] == '(' \
+                and token.lower() != 'size':
+            return self._function()
+
+        left = self.operand()
+        kind, token = self._peek()
+        if token in ('=', '<>', '<', '<=', '>', '>='):
+            self._next()
+            right = self.operand()
+            return lambda item: _compare(token, left(item), right(item))
+        if self._is_keyword('BETWEEN'):
+            self._next()
+            low = self.operand()
+            self._expect('AND')
+            high = self.operand()
+            return lambda item: (_compare('>=', left(item), low(item))
+                                 and _compare('<=', left(item), high(item)))
+        if self._is_keyword('IN'):
+            self._next()
+            self._expect('(')
+            candidates = [self.operand()]
+            while self._peek()[1] == ',':
+                self._next()
+                candidates.append(self.operand())
+            self._expect(')')
+            return lambda item: any(
+                _compare('=', left(item), candidate(item))
+                for candidate in candidates)
+        raise _validation_error('Invalid condition near %s' % token)
+
+    def _function(self):
+        kind, token = self._next()
+        function = token.lower()
+        self._expect('(')
+        if function in ('attribute_exists', 'attribute_not_exists'):
+            path = self.path()
+            self._expect(')')
+            exists = function == 'attribute_exists'
+            return lambda item: (_get_path(item, path) is not _MISSING) \
+                == exists
+        if function == 'attribute_type':
+            path = self.path()
+            self._expect(',')
+            type_operand = self.operand()
+            self._expect(')')
+            return lambda item: _type_name(
+                _get_path(item, path)) == type_operand(item)
+        if function in ('begins_with', 'contains'):
+            path = self.path()
+            self._expect(',')
+            operand = self.operand()
+            self._expect(')')
+
+            def evaluate(item):
+                value = _get_path(item, path)
+                target = operand(item)
+                if value is _MISSING or target is _MISSING:
+                    return False
+                if function == 'begins_with':
+                    return isinstance(value, str) \
+                        and isinstance(target, str) \
+                        and value.startswith(target)
+                if isinstance(value, str):
+                    return isinstance(target, str) and target in value
+                if isinstance(value, (list, set)):
+                    return target in value
+                return False
+            return evaluate
+        raise _validation_error('Invalid function name: %s' % token)
+
+    # ---- 射影式 ----
+    def projection(self):
+        paths = [self.path()]
+        while self._peek()[1] == ',':
+            self._next()
+            paths.append(self.path())
+        return paths
+
+    # ---- 更新式 ----
+    def update(self):
+        actions = []
+        while not self._at_end():
+            kind, token = self._next()
+            clause = (token or '').upper()
+            if kind != 'ident' or clause not in _UPDATE_CLAUSES:
+                raise _validation_error(
+                    'Invalid UpdateExpression: %s' % token)
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self._expect('=')
+                    actions.append((clause, path, self._set_value()))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if self._peek()[1] != ',':
+                    break
+                self._next()
+        return actions
+
+    def _set_value(self):
+        left = self._set_operand()
+        kind, token = self._peek()
+        if token in ('+', '-'):
+            self._next()
+            right = self._set_operand()
+
+            def arithmetic(item):
+                a, b = left(item), right(item)
+                if not isinstance(a, Decimal) or not isinstance(b, Decimal):
+                    raise _validation_error(
+                        'An operand in the update expression has an '
+                        'incorrect data type', 'UpdateItem')
+                return a + b if token == '+' else a - b
+            return arithmetic
+        return left
+
+    def _set_operand(self):
+        kind, token = self._peek()
+        if kind == 'ident' and self._peek(1)[1] == '(':
+            function = token.lower()
+            self._next()
+            self._expect('(')
+            if function == 'if_not_exists':
+                path = self.path()
+                self._expect(',')
+                default = self._set_value()
+                self._expect(')')
+
+                def if_not_exists(item):
+                    value = _get_path(item, path)
+                    return default(item) if value is _MISSING else value
+                return if_not_exists
+            if function == 'list_append':
+                first = self._set_value()
+                self._expect(',')
+                second = self._set_value()
+                self._expect(')')
+                return lambda item: list(first(item)) + list(second(item))
+            raise _validation_error('Invalid function name: %s' % token)
+        operand = self.operand()
+
+        def value(item):
+            result = operand(item)
+            if result is _MISSING:
+                raise _validation_error(
+                    'The provided expression refers to an attribute that '
+                    'does not exist in the item', 'UpdateItem')
+            return result
+        return value
+
+
+def _build(expression, names, values, is_key_condition=False):
+    """boto3の条件オブジェクトを文字列の式に変換する"""
+    if not isinstance(expression, ConditionBase):
+        return expression, names, values
+    built = ConditionExpressionBuilder().build_expression(
+        expression, is_key_condition=is_key_condition)
+    names = dict(names or {}, **built.attribute_name_placeholders)
+    values = dict(values or {}, **{
+        k: _normalize(v)
+        for k, v in built.attribute_value_placeholders.items()})
+    return built.condition_expression, names, values
+
+
+def _project(item, paths):
+    result = {}
+    for path in paths:
+        value = _get_path(item, path)
+        if value is _MISSING:
+            continue
+        target = result
+        source = item
+        for index, (kind, key) in enumerate(path):
+            source = source[key]
+            if index == len(path) - 1:
+                if isinstance(target, list):
+                    target.append(copy.deepcopy(source))
+                else:
+                    target[key] = copy.deepcopy(source)
+            else:
+                child = {} if isinstance(source, dict) else []
+                if isinstance(target, list):
+                    target.append(child)
+                    target = child
+                else:
+                    target = target.setdefault(key, child)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# テーブル・リソース
+# ---------------------------------------------------------------------------
+class MemoryTable:
+    """boto3のDynamoDB.Table互換のインメモリテーブル"""
+
+    def __init__(self, db, name, hash_key, range_key=None, indexes=None):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        db : MemoryDynamoDB
+            所属するリソース
+        name : str
+            テーブル名
+        hash_key : str
+            パーティションキー名
+        range_key : str, optional
+            ソートキー名, by default None
+        indexes : dict, optional
+            インデックス名をキー、(パーティションキー名, ソートキー名, 射影)を
+            値とする辞書
+            射影は None（ALL）・'KEYS_ONLY'・射影する属性名のリスト（INCLUDE）で、
+            省略した場合は None（ALL）
+        """
+        self._db = db
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = {}
+        # インデックスごとの返却する属性名（ALLの場合はNone）
+        self._index_attributes = {}
+        for index_name, definition in (indexes or {}).items():
+            index_hash_key, index_range_key = definition[:2]
+            projection = definition[2] if len(definition) > 2 else None
+            self.indexes[index_name] = (index_hash_key, index_range_key)
+            if projection is None:
+                self._index_attributes[index_name] = None
+                continue
+            attributes = set(self._key_names())
+            attributes.update(
+                key for key in (index_hash_key, index_range_key) if key)
+            if projection != 'KEYS_ONLY':
+                attributes.update(projection)
+            self._index_attributes[index_name] = frozenset(attributes)
+        self._items = {}
+
+    # ---- キー操作 ----
+    def _key_names(self):
+        return [key for key in (self.hash_key, self.range_key) if key]
+
+    def _item_key(self, key, operation_name):
+        names = self._key_names()
+        if set(key) != set(names):
+            raise _validation_error(
+                'The provided key element does not match the schema',
+                operation_name)
+        return tuple(_sort_value(_normalize(key[name])) for name in names)
+
+    def _primary_key(self, item):
+        return {name: item[name] for name in self._key_names()}
+
+    # ---- 単一アイテム操作 ----
+    def get_item(self, Key, ProjectionExpression=None,
+                 ExpressionAttributeNames=None, ConsistentRead=False,
+                 **kwargs):
+        self._db._before_call('GetItem')
+        with self._db._lock:
+            item = self._items.get(self._item_key(Key, 'GetItem'))
+            response = self._db._response(self.name, 1, kwargs)
+            if item is not None:
+                response['Item'] = self._output(
+                    item, ProjectionExpression, ExpressionAttributeNames)
+        return response
+
+    def put_item(self, Item, ConditionExpression=None,
+                 ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE',
+                 **kwargs):
+        self._db._before_call('PutItem')
+        item = _normalize(Item)
+        with self._db._lock:
+            key = self._item_key(self._primary_key(item), 'PutItem')
+            old = self._items.get(key)
+            self._check_condition(
+                old, ConditionExpression, ExpressionAttributeNames,
+                ExpressionAttributeValues, 'PutItem')
+            self._items[key] = item
+            response = self._db._response(self.name, 1, kwargs)
+            if ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = copy.deepcopy(old)
+        return response
+
+    def delete_item(self, Key, ConditionExpression=None,
+                    ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE',
+                    **kwargs):
+        self._db._before_call('DeleteItem')
+        with self._db._lock:
+            key = self._item_key(Key, 'DeleteItem')
+            old = self._items.get(key)
+            self._check_condition(
+                old, ConditionExpression, ExpressionAttributeNames,
+                ExpressionAttributeValues, 'DeleteItem')
+            self._items.pop(key, None)
+            response = self._db._response(self.name, 1, kwargs)
+            if ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = copy.deepcopy(old)
+        return response
+
+    def update_item(self, Key, UpdateExpression=None,
+                    ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE',
+                    **kwargs):
+        self._db._before_call('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        values = _normalize(ExpressionAttributeValues or {})
+        with self._db._lock:
+            key = self._item_key(Key, 'UpdateItem')
+            old = self._items.get(key)
+            self._check_condition(
+                old, ConditionExpression, names, values, 'UpdateItem')
+            new = copy.deepcopy(old) if old is not None \
+                else copy.deepcopy(_normalize(Key))
+            updated = []
+            if UpdateExpression:
+                parser = _Parser(UpdateExpression, names, values)
+                actions = parser.update()
+                # 右辺はすべて更新前のアイテムで評価する
+                before = copy.deepcopy(new)
+                for clause, path, operand in actions:
+                    self._apply_update(new, before, clause, path, operand)
+                    updated.append(path)
+                if any(path[0][1] in self._key_names() for path in updated):
+                    raise _validation_error(
+                        'Cannot update attribute. This attribute is part '
+                        'of the key', 'UpdateItem')
+            self._items[key] = new
+            response = self._db._response(self.name, 1, kwargs)
+            attributes = self._return_values(
+                ReturnValues, old, new, updated)
+            if attributes is not None:
+                response['Attributes'] = attributes
+        return response
+
+    def _apply_update(self, item, before, clause, path, operand):
+        if clause == 'SET':
+            _set_path(item, path, copy.deepcopy(operand(before)))
+        elif clause == 'REMOVE':
+            _remove_path(item, path)
+        elif clause == 'ADD':
+            current = _get_path(item, path)
+            value = operand(before)
+            if current is _MISSING:
+                _set_path(item, path, copy.deepcopy(value))
+            elif isinstance(current, set):
+                current |= value
+            else:
+                _set_path(item, path, current + value)
+        elif clause == 'DELETE':
+            current = _get_path(item, path)
+            if isinstance(current, set):
+                current -= operand(before)
+                if not current:
+                    _remove_path(item, path)
+
+    def _return_values(self, return_values, old, new, updated):
+        if return_values in (None, 'NONE'):
+            return None
+        if return_values == 'ALL_OLD':
+            return copy.deepcopy(old) if old is not None else None
+        if return_values == 'ALL_NEW':
+            return copy.deepcopy(new)
+        source = old if return_values == 'UPDATED_OLD' else new
+        if source is None:
+            return None
+        return _project(source, [path[:1] for path in updated])
+
+    def _check_condition(self, item, expression, names, values,
+                         operation_name):
+        if not expression:
+            return
+        expression, names, values = _build(
+            expression, names, _normalize(values or {}))
+        condition = _Parser(expression, names, values).condition()
+        if not condition(item if item is not None else {}):
+            raise _client_error('ConditionalCheckFailedException',
+                                'The conditional request failed',
+                                operation_name)
+
+    def _output(self, item, projection, names, index_name=None):
+        attributes = self._index_attributes.get(index_name)
+        if attributes is not None:
+            # インデックスに射影されていない属性は返却しない
+            item = {key: value for key, value in item.items()
+                    if key in attributes}
+        if not projection:
+            return copy.deepcopy(item)
+        paths = _Parser(projection, names).projection()
+        return _project(item, paths)
+
+    # ---- 複数アイテム操作 ----
+    def query(self, KeyConditionExpression, IndexName=None,
+              FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+              Limit=None, ExclusiveStartKey=None, ScanIndexForward=True,
+              Select=None, **kwargs):
+        self._db._before_call('Query')
+        names = dict(ExpressionAttributeNames or {})
+        values = _normalize(ExpressionAttributeValues or {})
+        key_expression, names, values = _build(
+            KeyConditionExpression, names, values, is_key_condition=True)
+        filter_expression, names, values = _build(
+            FilterExpression, names, values)
+
+        if IndexName:
+            if IndexName not in self.indexes:
+                raise _validation_error(
+                    'The table does not have the specified index: %s'
+                    % IndexName, 'Query')
+            hash_key, range_key = self.indexes[IndexName]
+        else:
+            hash_key, range_key = self.hash_key, self.range_key
+        key_condition = _Parser(key_expression, names, values).condition()
+
+        with self._db._lock:
+            # インデックスのキー属性を持たないアイテムは対象外（スパースインデックス）
+            candidates = [
+                item for item in self._items.values()
+                if hash_key in item and (not range_key or range_key in item)
+                and key_condition(item)]
+            candidates.sort(
+                key=lambda item: self._position(item, range_key),
+                reverse=not ScanIndexForward)
+            return self._page(
+                'Query', candidates, range_key, hash_key, Limit,
+                ExclusiveStartKey, ScanIndexForward, filter_expression,
+                ProjectionExpression, names, values, Select, kwargs,
+                IndexName)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             Limit=None, ExclusiveStartKey=None, Segment=None,
+             TotalSegments=None, Select=None, IndexName=None, **kwargs):
+        self._db._before_call('Scan')
+        names = dict(ExpressionAttributeNames or {})
+        values = _normalize(ExpressionAttributeValues or {})
+        filter_expression, names, values = _build(
+            FilterExpression, names, values)
+        if (Segment is None) != (TotalSegments is None):
+            raise _validation_error(
+                'Segment and TotalSegments must be specified together',
+                'Scan')
+
+        with self._db._lock:
+            candidates = list(self._items.values())
+            if TotalSegments:
+                # パーティションキーのハッシュ値でセグメントに振り分ける
+                candidates = [
+                    item for item in candidates
+                    if zlib.crc32(repr(_sort_value(
+                        item[self.hash_key])).encode()) % TotalSegments
+                    == Segment]
+            candidates.sort(key=lambda item: self._position(item, None))
+            return self._page(
+                'Scan', candidates, None, None, Limit, ExclusiveStartKey,
+                True, filter_expression, ProjectionExpression, names,
+                values, Select, kwargs, IndexName)
+
+    def _position(self, item, range_key):
+        table_key = tuple(_sort_value(item[name])
+                          for name in self._key_names())
+        if range_key:
+            return (_sort_value(item[range_key]), table_key)
+        return ((), table_key)
+
+    def _page(self, operation_name, candidates, range_key, hash_key, limit,
+              exclusive_start_key, forward, filter_expression, projection,
+              names, values, select, kwargs, index_name):
+        if exclusive_start_key:
+            start = self._position(_normalize(exclusive_start_key),
+                                   range_key)
+            if forward:
+                candidates = [item for item in candidates
+                              if self._position(item, range_key) > start]
+            else:
+                candidates = [item for item in candidates
+                              if self._position(item, range_key) < start]
+
+        page_limit = min(
+            [size for size in (limit, self._db.max_page_items) if size]
+            or [len(candidates)])
+        evaluated = candidates[:page_limit]
+        if filter_expression:
+            condition = _Parser(filter_expression, names, values).condition()
+            matched = [item for item in evaluated if condition(item)]
+        else:
+            matched = evaluated
+
+        response = self._db._response(
+            self.name, len(evaluated), kwargs, index_name)
+        response['Count'] = len(matched)
+        response['ScannedCount'] = len(evaluated)
+        if select != 'COUNT':
+            response['Items'] = [
+                self._output(item, projection, names, index_name)
+                for item in matched]
+        if len(candidates) > page_limit and evaluated:
+            last = evaluated[-1]
+            last_key = self._primary_key(last)
+            if hash_key:
+                last_key[hash_key] = last[hash_key]
+            if range_key:
+                last_key[range_key] = last[range_key]
+            response['LastEvaluatedKey'] = copy.deepcopy(last_key)
+        return response
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        """boto3のbatch_writer互換のコンテキストマネージャを返す"""
+        return _BatchWriter(self)
+
+    def item_count(self):
+        """登録件数を返す"""
+        with self._db._lock:
+            return len(self._items)
+
+
+class _BatchWriter:
+    """MemoryTable.batch_writer の戻り値"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def put_item(self, Item):
+        self._table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self._table.delete_item(Key=Key)
+
+
+class MemoryDynamoDB:
+    """
+    boto3のDynamoDBサービスリソース互換のインメモリ実装
+    ※遅延・スロットリングを注入して、リトライ処理やベンチマークの検証に使用できます
+    """
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, throttle_rate=0.0,
+                 throttle_every=0, unprocessed_rate=0.0,
+                 max_page_items=None, seed=None):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        latency : float or dict, optional
+            1回の呼び出しごとの遅延秒数
+            操作名（'GetItem'など）をキーとする辞書も指定可能, by default 0.0
+        latency_jitter : float, optional
+            遅延に加算するランダムな秒数の上限, by default 0.0
+        throttle_rate : float, optional
+            ProvisionedThroughputExceededExceptionを発生させる確率, by default 0.0
+        throttle_every : int, optional
+            指定回数ごとにProvisionedThroughputExceededExceptionを発生させる,
+            by default 0（発生させない）
+        unprocessed_rate : float, optional
+            BatchGetItemでUnprocessedKeysとして返却するキーの割合, by default 0.0
+        max_page_items : int, optional
+            1ページで評価する最大件数（1MB制限の模擬）, by default None
+        seed : int, optional
+            乱数シード, by default None
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.throttle_rate = throttle_rate
+        self.throttle_every = throttle_every
+        self.unprocessed_rate = unprocessed_rate
+        self.max_page_items = max_page_items
+        self.call_counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._tables = {}
+
+    @classmethod
+    def from_environment(cls):
+        """
+        環境変数の設定からリソースを生成する
+        ※スマホレジの各テーブルを作成し、DYNAMODB_MEMORY_SEED_DIR が
+        ※指定されている場合は初期データを登録します
+
+        Returns
+        -------
+        db : MemoryDynamoDB
+            インメモリのリソース
+        """
+        db = cls(
+            latency=float(os.environ.get('DYNAMODB_MEMORY_LATENCY', 0)),
+            throttle_rate=float(
+                os.environ.get('DYNAMODB_MEMORY_THROTTLE_RATE', 0)),
+            max_page_items=int(
+                os.environ.get('DYNAMODB_MEMORY_MAX_PAGE_ITEMS', 0)) or None)
+        db.create_smart_register_tables()
+        seed_dir = os.environ.get('DYNAMODB_MEMORY_SEED_DIR')
+        if seed_dir:
+            db.load_seed_data(seed_dir)
+        return db
+
+    # ---- テーブル管理 ----
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        """
+        テーブルを作成する
+
+        Parameters
+        ----------
+        name : str
+            テーブル名
+        hash_key : str
+            パーティションキー名
+        range_key : str, optional
+            ソートキー名, by default None
+        indexes : dict, optional
+            インデックス名をキー、(パーティションキー名, ソートキー名, 射影)を
+            値とする辞書（射影は MemoryTable を参照）
+
+        Returns
+        -------
+        table : MemoryTable
+            作成したテーブル
+        """
+        with self._lock:
+            table = MemoryTable(self, name, hash_key, range_key, indexes)
+            self._tables[name] = table
+        return table
+
+    def create_smart_register_tables(self):
+        """
+        環境変数のテーブル名でスマホレジの各テーブルを作成する
+        ※template.yamlのキー・インデックス定義（射影を含む）に合わせています
+        """
+        definitions = [
+            ('LINE_PAY_ITEM_INFO_DB', 'barcode', None),
+            ('LINE_PAY_COUPON_INFO_DB', 'couponId', None),
+            ('LINE_PAY_ORDER_INFO_DB', 'orderId',
+             {'userId-orderId-index': (
+                 'userId', 'orderId',
+                 ['paidDateTime', 'amount', 'item', 'discountWay',
+                  'discountRate']),
+              'userId-orderDateTime-index': (
+                  'userId', 'orderDateTime',
+                  ['paidDateTime', 'amount', 'discountWay', 'discountRate',
+                   'itemCount'])}),
+            ('CHANNEL_ACCESS_TOKEN_DB', 'channelId', None),
+        ]
+        for env_name, hash_key, indexes in definitions:
+            table_name = os.environ.get(env_name)
+            if table_name and table_name not in self._tables:
+                self.create_table(table_name, hash_key, indexes=indexes)
+
+    def Table(self, name):
+        if name not in self._tables:
+            raise _client_error(
+                'ResourceNotFoundException',
+                'Requested resource not found: Table: %s not found' % name,
+                'DescribeTable')
+        return self._tables[name]
+
+    def load_seed_data(self, data_dir, table_names=None):
+        """
+        backend/APP/dynamodb_data 形式のJSONファイルを登録する
+
+        Parameters
+        ----------
+        data_dir : str
+            dynamodb_dataディレクトリのパス
+        table_names : dict, optional
+            サブディレクトリ名をキー、テーブル名を値とする辞書
+            by default SEED_DIRECTORIESと環境変数から決定
+
+        Returns
+        -------
+        counts : dict
+            テーブル名ごとの登録件数
+        """
+        if table_names is None:
+            table_names = {
+                directory: os.environ.get(env_name)
+                for directory, env_name in SEED_DIRECTORIES.items()
+                if os.environ.get(env_name)}
+        counts = {}
+        for directory, table_name in table_names.items():
+            table = self.Table(table_name)
+            paths = sorted(glob.glob(
+                os.path.join(data_dir, directory, '*.json')))
+            for path in paths:
+                with open(path, encoding='utf-8') as f:
+                    records = json.load(f, parse_float=Decimal)
+                for record in records if isinstance(records, list) \
+                        else [records]:
+                    table._items[table._item_key(
+                        table._primary_key(record), 'PutItem')] = \
+                        _normalize(record)
+                    counts[table_name] = counts.get(table_name, 0) + 1
+        return counts
+
+    # ---- バッチ操作 ----
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._before_call('BatchGetItem')
+        key_count = sum(len(request['Keys'])
+                        for request in RequestItems.values())
+        if key_count > BATCH_GET_ITEM_MAX_KEYS:
+            raise _validation_error(
+                'Too many items requested for the BatchGetItem call',
+                'BatchGetItem')
+        responses = {}
+        unprocessed = {}
+        consumed = []
+        with self._lock:
+            for table_name, request in RequestItems.items():
+                table = self.Table(table_name)
+                responses[table_name] = []
+                for key in request['Keys']:
+                    if self.unprocessed_rate \
+                            and self._random.random() < self.unprocessed_rate:
+                        unprocessed.setdefault(table_name, dict(
+                            request, Keys=[]))['Keys'].append(key)
+                        continue
+                    item = table._items.get(
+                        table._item_key(key, 'BatchGetItem'))
+                    if item is not None:
+                        responses[table_name].append(table._output(
+                            item, request.get('ProjectionExpression'),
+                            request.get('ExpressionAttributeNames')))
+                consumed.append(self._response(
+                    table_name, len(request['Keys']), kwargs))
+        response = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = [
+                item['ConsumedCapacity'] for item in consumed]
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._before_call('BatchWriteItem')
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table.put_item(Item=request['PutRequest']['Item'])
+                else:
+                    table.delete_item(Key=request['DeleteRequest']['Key'])
+        return {'UnprocessedItems': {}}
+
+    # ---- 遅延・スロットリングの注入 ----
+    def _before_call(self, operation_name):
+        with self._lock:
+            count = self.call_counts.get(operation_name, 0) + 1
+            self.call_counts[operation_name] = count
+            total = sum(self.call_counts.values())
+            throttled = (
+                (self.throttle_every and total % self.throttle_every == 0)
+                or (self.throttle_rate
+                    and self._random.random() < self.throttle_rate))
+            jitter = self._random.uniform(0, self.latency_jitter) \
+                if self.latency_jitter else 0.0
+        latency = self.latency.get(operation_name, 0.0) \
+            if isinstance(self.latency, dict) else self.latency
+        if latency or jitter:
+            time.sleep(latency + jitter)
+        if throttled:
+            raise _client_error(
+                'ProvisionedThroughputExceededException',
+                'The level of configured provisioned throughput for the '
+                'table was exceeded.', operation_name)
+
+    def _response(self, table_name, units, kwargs, index_name=None):
+        response = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            capacity = {'TableName': table_name,
+                        'CapacityUnits': float(units)}
+            if index_name and kwargs['ReturnConsumedCapacity'] == 'INDEXES':
+                capacity['GlobalSecondaryIndexes'] = {
+                    index_name: {'CapacityUnits': float(units)}}
+            response['ConsumedCapacity'] = capacity
+        return response
@@ -0,0 +1,196 @@
+"""
+DynamoDB呼び出しの計測モジュール
+※テーブル・メソッド・インデックスごとに消費キャパシティと所要時間を集計し、
+※Lambda呼び出しの終了時に1件のログとして出力します
+※所要時間が閾値を超えた呼び出しは、呼び出し元のテーブル操作メソッドとともにログ出力します
+
+"""
+import json
+import logging
+import os
+import sys
+import threading
+
+# ログ出力の設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 計測の有効・無効
+ENABLED = os.environ.get('DYNAMODB_METRICS', 'true').lower() == 'true'
+# 遅い呼び出しとしてログ出力する閾値（ミリ秒、0以下で無効）
+SLOW_CALL_MS = float(os.environ.get('DYNAMODB_SLOW_CALL_MS', 200))
+# 読み込み系の操作（それ以外は書き込み系として集計）
+READ_OPERATIONS = frozenset([
+    'get_item', 'batch_get_item', 'query', 'scan',
+])
+
+_lock = threading.Lock()
+_aggregates = {}
+
+
+def _capacity_units(consumed, table_name):
+    # 自テーブルの消費キャパシティとインデックスごとの内訳を返す
+    if isinstance(consumed, list):
+        consumed = next((capacity for capacity in consumed
+                         if capacity.get('TableName') == table_name), None)
+    if not consumed:
+        return 0.0, {}
+    indexes = {
+        name: float(capacity.get('CapacityUnits', 0))
+        for kind in ('GlobalSecondaryIndexes', 'LocalSecondaryIndexes')
+        for name, capacity in consumed.get(kind, {}).items()}
+    return float(consumed.get('CapacityUnits', 0)), indexes
+
+
+def find_caller(instance, internal_file):
+    """
+    呼び出し元のテーブル操作メソッド名を取得する
+    ※基底クラスのモジュール外で、同じインスタンスのメソッドを呼び出し元とします
+
+    Parameters
+    ----------
+    instance : object
+        テーブル操作クラスのインスタンス
+    internal_file : str
+        基底クラスのモジュールのファイルパス
+
+    Returns
+    -------
+    caller : str
+        「クラス名.メソッド名」
+        特定できない場合は基底クラスの最も外側のメソッド名
+    """
+    frame = sys._getframe(1)
+    base_method = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == internal_file:
+            base_method = code.co_name
+        elif frame.f_locals.get('self') is instance:
+            return '%s.%s' % (type(instance).__name__, code.co_name)
+        elif base_method is not None:
+            break
+        frame = frame.f_back
+    return '%s.%s' % (type(instance).__name__, base_method)
+
+
+def record(table_name, method, index_name, operation_name, response,
+           elapsed):
+    """
+    1回の呼び出しの消費キャパシティと所要時間を記録する
+
+    Parameters
+    ----------
+    table_name : str
+        テーブル名
+    method : str
+        呼び出し元のメソッド名
+    index_name : str
+        インデックス名（テーブルの場合はNone）
+    operation_name : str
+        操作名（get_itemなど）
+    response : dict
+        レスポンス情報（エラーの場合はNone）
+    elapsed : float
+        所要秒数（再試行の待機を含む）
+    """
+    units, indexes = _capacity_units(
+        (response or {}).get('ConsumedCapacity'), table_name)
+    capacity_key = 'readCapacityUnits' \
+        if operation_name in READ_OPERATIONS else 'writeCapacityUnits'
+    latency_ms = elapsed * 1000
+    key = (table_name, method, index_name or '')
+    with _lock:
+        aggregate = _aggregates.get(key)
+        if aggregate is None:
+            aggregate = _aggregates[key] = {
+                'table': table_name,
+                'method': method,
+                'index': index_name or '',
+                'calls': 0,
+                'errors': 0,
+                'readCapacityUnits': 0.0,
+                'writeCapacityUnits': 0.0,
+                'indexCapacityUnits': {},
+                'latencyMs': 0.0,
+                'maxLatencyMs': 0.0,
+            }
+        aggregate['calls'] += 1
+        if response is None:
+            aggregate['errors'] += 1
+        aggregate[capacity_key] += units
+        for name, index_units in indexes.items():
+            aggregate['indexCapacityUnits'][name] = \
+                aggregate['indexCapacityUnits'].get(name, 0.0) + index_units
+        aggregate['latencyMs'] += latency_ms
+        aggregate['maxLatencyMs'] = max(aggregate['maxLatencyMs'], latency_ms)
+
+    if 0 < SLOW_CALL_MS <= latency_ms:
+        logger.warning(
+            'DynamoDB遅延: %s %s %s index=%s %.1fms capacity=%s',
+            method, operation_name, table_name, index_name or '-',
+            latency_ms, units)
+
+
+def reset(context=None):
+    """
+    集計をリセットする
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    with _lock:
+        _aggregates.clear()
+
+
+def get_summary():
+    """
+    現在のLambda呼び出しでの集計を取得する
+
+    Returns
+    -------
+    summary : dict
+        合計値と、テーブル・メソッド・インデックスごとの集計
+    """
+    with _lock:
+        operations = [dict(aggregate, indexCapacityUnits=dict(
+            aggregate['indexCapacityUnits']))
+            for aggregate in _aggregates.values()]
+    for operation in operations:
+        for name in ('readCapacityUnits', 'writeCapacityUnits', 'latencyMs',
+                     'maxLatencyMs'):
+            operation[name] = round(operation[name], 3)
+    operations.sort(key=lambda operation: (
+        -(operation['readCapacityUnits'] + operation['writeCapacityUnits']),
+        -operation['latencyMs']))
+    return {
+        'calls': sum(operation['calls'] for operation in operations),
+        'readCapacityUnits': round(sum(
+            operation['readCapacityUnits'] for operation in operations), 3),
+        'writeCapacityUnits': round(sum(
+            operation['writeCapacityUnits'] for operation in operations), 3),
+        'latencyMs': round(sum(
+            operation['latencyMs'] for operation in operations), 3),
+        'operations': operations,
+    }
+
+
+def log_summary(context=None):
+    """
+    集計を1件のログとして出力する
+    ※DynamoDBの呼び出しがなかった場合は出力しません
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    summary = get_summary()
+    if not summary['calls']:
+        return
+    if context is not None:
+        summary['functionName'] = getattr(context, 'function_name', None)
+        summary['requestId'] = getattr(context, 'aws_request_id', None)
+    logger.info(json.dumps({'dynamodbMetrics': summary}, ensure_ascii=False))
@@ -0,0 +1,461 @@
+"""
+DynamoDB呼び出しの再試行モジュール
+※スロットリング・一時的な障害の発生時に、ジッター付きの指数バックオフで再試行します
+※再試行の回数・待機秒数はLambda呼び出しごとの上限（予算）の範囲内に制限します
+※スロットリングを検知したテーブルは、クライアント側で呼び出し頻度を一時的に抑制します
+
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from botocore.exceptions import (
+    ClientError, ConnectionError, ReadTimeoutError)
+
+# ログ出力の設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 再試行するエラーコード
+THROTTLING_ERROR_CODES = frozenset([
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+])
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES | frozenset([
+    'InternalServerError',
+    'ServiceUnavailable',
+])
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class RetryPolicy:
+    """再試行ポリシー"""
+    __slots__ = ['max_attempts', 'base_seconds', 'max_seconds',
+                 'budget_retries', 'budget_seconds', 'adaptive',
+                 '_random']
+
+    def __init__(self, max_attempts=None, base_seconds=None,
+                 max_seconds=None, budget_retries=None, budget_seconds=None,
+                 adaptive=None):
+        """
+        初期化メソッド
+        ※引数を省略した項目は環境変数の値を使用します
+
+        Parameters
+        ----------
+        max_attempts : int, optional
+            1回の操作あたりの最大試行回数（初回を含む）
+            by default DYNAMODB_RETRY_MAX_ATTEMPTS（5）
+        base_seconds : float, optional
+            初回の待機秒数の上限, by default DYNAMODB_RETRY_BASE_SECONDS（0.05）
+        max_seconds : float, optional
+            1回の待機秒数の上限, by default DYNAMODB_RETRY_MAX_SECONDS（2）
+        budget_retries : int, optional
+            Lambda呼び出しごとの再試行回数の上限
+            by default DYNAMODB_RETRY_BUDGET（20）
+        budget_seconds : float, optional
+            Lambda呼び出しごとの待機秒数の合計の上限
+            by default DYNAMODB_RETRY_BUDGET_SECONDS（5）
+        adaptive : bool, optional
+            スロットリング検知時に呼び出し頻度を抑制する場合はTrue
+            by default DYNAMODB_ADAPTIVE_RATE_LIMIT（true）
+        """
+        self.max_attempts = max_attempts or int(
+            os.environ.get('DYNAMODB_RETRY_MAX_ATTEMPTS', 5))
+        self.base_seconds = base_seconds if base_seconds is not None \
+            else _env_float('DYNAMODB_RETRY_BASE_SECONDS', 0.05)
+        self.max_seconds = max_seconds if max_seconds is not None \
+            else _env_float('DYNAMODB_RETRY_MAX_SECONDS', 2)
+        self.budget_retries = budget_retries if budget_retries is not None \
+            else int(os.environ.get('DYNAMODB_RETRY_BUDGET', 20))
+        self.budget_seconds = budget_seconds if budget_seconds is not None \
+            else _env_float('DYNAMODB_RETRY_BUDGET_SECONDS', 5)
+        self.adaptive = adaptive if adaptive is not None else os.environ.get(
+            'DYNAMODB_ADAPTIVE_RATE_LIMIT', 'true').lower() == 'true'
+        self._random = random.Random()
+
+    def is_retryable(self, error):
+        """
+        再試行可能なエラーか判定する
+
+        Parameters
+        ----------
+        error : Exception
+            発生したエラー
+
+        Returns
+        -------
+        retryable : bool
+            再試行可能な場合はTrue
+            （条件付き書き込みの失敗・入力エラーなどはFalse）
+        """
+        if isinstance(error, ClientError):
+            return error.response.get('Error', {}).get(
+                'Code') in RETRYABLE_ERROR_CODES
+        return isinstance(error, (ConnectionError, ReadTimeoutError))
+
+    def backoff(self, attempt):
+        """
+        再試行前の待機秒数を算出する（Full Jitter）
+
+        Parameters
+        ----------
+        attempt : int
+            再試行の回数（1始まり）
+
+        Returns
+        -------
+        seconds : float
+            待機秒数
+        """
+        ceiling = min(self.max_seconds,
+                      self.base_seconds * (2 ** (attempt - 1)))
+        return self._random.uniform(0, ceiling)
+
+
+def is_throttle(error):
+    """
+    スロットリングによるエラーか判定する
+
+    Parameters
+    ----------
+    error : Exception
+        発生したエラー
+
+    Returns
+    -------
+    throttled : bool
+        スロットリングの場合はTrue
+    """
+    return isinstance(error, ClientError) and error.response.get(
+        'Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+class AdaptiveRateLimiter:
+    """
+    スロットリング検知時の呼び出し頻度の抑制クラス
+    ※スロットリングを検知するまでは制限しません
+    ※検知時は直近の呼び出し頻度を基準に許容頻度を下げ、
+    ※成功するごとに一定の割合で許容頻度を戻していきます
+    """
+    __slots__ = ['min_rate', 'max_rate', 'decrease', 'increase', 'rate',
+                 '_tokens', '_updated', '_sent', '_lock']
+
+    def __init__(self, min_rate=None, max_rate=None, decrease=0.5,
+                 increase=0.05):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        min_rate : float, optional
+            許容頻度（回/秒）の下限, by default DYNAMODB_RATE_LIMIT_MIN（20）
+        max_rate : float, optional
+            許容頻度がこの値に戻った時点で制限を解除する
+            by default DYNAMODB_RATE_LIMIT_MAX（1000）
+        decrease : float, optional
+            スロットリング検知時に許容頻度に掛ける係数, by default 0.5
+        increase : float, optional
+            成功時に許容頻度を増やす割合, by default 0.05
+        """
+        self.min_rate = min_rate or _env_float('DYNAMODB_RATE_LIMIT_MIN', 20)
+        self.max_rate = max_rate or _env_float(
+            'DYNAMODB_RATE_LIMIT_MAX', 1000)
+        self.decrease = decrease
+        self.increase = increase
+        self.rate = None
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def _measured_rate(self, now):
+        # 直近1秒間の呼び出し回数
+        while self._sent and self._sent[0] <= now - 1.0:
+            self._sent.popleft()
+        return float(len(self._sent))
+
+    def acquire(self):
+        """
+        呼び出し前に許容頻度を超えないよう待機する
+
+        Returns
+        -------
+        waited : float
+            待機した秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            # 直近1秒間より前の記録は不要なため、呼び出しごとに削除する
+            self._measured_rate(now)
+            self._sent.append(now)
+            if self.rate is None:
+                return 0.0
+            self._tokens = min(
+                max(self.rate, 1.0),
+                self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先に枠を確保し、不足分の回復を待つ
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def on_throttle(self):
+        """スロットリング検知時に許容頻度を下げる"""
+        with self._lock:
+            now = time.monotonic()
+            base = self.rate if self.rate is not None \
+                else self._measured_rate(now)
+            self.rate = max(self.min_rate, base * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = now
+
+    def on_success(self):
+        """成功時に許容頻度を戻す"""
+        if self.rate is None:
+            return
+        with self._lock:
+            if self.rate is None:
+                return
+            self.rate *= 1.0 + self.increase
+            if self.rate >= self.max_rate:
+                self.rate = None
+
+
+class _InvocationState:
+    """Lambda呼び出し単位の再試行の集計・予算管理クラス"""
+    __slots__ = ['calls', 'retries', 'throttles', 'backoff_seconds',
+                 'wait_seconds', 'exhausted', 'deadline', '_lock']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, deadline=None):
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.throttles = 0
+            self.backoff_seconds = 0.0
+            self.wait_seconds = 0.0
+            self.exhausted = 0
+            self.deadline = deadline
+
+    def add(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def consume(self, policy, delay):
+        # 予算内であれば再試行分を計上してTrueを返す
+        with self._lock:
+            if self.retries >= policy.budget_retries \
+                    or self.backoff_seconds + delay > policy.budget_seconds \
+                    or (self.deadline is not None
+                        and time.monotonic() + delay >= self.deadline):
+                self.exhausted += 1
+                return False
+            self.retries += 1
+            self.backoff_seconds += delay
+            return True
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'backoffSeconds': round(self.backoff_seconds, 3),
+                'rateLimitWaitSeconds': round(self.wait_seconds, 3),
+                'budgetExhausted': self.exhausted,
+            }
+
+
+_policy = None
+_limiters = {}
+_limiters_lock = threading.Lock()
+_state = _InvocationState()
+
+
+def get_policy():
+    """
+    既定の再試行ポリシーを取得する
+
+    Returns
+    -------
+    policy : RetryPolicy
+        再試行ポリシー
+    """
+    global _policy
+    if _policy is None:
+        _policy = RetryPolicy()
+    return _policy
+
+
+def set_policy(policy):
+    """
+    既定の再試行ポリシーを差し替える
+
+    Parameters
+    ----------
+    policy : RetryPolicy
+        再試行ポリシー（Noneの場合は環境変数から再生成）
+    """
+    global _policy
+    _policy = policy
+
+
+def get_limiter(table_name):
+    """
+    テーブルごとの呼び出し頻度の抑制クラスを取得する
+    ※コンテナが再利用される間は状態を引き継ぎます
+
+    Parameters
+    ----------
+    table_name : str
+        テーブル名
+
+    Returns
+    -------
+    limiter : AdaptiveRateLimiter
+        呼び出し頻度の抑制クラス
+    """
+    limiter = _limiters.get(table_name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(
+                table_name, AdaptiveRateLimiter())
+    return limiter
+
+
+def record_throttle(table_name):
+    """
+    例外以外の形で検知したスロットリング（UnprocessedKeysなど）を記録する
+
+    Parameters
+    ----------
+    table_name : str
+        テーブル名
+    """
+    _state.add('throttles')
+    if get_policy().adaptive:
+        get_limiter(table_name).on_throttle()
+
+
+def call(operation, table_name='', policy=None, **kwargs):
+    """
+    再試行ポリシーに従ってDynamoDBの操作を実行する
+
+    Parameters
+    ----------
+    operation : callable
+        実行する操作（table.put_itemなど）
+    table_name : str, optional
+        テーブル名（呼び出し頻度の抑制・ログに使用）, by default ''
+    policy : RetryPolicy, optional
+        再試行ポリシー, by default get_policy()
+    **kwargs
+        operationに渡すパラメータ
+
+    Returns
+    -------
+    response : dict
+        レスポンス情報
+
+    Raises
+    ------
+    Exception
+        再試行できないエラー、または再試行の上限に達した場合は最後のエラー
+    """
+    policy = policy or get_policy()
+    limiter = get_limiter(table_name) if policy.adaptive else None
+    attempt = 0
+    while True:
+        if limiter is not None:
+            waited = limiter.acquire()
+            if waited:
+                _state.add('wait_seconds', waited)
+        _state.add('calls')
+        try:
+            response = operation(**kwargs)
+        except Exception as e:
+            if is_throttle(e):
+                _state.add('throttles')
+                if limiter is not None:
+                    limiter.on_throttle()
+            if not policy.is_retryable(e):
+                raise e
+            attempt += 1
+            delay = policy.backoff(attempt)
+            if attempt >= policy.max_attempts \
+                    or not _state.consume(policy, delay):
+                logger.warning('DynamoDB再試行打ち切り: %s %s (%d回試行) %s',
+                               table_name, _operation_name(operation),
+                               attempt, e)
+                raise e
+            logger.warning('DynamoDB再試行: %s %s (%d回目, %.3f秒待機) %s',
+                           table_name, _operation_name(operation), attempt,
+                           delay, e)
+            time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            limiter.on_success()
+        return response
+
+
+def _operation_name(operation):
+    return getattr(operation, '__name__', repr(operation))
+
+
+def begin_invocation(context=None):
+    """
+    Lambda呼び出しの開始時に集計・予算をリセットする
+    ※contextを指定した場合は、残り実行時間を超える待機を行いません
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    deadline = None
+    if context is not None and hasattr(
+            context, 'get_remaining_time_in_millis'):
+        margin = _env_float('DYNAMODB_RETRY_DEADLINE_MARGIN_SECONDS', 0.5)
+        deadline = time.monotonic() \
+            + context.get_remaining_time_in_millis() / 1000 - margin
+    _state.reset(deadline)
+
+
+def get_invocation_stats():
+    """
+    現在のLambda呼び出しでの再試行の集計を取得する
+
+    Returns
+    -------
+    stats : dict
+        呼び出し回数・再試行回数・スロットリング回数・待機秒数など
+    """
+    return _state.as_dict()
+
+
+def log_invocation_stats(context=None):
+    """
+    再試行・スロットリングが発生した場合に集計をログ出力する
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    stats = _state.as_dict()
+    if stats['retries'] or stats['throttles'] or stats['budgetExhausted']:
+        logger.warning('DynamoDB再試行集計: %s', stats)
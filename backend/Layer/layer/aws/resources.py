@@ -0,0 +1,217 @@
+"""
+boto3リソース共有用モジュール
+※プロセス内でセッション・リソース・クライアントを共有し、
+※コールドスタート時の認証情報解決やコネクションプール生成を1回にまとめます
+
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+_lock = threading.Lock()
+_session = None
+_resources = {}
+_clients = {}
+_registered = set()
+_thread_local = threading.local()
+
+
+def get_config(service_name=None):
+    """
+    botocoreの接続設定を環境変数から生成する
+    ※DynamoDBは aws.dynamodb.retry で再試行するため、
+    ※botocore側の試行回数は DYNAMODB_CLIENT_MAX_ATTEMPTS（既定1回）とします
+
+    Parameters
+    ----------
+    service_name : str, optional
+        サービス名（'dynamodb'など）, by default None
+
+    Returns
+    -------
+    config : botocore.config.Config
+        接続設定
+
+    """
+    max_attempts = os.environ.get('AWS_CLIENT_MAX_ATTEMPTS', 3)
+    if service_name == 'dynamodb':
+        max_attempts = os.environ.get('DYNAMODB_CLIENT_MAX_ATTEMPTS', 1)
+    return Config(
+        max_pool_connections=int(
+            os.environ.get('AWS_CLIENT_MAX_POOL_CONNECTIONS', 25)),
+        tcp_keepalive=os.environ.get(
+            'AWS_CLIENT_TCP_KEEPALIVE', 'true').lower() == 'true',
+        connect_timeout=float(
+            os.environ.get('AWS_CLIENT_CONNECT_TIMEOUT', 3)),
+        read_timeout=float(os.environ.get('AWS_CLIENT_READ_TIMEOUT', 10)),
+        retries={
+            'mode': os.environ.get('AWS_CLIENT_RETRY_MODE', 'standard'),
+            'max_attempts': int(max_attempts),
+        },
+    )
+
+
+def get_session():
+    """
+    共有のboto3セッションを取得する
+
+    Returns
+    -------
+    session : boto3.session.Session
+        boto3セッション
+
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session()
+    return _session
+
+
+def get_resource(service_name):
+    """
+    共有のboto3リソースを取得する
+    ※初回呼び出し時に生成します
+
+    Parameters
+    ----------
+    service_name : str
+        サービス名（'dynamodb'など）
+
+    Returns
+    -------
+    resource : boto3.resources.base.ServiceResource
+        boto3リソース
+
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = _create_resource(session, service_name)
+                _resources[service_name] = resource
+    return resource
+
+
+def _create_resource(session, service_name):
+    # DYNAMODB_BACKEND=memory の場合はインメモリ実装を使用する
+    if service_name == 'dynamodb' \
+            and os.environ.get('DYNAMODB_BACKEND') == 'memory':
+        from aws.dynamodb.memory import MemoryDynamoDB
+        _registered.add(service_name)
+        return MemoryDynamoDB.from_environment()
+    return session.resource(
+        service_name, config=get_config(service_name))
+
+
+def register_resource(service_name, resource):
+    """
+    共有リソースを差し替える
+    ※テスト・ベンチマークでインメモリ実装などを使用する場合に呼び出します
+    ※登録したリソースはワーカースレッドからも共有されます
+
+    Parameters
+    ----------
+    service_name : str
+        サービス名（'dynamodb'など）
+    resource : object
+        boto3リソース互換のオブジェクト
+        Noneの場合は登録を解除します
+
+    """
+    with _lock:
+        if resource is None:
+            _resources.pop(service_name, None)
+            _registered.discard(service_name)
+        else:
+            _resources[service_name] = resource
+            _registered.add(service_name)
+
+
+def get_client(service_name):
+    """
+    共有のboto3クライアントを取得する
+    ※リソース生成済みのサービスはリソースのクライアントを共有します
+
+    Parameters
+    ----------
+    service_name : str
+        サービス名（'dynamodb'など）
+
+    Returns
+    -------
+    client : botocore.client.BaseClient
+        boto3クライアント
+
+    """
+    if service_name in _resources and service_name not in _registered:
+        return _resources[service_name].meta.client
+    client = _clients.get(service_name)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = session.client(
+                    service_name, config=get_config(service_name))
+                _clients[service_name] = client
+    return client
+
+
+def get_thread_resource(service_name):
+    """
+    呼び出し元スレッド専用のboto3リソースを取得する
+    ※boto3のセッション・リソースはスレッドセーフではないため、
+    ※ワーカースレッドではこちらを使用します
+
+    Parameters
+    ----------
+    service_name : str
+        サービス名（'dynamodb'など）
+
+    Returns
+    -------
+    resource : boto3.resources.base.ServiceResource
+        boto3リソース
+
+    """
+    if threading.current_thread() is threading.main_thread() \
+            or service_name in _registered:
+        return get_resource(service_name)
+    resources = getattr(_thread_local, 'resources', None)
+    if resources is None:
+        resources = _thread_local.resources = {}
+    if service_name not in resources:
+        resources[service_name] = create_resource(service_name)
+    return resources[service_name]
+
+
+def create_resource(service_name):
+    """
+    共有しない専用のboto3リソースを生成する
+    ※呼び出しごとにセッションを生成するため（モデル読み込み・接続確立を含む）、
+    ※生成したリソースは呼び出し元で保持して使い回してください
+    ※register_resource で登録したリソース・インメモリ実装は共有のものを返します
+
+    Parameters
+    ----------
+    service_name : str
+        サービス名（'dynamodb'など）
+
+    Returns
+    -------
+    resource : boto3.resources.base.ServiceResource
+        boto3リソース
+
+    """
+    if service_name in _registered or (
+            service_name == 'dynamodb'
+            and os.environ.get('DYNAMODB_BACKEND') == 'memory'):
+        return get_resource(service_name)
+    return boto3.session.Session().resource(
+        service_name, config=get_config(service_name))
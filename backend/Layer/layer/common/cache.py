@@ -0,0 +1,156 @@
+"""
+有効期限付きLRUキャッシュモジュール
+※モジュール変数として保持すると、Lambdaのコンテナが再利用される間は
+※呼び出しをまたいでキャッシュが有効になります
+
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# キャッシュ未登録を表す値
+MISSING = object()
+
+
+def estimate_size(value):
+    """
+    値のおおよそのメモリ使用量を算出する
+
+    Parameters
+    ----------
+    value : object
+        対象の値
+
+    Returns
+    -------
+    size : int
+        バイト数
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v)
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v) for v in value)
+    return size
+
+
+class TTLCache:
+    """有効期限付きLRUキャッシュ"""
+    __slots__ = ['ttl', 'negative_ttl', 'max_entries', 'max_bytes',
+                 '_entries', '_bytes', '_lock', '_counters']
+
+    def __init__(self, ttl, negative_ttl=None, max_entries=10000,
+                 max_bytes=16 * 1024 * 1024):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        ttl : float
+            有効期限（秒）、0以下の場合はキャッシュしない
+        negative_ttl : float, optional
+            「存在しない」結果の有効期限（秒）, by default ttlと同じ
+        max_entries : int, optional
+            最大件数, by default 10000
+        max_bytes : int, optional
+            最大メモリ使用量（バイト）, by default 16MB
+        """
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ['hits', 'negativeHits', 'misses', 'expirations', 'evictions'],
+            0)
+
+    def get(self, key):
+        """
+        キャッシュから値を取得する
+
+        Parameters
+        ----------
+        key : hashable
+            キー
+
+        Returns
+        -------
+        value : object
+            キャッシュした値
+            未登録・有効期限切れの場合はMISSING
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return MISSING
+            value, expires_at, size, negative = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._counters['negativeHits' if negative else 'hits'] += 1
+            return value
+
+    def set(self, key, value, negative=False, ttl=None):
+        """
+        キャッシュに値を登録する
+        ※上限を超える場合は最も長く参照されていない値から削除します
+
+        Parameters
+        ----------
+        key : hashable
+            キー
+        value : object
+            値
+        negative : bool, optional
+            「存在しない」結果の場合はTrue, by default False
+        ttl : float, optional
+            この値の有効期限（秒）, by default 初期化時の設定値
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (
+                value, time.monotonic() + ttl, size, negative)
+            self._bytes += size
+            while len(self._entries) > self.max_entries \
+                    or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def clear(self):
+        """キャッシュを全件削除する"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        キャッシュの利用状況を取得する
+
+        Returns
+        -------
+        stats : dict
+            ヒット・ミス・削除の回数と、現在の件数・メモリ使用量
+        """
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries),
+                        bytes=self._bytes)
@@ -19,7 +19,7 @@ class ChannelAccessToken(DynamoDB):
         super().__init__(table_name)
         self._table = self._db.Table(table_name)
 
-    def get_item(self, channel_id):
+    def get_item(self, channel_id, fields=None):
         """
         channelIdからアイテムを取得する
 
@@ -27,6 +27,8 @@ class ChannelAccessToken(DynamoDB):
         ----------
         channel_id : str
             チャネルID
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -37,7 +39,7 @@ class ChannelAccessToken(DynamoDB):
         key = {'channelId': channel_id}
 
         try:
-            item = self._get_item(key)
+            item = self._get_item(key, fields)
         except Exception as e:
             raise e
         return item
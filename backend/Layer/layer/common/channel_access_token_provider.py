@@ -0,0 +1,183 @@
+"""
+短期チャネルアクセストークン提供モジュール
+※DynamoDBから取得したトークンを期限日（limitDate）の少し前までメモリ上に保持します
+※Messaging APIが401を返した場合は、テーブルを再取得し、
+※それでも同じトークンの場合はトークンを再発行して1回だけ再送信します
+
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from dateutil.tz import gettz
+
+from common import line
+from common.channel_access_token import ChannelAccessToken
+
+# ログ出力の設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 期限日の何秒前にキャッシュを破棄するか
+REFRESH_MARGIN_SECONDS = int(
+    os.environ.get('CHANNEL_ACCESS_TOKEN_REFRESH_MARGIN_SECONDS', 60 * 60))
+# キャッシュの最大保持秒数（期限日が読み取れない場合も含む）
+MAX_CACHE_SECONDS = int(
+    os.environ.get('CHANNEL_ACCESS_TOKEN_MAX_CACHE_SECONDS', 60 * 60 * 6))
+# 期限日の形式・再発行したトークンの有効日数（バッチと同じ）
+LIMIT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S%z'
+TOKEN_LIFETIME = timedelta(days=20)
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+class ChannelAccessTokenProvider:
+    """短期チャネルアクセストークン提供クラス"""
+    __slots__ = ['_channel_id', '_table', '_token', '_expires_at', '_lock']
+
+    def __init__(self, channel_id, table=None):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        channel_id : str
+            LINE公式アカウントのチャネルID
+        table : ChannelAccessToken, optional
+            テーブル操作クラス, by default None（新規生成）
+        """
+        self._channel_id = channel_id
+        self._table = table or ChannelAccessToken()
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _cache_seconds(self, limit_date):
+        # 期限日の少し前までを保持期間とする
+        try:
+            limit = datetime.strptime(limit_date, LIMIT_DATE_FORMAT)
+        except (TypeError, ValueError):
+            return 0
+        remaining = (limit - datetime.now(gettz('Asia/Tokyo'))
+                     ).total_seconds() - REFRESH_MARGIN_SECONDS
+        return max(0, min(remaining, MAX_CACHE_SECONDS))
+
+    def get_token(self, force_refresh=False):
+        """
+        短期チャネルアクセストークンを取得する
+
+        Parameters
+        ----------
+        force_refresh : bool, optional
+            キャッシュを使用せずテーブルから再取得する場合はTrue, by default False
+
+        Returns
+        -------
+        channel_access_token : str
+            短期チャネルアクセストークン
+            テーブルに存在しない場合はNone
+        """
+        with self._lock:
+            if not force_refresh and self._token \
+                    and time.monotonic() < self._expires_at:
+                return self._token
+
+            item = self._table.get_item(
+                self._channel_id,
+                fields=['channelAccessToken', 'limitDate'])
+            self._token = item.get('channelAccessToken')
+            self._expires_at = time.monotonic() + self._cache_seconds(
+                item.get('limitDate'))
+            return self._token
+
+    def invalidate(self):
+        """キャッシュを破棄する"""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def reissue_token(self):
+        """
+        短期チャネルアクセストークンを再発行し、テーブルを更新する
+
+        Returns
+        -------
+        channel_access_token : str
+            再発行したトークン
+        """
+        item = self._table.get_item(self._channel_id,
+                                    fields=['channelSecret'])
+        token = line.issue_channel_access_token(
+            self._channel_id, item['channelSecret'])
+        limit_date = (datetime.now(gettz('Asia/Tokyo')) + TOKEN_LIFETIME
+                      ).strftime(LIMIT_DATE_FORMAT)
+        self._table.update_item(self._channel_id, token, limit_date)
+        with self._lock:
+            self._token = token
+            self._expires_at = time.monotonic() + self._cache_seconds(
+                limit_date)
+        logger.info('channelId: %s reissued', self._channel_id)
+        return token
+
+    def send_push_message(self, flex_obj, user_id):
+        """
+        プッシュメッセージを送信する
+        ※401の場合はトークンを再取得（同じトークンの場合は再発行）して1回だけ再送信します
+
+        Parameters
+        ----------
+        flex_obj : dict
+            メッセージ情報
+        user_id : str
+            送信先のユーザーID
+
+        Returns
+        -------
+        response : dict
+            レスポンス情報
+            トークンが存在しない場合はNone
+        """
+        token = self.get_token()
+        if not token:
+            logger.error(
+                'CHANNEL_ACCESS_TOKEN in Specified CHANNEL_ID: %s is not exist.',  # noqa: E501
+                self._channel_id)
+            return None
+
+        try:
+            return line.send_push_message(token, flex_obj, user_id)
+        except line.LineApiUnauthorizedError:
+            logger.warning('channelId: %s token rejected, refreshing',
+                           self._channel_id)
+            line.discard_line_bot_api(token)
+            refreshed = self.get_token(force_refresh=True)
+            if not refreshed or refreshed == token:
+                refreshed = self.reissue_token()
+            return line.send_push_message(refreshed, flex_obj, user_id)
+
+
+def get_provider(channel_id):
+    """
+    チャネルごとの提供クラスを取得する
+    ※コンテナが再利用される間はキャッシュを引き継ぎます
+
+    Parameters
+    ----------
+    channel_id : str
+        LINE公式アカウントのチャネルID
+
+    Returns
+    -------
+    provider : ChannelAccessTokenProvider
+        短期チャネルアクセストークン提供クラス
+    """
+    provider = _providers.get(channel_id)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(channel_id)
+            if provider is None:
+                provider = _providers[channel_id] = \
+                    ChannelAccessTokenProvider(channel_id)
+    return provider
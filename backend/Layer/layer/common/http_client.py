@@ -0,0 +1,287 @@
+"""
+外部API呼び出し用のHTTPクライアントモジュール
+※モジュール変数としてセッションを保持し、Lambdaのコンテナが再利用される間は
+※接続（TCP・TLS）を使い回します
+※エンドポイントごとに接続・読み込みのタイムアウトと再試行の方針を設定し、
+※所要時間をLambda呼び出しの終了時に1件のログとして出力します
+
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+# ※requestsは読み込みに時間がかかるため、セッション作成時に読み込みます
+
+# ログ出力の設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 接続タイムアウト（秒）
+CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', 2.0))
+# 接続プールの保持数（エンドポイントごと）
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 4))
+# 遅い呼び出しとしてログ出力する閾値（ミリ秒、0以下で無効）
+SLOW_CALL_MS = float(os.environ.get('HTTP_SLOW_CALL_MS', 1000))
+# 再試行するステータスコード
+RETRY_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+
+class Endpoint:
+    """エンドポイントごとの設定"""
+    __slots__ = ['name', 'url', 'read_timeout', 'retries', 'idempotent']
+
+    def __init__(self, name, url, read_timeout, retries=2, idempotent=True):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        name : str
+            エンドポイント名（計測の集計単位）
+        url : str
+            URL（前方一致で接続プールを割り当てます）
+        read_timeout : float
+            読み込みタイムアウト（秒）
+        retries : int, optional
+            再試行回数, by default 2
+        idempotent : bool, optional
+            再送しても問題ない場合はTrue, by default True
+            Falseの場合は接続エラー（リクエスト未送信）のみ再試行します
+        """
+        self.name = name
+        self.url = url
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.idempotent = idempotent
+
+    @property
+    def timeout(self):
+        """requestsに渡す（接続, 読み込み）タイムアウト"""
+        return (CONNECT_TIMEOUT_SECONDS, self.read_timeout)
+
+    def retry(self):
+        """
+        再試行の方針を生成する
+
+        Returns
+        -------
+        retry : Retry
+            urllib3の再試行設定
+        """
+        from urllib3.util.retry import Retry
+
+        if not self.idempotent:
+            return Retry(total=self.retries, connect=self.retries, read=0,
+                         status=0, other=0, allowed_methods=None)
+        return Retry(total=self.retries, connect=self.retries,
+                     read=self.retries, status=self.retries,
+                     backoff_factor=0.2, status_forcelist=RETRY_STATUS_CODES,
+                     allowed_methods=None, raise_on_status=False)
+
+
+_endpoints = {}
+_session = None
+_session_lock = threading.Lock()
+_lock = threading.Lock()
+_aggregates = {}
+
+
+def register_endpoint(endpoint):
+    """
+    エンドポイントを登録する
+    ※作成済みのセッションにも接続プールを割り当てます
+
+    Parameters
+    ----------
+    endpoint : Endpoint
+        エンドポイントの設定
+    """
+    with _session_lock:
+        _endpoints[endpoint.name] = endpoint
+        if _session is not None:
+            _mount(_session, endpoint)
+
+
+def _mount(session, endpoint):
+    from requests.adapters import HTTPAdapter
+
+    session.mount(endpoint.url, HTTPAdapter(
+        pool_connections=1, pool_maxsize=POOL_MAXSIZE,
+        max_retries=endpoint.retry()))
+
+
+def get_session():
+    """
+    共有セッションを取得する
+
+    Returns
+    -------
+    session : requests.Session
+        エンドポイントごとに接続プールを割り当てたセッション
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+
+                session = requests.Session()
+                for endpoint in _endpoints.values():
+                    _mount(session, endpoint)
+                _session = session
+    return _session
+
+
+def close_session():
+    """共有セッションを破棄する（接続を切断します）"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def request(endpoint_name, method, url=None, **kwargs):
+    """
+    共有セッションでリクエストを送信する
+
+    Parameters
+    ----------
+    endpoint_name : str
+        登録済みのエンドポイント名
+    method : str
+        HTTPメソッド
+    url : str, optional
+        URL, by default エンドポイントのURL
+    **kwargs
+        requestsに渡す引数（timeout省略時はエンドポイントの設定値）
+
+    Returns
+    -------
+    response : requests.Response
+        レスポンス
+    """
+    endpoint = _endpoints[endpoint_name]
+    kwargs.setdefault('timeout', endpoint.timeout)
+    status = None
+    start = time.monotonic()
+    try:
+        response = get_session().request(method, url or endpoint.url,
+                                         **kwargs)
+        status = response.status_code
+        return response
+    except Exception as e:
+        status = type(e).__name__
+        raise e
+    finally:
+        record(endpoint_name, method, status, time.monotonic() - start)
+
+
+def get(endpoint_name, url=None, **kwargs):
+    """GETリクエストを送信する（引数はrequestと同じ）"""
+    return request(endpoint_name, 'GET', url, **kwargs)
+
+
+def post(endpoint_name, url=None, **kwargs):
+    """POSTリクエストを送信する（引数はrequestと同じ）"""
+    return request(endpoint_name, 'POST', url, **kwargs)
+
+
+def record(endpoint_name, method, status, elapsed):
+    """
+    1回の呼び出しの所要時間を記録する
+
+    Parameters
+    ----------
+    endpoint_name : str
+        エンドポイント名
+    method : str
+        HTTPメソッド
+    status : int or str
+        ステータスコード（通信エラーの場合は例外クラス名）
+    elapsed : float
+        所要秒数（再試行を含む）
+    """
+    latency_ms = elapsed * 1000
+    error = not isinstance(status, int) or status >= 500
+    with _lock:
+        aggregate = _aggregates.get(endpoint_name)
+        if aggregate is None:
+            aggregate = _aggregates[endpoint_name] = {
+                'endpoint': endpoint_name,
+                'calls': 0,
+                'errors': 0,
+                'statuses': {},
+                'latencyMs': 0.0,
+                'maxLatencyMs': 0.0,
+            }
+        aggregate['calls'] += 1
+        if error:
+            aggregate['errors'] += 1
+        statuses = aggregate['statuses']
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        aggregate['latencyMs'] += latency_ms
+        aggregate['maxLatencyMs'] = max(aggregate['maxLatencyMs'], latency_ms)
+
+    if 0 < SLOW_CALL_MS <= latency_ms:
+        logger.warning('HTTP遅延: %s %s status=%s %.1fms',
+                       endpoint_name, method, status, latency_ms)
+
+
+def reset(context=None):
+    """
+    集計をリセットする
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    with _lock:
+        _aggregates.clear()
+
+
+def get_summary():
+    """
+    現在のLambda呼び出しでの集計を取得する
+
+    Returns
+    -------
+    summary : dict
+        合計値と、エンドポイントごとの集計
+    """
+    with _lock:
+        endpoints = [dict(aggregate, statuses=dict(aggregate['statuses']))
+                     for aggregate in _aggregates.values()]
+    for endpoint in endpoints:
+        endpoint['latencyMs'] = round(endpoint['latencyMs'], 3)
+        endpoint['maxLatencyMs'] = round(endpoint['maxLatencyMs'], 3)
+    endpoints.sort(key=lambda endpoint: -endpoint['latencyMs'])
+    return {
+        'calls': sum(endpoint['calls'] for endpoint in endpoints),
+        'latencyMs': round(sum(
+            endpoint['latencyMs'] for endpoint in endpoints), 3),
+        'endpoints': endpoints,
+    }
+
+
+def log_summary(context=None):
+    """
+    集計を1件のログとして出力する
+    ※HTTPの呼び出しがなかった場合は出力しません
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambdaのコンテキスト, by default None
+    """
+    summary = get_summary()
+    if not summary['calls']:
+        return
+    if context is not None:
+        summary['functionName'] = getattr(context, 'function_name', None)
+        summary['requestId'] = getattr(context, 'aws_request_id', None)
+    logger.info(json.dumps({'httpMetrics': summary}, ensure_ascii=False))
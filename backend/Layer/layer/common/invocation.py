@@ -0,0 +1,87 @@
+"""
+Lambda呼び出し単位の前処理・後処理モジュール
+※lambda_handlerに @invocation.handler を付与すると、
+※呼び出しの開始時・終了時に登録した処理を実行します
+
+"""
+import functools
+import logging
+
+from aws.dynamodb import metrics, retry
+from common import http_client
+
+# ログ出力の設定
+logger = logging.getLogger()
+
+_start_hooks = []
+_finish_hooks = []
+
+
+def add_start_hook(hook):
+    """
+    呼び出し開始時の処理を登録する
+
+    Parameters
+    ----------
+    hook : callable
+        Lambdaのコンテキストを引数とする関数
+    """
+    if hook not in _start_hooks:
+        _start_hooks.append(hook)
+
+
+def add_finish_hook(hook):
+    """
+    呼び出し終了時の処理を登録する
+    ※例外発生時も実行します
+
+    Parameters
+    ----------
+    hook : callable
+        Lambdaのコンテキストを引数とする関数
+    """
+    if hook not in _finish_hooks:
+        _finish_hooks.append(hook)
+
+
+def _run_hooks(hooks, context):
+    # 前処理・後処理のエラーで本処理を失敗させない
+    for hook in hooks:
+        try:
+            hook(context)
+        except Exception:
+            logger.exception('呼び出し前後処理でエラーが発生しました: %s', hook)
+
+
+def handler(func):
+    """
+    lambda_handler用のデコレータ
+
+    Parameters
+    ----------
+    func : callable
+        lambda_handler
+
+    Returns
+    -------
+    wrapper : callable
+        前処理・後処理を追加したlambda_handler
+    """
+    @functools.wraps(func)
+    def wrapper(event, context):
+        _run_hooks(_start_hooks, context)
+        try:
+            return func(event, context)
+        finally:
+            _run_hooks(_finish_hooks, context)
+    return wrapper
+
+
+# DynamoDBの再試行予算・計測は呼び出しごとにリセットし、集計を出力する
+add_start_hook(retry.begin_invocation)
+add_start_hook(metrics.reset)
+add_finish_hook(retry.log_invocation_stats)
+add_finish_hook(metrics.log_summary)
+# 外部APIの所要時間も同様に集計する
+add_start_hook(http_client.reset)
+add_finish_hook(http_client.log_summary)
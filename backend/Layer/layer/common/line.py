@@ -1,19 +1,135 @@
+import hashlib
 import logging
 import json
-import requests
-import json
-from linebot import LineBotApi
-from linebot.models import FlexSendMessage
-from linebot.exceptions import (
-    LineBotApiError, InvalidSignatureError)
-from requests.models import Response
+import os
+import threading
+import time
+
+from common import common_const, http_client
+from common.cache import MISSING, TTLCache
 
-from common import common_const
+# ※linebot（LINE Messaging API SDK）は読み込みに時間がかかるため、
+# ※メッセージ送信時に読み込みます
 
 # ログ出力の設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# IDトークンをローカルで検証するか（falseの場合は常にAPIで検証）
+ID_TOKEN_LOCAL_VERIFY = os.environ.get(
+    'LINE_ID_TOKEN_LOCAL_VERIFY', 'true').lower() == 'true'
+# IDトークンの署名アルゴリズム（これ以外はAPIで検証）
+ID_TOKEN_ALGORITHMS = ['ES256']
+# 署名鍵（JWKS）のキャッシュ秒数と、未知の鍵IDによる再取得の最短間隔
+JWKS_CACHE_SECONDS = int(
+    os.environ.get('LINE_JWKS_CACHE_SECONDS', 60 * 60 * 24))
+JWKS_REFRESH_INTERVAL_SECONDS = int(
+    os.environ.get('LINE_JWKS_REFRESH_INTERVAL_SECONDS', 60 * 5))
+# 検証済みIDトークンのキャッシュ件数
+ID_TOKEN_CACHE_MAX_ENTRIES = int(
+    os.environ.get('LINE_ID_TOKEN_CACHE_MAX_ENTRIES', 1000))
+
+# トークンごとのLineBotApi（コンテナが再利用される間は使い回す）
+LINE_BOT_API_CACHE_SIZE = 4
+_line_bot_apis = {}
+
+# LINEプラットフォームのエンドポイント（読み込みタイムアウトと再試行の方針）
+# ※トークン発行・メッセージ送信は再送すると重複するため接続エラーのみ再試行する
+http_client.register_endpoint(http_client.Endpoint(
+    'line.verify', common_const.const.API_USER_ID_URL,
+    read_timeout=float(os.environ.get('LINE_VERIFY_TIMEOUT_SECONDS', 3))))
+http_client.register_endpoint(http_client.Endpoint(
+    'line.jwks', common_const.const.API_JWKS_URL,
+    read_timeout=float(os.environ.get('LINE_JWKS_TIMEOUT_SECONDS', 3))))
+http_client.register_endpoint(http_client.Endpoint(
+    'line.accessToken', common_const.const.API_ACCESSTOKEN_URL,
+    read_timeout=float(os.environ.get('LINE_ACCESSTOKEN_TIMEOUT_SECONDS', 5)),
+    idempotent=False))
+http_client.register_endpoint(http_client.Endpoint(
+    'line.messaging', common_const.const.API_MESSAGING_URL,
+    read_timeout=float(os.environ.get('LINE_MESSAGING_TIMEOUT_SECONDS', 5)),
+    idempotent=False))
+
+
+class LineApiUnauthorizedError(Exception):
+    """チャネルアクセストークンが無効（401）の場合のエラー"""
+
+
+class LineHttpClient:
+    """
+    LineBotApi用のHTTPクライアント
+    ※linebot.http_client.RequestsHttpClientと同じインターフェースで、
+    ※共有セッションで送信し、Messaging APIの呼び出しとして計測します
+    """
+
+    def __init__(self, timeout=None):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        timeout : float or tuple, optional
+            タイムアウト（秒）, by default None（エンドポイントの設定値）
+        """
+        self.timeout = timeout
+
+    def _request(self, method, url, timeout, **kwargs):
+        from linebot.http_client import RequestsHttpResponse
+
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        return RequestsHttpResponse(http_client.request(
+            'line.messaging', method, url, **kwargs))
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return self._request('GET', url, timeout, headers=headers,
+                             params=params, stream=stream)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request('POST', url, timeout, headers=headers, data=data)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return self._request('DELETE', url, timeout, headers=headers,
+                             data=data)
+
+
+def get_line_bot_api(channel_access_token):
+    """
+    トークンに対応するLineBotApiを取得する
+
+    Parameters
+    channel_access_token:str
+        短期チャネルアクセストークン
+    Returns
+    -------
+    line_bot_api:LineBotApi
+        LineBotApi
+    """
+    line_bot_api = _line_bot_apis.get(channel_access_token)
+    if line_bot_api is None:
+        from linebot import LineBotApi
+
+        if len(_line_bot_apis) >= LINE_BOT_API_CACHE_SIZE:
+            _line_bot_apis.pop(next(iter(_line_bot_apis)))
+        # タイムアウトはエンドポイントの設定値を使用する
+        line_bot_api = LineBotApi(channel_access_token, timeout=None,
+                                  http_client=LineHttpClient)
+        _line_bot_apis[channel_access_token] = line_bot_api
+    return line_bot_api
+
+
+def discard_line_bot_api(channel_access_token):
+    """
+    無効になったトークンのLineBotApiを破棄する
+
+    Parameters
+    channel_access_token:str
+        短期チャネルアクセストークン
+    """
+    _line_bot_apis.pop(channel_access_token, None)
+
 
 def send_push_message(channel_access_token, flex_obj, user_id):
     """
@@ -30,9 +146,11 @@ def send_push_message(channel_access_token, flex_obj, user_id):
     response:dict
         レスポンス情報
     """
+    from linebot.exceptions import LineBotApiError, InvalidSignatureError
+    from linebot.models import FlexSendMessage
+
     try:
-        line_bot_api = LineBotApi(
-            channel_access_token)
+        line_bot_api = get_line_bot_api(channel_access_token)
         # flexdictを生成する
         flex_obj = FlexSendMessage.new_from_json_dict(flex_obj)
         user_id = user_id
@@ -40,8 +158,10 @@ def send_push_message(channel_access_token, flex_obj, user_id):
     except LineBotApiError as e:
         logger.error(
             'Got exception from LINE Messaging API: %s\n' % e.message)
-        for m in e.error.details:
+        for m in e.error.details or []:
             logger.error('  %s: %s' % (m.property, m.message))
+        if e.status_code == 401:
+            raise LineApiUnauthorizedError(e.message)
         raise Exception
     except InvalidSignatureError as e:
         logger.error('Occur Exception: %s', e)
@@ -50,28 +170,279 @@ def send_push_message(channel_access_token, flex_obj, user_id):
     return response
 
 
-def get_profile(id_token, channel_id):
+def issue_channel_access_token(channel_id, channel_secret):
+    """
+    短期チャネルアクセストークンを新規で発行する
+    Parameters
+    channel_id:str
+        LINE公式アカウントのチャネルID
+    channel_secret:str
+        チャネルシークレット
+    Returns
+    -------
+    access_token:str
+        短期チャネルアクセストークン
+    """
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    body = {
+        'grant_type': 'client_credentials',
+        'client_id': channel_id,
+        'client_secret': channel_secret
+    }
+
+    response = http_client.post(
+        'line.accessToken',
+        headers=headers,
+        data=body
+    )
+    logger.debug('new_channel_access_token %s', response.text)
+    res_body = json.loads(response.text)
+
+    return res_body['access_token']
+
+
+class IdTokenUndecidable(Exception):
+    """IDトークンをローカルで検証できない場合のエラー（APIでの検証が必要）"""
+
+
+def _id_token_error(description):
+    # 検証APIと同じ形式のエラーレスポンス
+    return {'error': 'invalid_request', 'error_description': description}
+
+
+class SigningKeyStore:
+    """
+    IDトークンの署名鍵（JWKS）の取得・キャッシュクラス
+    ※未知の鍵ID（kid）を受け取った場合は鍵のローテーションとみなして再取得します
+    """
+    __slots__ = ['_fetcher', '_cache_seconds', '_refresh_interval', '_keys',
+                 '_fetched_at', '_lock']
+
+    def __init__(self, fetcher=None, cache_seconds=JWKS_CACHE_SECONDS,
+                 refresh_interval=JWKS_REFRESH_INTERVAL_SECONDS):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        fetcher : callable, optional
+            JWKS（dict）を返す関数, by default LINEのエンドポイントから取得
+        cache_seconds : int, optional
+            鍵のキャッシュ秒数, by default JWKS_CACHE_SECONDS
+        refresh_interval : int, optional
+            未知の鍵IDによる再取得の最短間隔（秒）
+            by default JWKS_REFRESH_INTERVAL_SECONDS
+        """
+        self._fetcher = fetcher or self._fetch
+        self._cache_seconds = cache_seconds
+        self._refresh_interval = refresh_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fetch():
+        response = http_client.get('line.jwks')
+        response.raise_for_status()
+        return response.json()
+
+    def set_keys(self, jwks):
+        """
+        署名鍵を登録する
+        ※ローカルで生成した鍵での検証にも使用できます
+
+        Parameters
+        ----------
+        jwks : dict
+            JWKS（{'keys': [JWK, ...]}）
+        """
+        from jwt import PyJWK
+
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            try:
+                keys[jwk['kid']] = PyJWK(jwk).key
+            except Exception as e:
+                logger.warning('署名鍵を読み込めません: %s %s', jwk.get('kid'), e)
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def get_key(self, kid):
+        """
+        鍵IDに対応する署名鍵を取得する
+
+        Parameters
+        ----------
+        kid : str
+            鍵ID
+
+        Returns
+        -------
+        key : object
+            署名鍵
+
+        Raises
+        ------
+        IdTokenUndecidable
+            鍵を取得できない場合
+        """
+        with self._lock:
+            fetched_at = self._fetched_at
+            key = self._keys.get(kid)
+        now = time.monotonic()
+        expired = fetched_at is None \
+            or now - fetched_at >= self._cache_seconds
+        if key is not None and not expired:
+            return key
+        if not expired and now - fetched_at < self._refresh_interval:
+            raise IdTokenUndecidable('unknown kid: %s' % kid)
+
+        try:
+            self.set_keys(self._fetcher())
+        except Exception as e:
+            # 取得に失敗した場合は期限切れの鍵を使用する
+            if key is not None:
+                logger.warning('署名鍵の再取得に失敗しました: %s', e)
+                return key
+            raise IdTokenUndecidable('JWKS fetch failed: %s' % e)
+        with self._lock:
+            key = self._keys.get(kid)
+        if key is None:
+            raise IdTokenUndecidable('unknown kid: %s' % kid)
+        return key
+
+
+class IdTokenVerifier:
+    """
+    LIFFのIDトークンのローカル検証クラス
+    ※署名・aud・iss・exp・nonceを検証し、検証APIと同じ形式の結果を返します
+    ※検証済みのトークンはハッシュ値をキーとして有効期限（exp）までキャッシュします
+    """
+    __slots__ = ['key_store', 'issuer', '_cache']
+
+    def __init__(self, key_store=None, issuer=None,
+                 cache_size=ID_TOKEN_CACHE_MAX_ENTRIES):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        key_store : SigningKeyStore, optional
+            署名鍵の取得・キャッシュクラス, by default 新規生成
+        issuer : str, optional
+            発行者, by default common_const.const.ID_TOKEN_ISSUER
+        cache_size : int, optional
+            検証済みトークンのキャッシュ件数, by default ID_TOKEN_CACHE_MAX_ENTRIES
+        """
+        self.key_store = key_store or SigningKeyStore()
+        self.issuer = issuer or common_const.const.ID_TOKEN_ISSUER
+        self._cache = TTLCache(ttl=0, max_entries=cache_size)
+
+    def verify(self, id_token, channel_id, nonce=None):
+        """
+        IDトークンを検証する
+
+        Parameters
+        ----------
+        id_token : str
+            IDトークン
+        channel_id : str or int
+            使用アプリのLIFFチャネルID
+        nonce : str, optional
+            ログイン時に指定したnonce, by default None（検証しない）
+
+        Returns
+        -------
+        res_body : dict
+            検証に成功した場合はIDトークンのペイロード
+            失敗した場合は{'error', 'error_description'}
+
+        Raises
+        ------
+        IdTokenUndecidable
+            ローカルで検証できない場合
+        """
+        # audは文字列のため、各ハンドラのint型のチャネルIDは文字列で比較する
+        channel_id = str(channel_id)
+        cache_key = (hashlib.sha256(id_token.encode()).hexdigest(),
+                     channel_id, nonce)
+        claims = self._cache.get(cache_key)
+        if claims is not MISSING:
+            if claims['exp'] > time.time():
+                return dict(claims)
+
+        try:
+            import jwt
+        except ImportError as e:
+            raise IdTokenUndecidable(e)
+
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.DecodeError:
+            return _id_token_error('Invalid IdToken.')
+        if header.get('alg') not in ID_TOKEN_ALGORITHMS:
+            raise IdTokenUndecidable('unsupported alg: %s' % header.get('alg'))
+        key = self.key_store.get_key(header.get('kid'))
+
+        try:
+            claims = jwt.decode(
+                id_token, key, algorithms=ID_TOKEN_ALGORITHMS,
+                audience=channel_id, issuer=self.issuer,
+                options={'require': ['exp', 'iss', 'aud', 'sub']})
+        except jwt.ExpiredSignatureError:
+            return _id_token_error('IdToken expired.')
+        except jwt.InvalidAudienceError:
+            return _id_token_error('Invalid IdToken Audience.')
+        except jwt.InvalidIssuerError:
+            return _id_token_error('Invalid IdToken Issuer.')
+        except jwt.InvalidTokenError:
+            return _id_token_error('Invalid IdToken.')
+        except Exception as e:
+            # 想定外のエラーは検証APIでの検証に切り替える
+            raise IdTokenUndecidable('local verification failed: %r' % e)
+        if nonce is not None and claims.get('nonce') != nonce:
+            return _id_token_error('Invalid IdToken Nonce.')
+
+        self._cache.set(cache_key, claims, ttl=claims['exp'] - time.time())
+        return dict(claims)
+
+
+_id_token_verifier = IdTokenVerifier()
+
+
+def get_profile(id_token, channel_id, nonce=None):
     """
     LINEユーザー情報取得処理
+    ※IDトークンはローカルで検証し、検証できない場合のみ検証APIを呼び出します
     Parameters
     id_token:str
         IDトークン
     channel_id:dict
         使用アプリのLIFFチャネルID
+    nonce:str
+        ログイン時に指定したnonce（省略時は検証しない）
     Returns
     -------
     res_body:dict
         レスポンス情報
     """
-    
+    if ID_TOKEN_LOCAL_VERIFY:
+        try:
+            return _id_token_verifier.verify(id_token, channel_id, nonce)
+        except IdTokenUndecidable as e:
+            logger.info('IDトークンを検証APIで検証します: %s', e)
+
     headers = {'Content-Type': 'application/x-www-form-urlencoded'}
     body = {
         'id_token': id_token,
         'client_id': channel_id
     }
+    if nonce is not None:
+        body['nonce'] = nonce
 
-    response = requests.post(
-        common_const.const.API_USER_ID_URL,
+    response = http_client.post(
+        'line.verify',
         headers=headers,
         data=body
     )
@@ -0,0 +1,49 @@
+"""
+注文金額計算用モジュール
+
+"""
+from decimal import Decimal
+import math
+
+# 割引種別
+DISCOUNT_BY_PERCENTAGE = 1
+DISCOUNT_BY_PRICE = 2
+
+
+def calc_amount(order_items, amount_discount_way=None, amount_discount_rate=None):
+    """
+    注文合計金額を算出する
+    割引計算は切り捨て処理を行う
+    Parameters
+    ----------
+    order_items : dict
+        追加する注文情報
+    amount_discount_way: int
+        合計金額に対するクーポンの割引種別
+    amount_discount_rate: int
+        合計金額に対するクーポンの割引率/額
+    Returns
+    -------
+    amount : decimal
+        注文合計金額
+    """
+    amount = 0
+    # 商品単位割引計算
+    for item in order_items:
+        price = item['itemPrice']
+        if 'discountWay' in item:
+            if item['discountWay'] == DISCOUNT_BY_PRICE:
+                price = price - item['discountRate']
+            elif item['discountWay'] == DISCOUNT_BY_PERCENTAGE:
+                price = float(price) * (1 - float(item['discountRate']) * 0.01)
+        amount = amount + float(price) * float(item['quantity'])
+    # 全体割引計算
+    if amount_discount_way:
+        if amount_discount_way == DISCOUNT_BY_PRICE:
+            amount = amount - float(amount_discount_rate)
+        elif amount_discount_way == DISCOUNT_BY_PERCENTAGE:
+            amount = float(amount) * (1 - float(amount_discount_rate) * 0.01)
+    amount = Decimal(math.floor(amount))
+    # 0以下の場合は０円とする
+    amount = 0 if amount <= 0 else amount
+    return amount
@@ -0,0 +1,453 @@
+"""
+レシート送信キューモジュール
+※決済処理（put_cart_data・put_linepay_confirm）はレシートの送信依頼を
+※キューに登録するだけで、LINEへのプッシュ送信はキューを処理するLambda
+※（send_receipt）が行います
+※キューの実体は環境変数 RECEIPT_QUEUE_BACKEND で切り替えます
+※  sqs   : Amazon SQS（RECEIPT_QUEUE_URL）
+※  local : SQLite（RECEIPT_QUEUE_PATH、既定はインメモリ）。テスト・ローカル実行用
+
+使用例（ローカル）
+-------
+queue = receipt_queue.LocalReceiptQueue()
+receipt_queue.set_queue(queue)
+receipt_queue.enqueue_receipt(order_info, '2024/06/01 12:00:00', details_url)
+queue.drain(app.process_records)  # send_receipt/app.py
+print(queue.dead_letters())
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from common import utils
+
+# ※boto3は読み込みに時間がかかるため、SQSへの送信時に読み込みます
+
+# ログ出力の設定
+logger = logging.getLogger()
+
+# キューの実体（sqs / local）
+RECEIPT_QUEUE_BACKEND = os.environ.get('RECEIPT_QUEUE_BACKEND', 'sqs')
+# SQSのキューURL
+RECEIPT_QUEUE_URL = os.environ.get('RECEIPT_QUEUE_URL')
+# ローカルキューのファイルパス
+RECEIPT_QUEUE_PATH = os.environ.get('RECEIPT_QUEUE_PATH', ':memory:')
+# ローカルキューの最大処理回数（超えた場合はデッドレターへ移動）
+# ※SQSの場合はキューのRedrivePolicy（maxReceiveCount）を使用します
+RECEIPT_MAX_ATTEMPTS = int(os.environ.get('RECEIPT_MAX_ATTEMPTS', 5))
+# ローカルキューの処理中メッセージの不可視時間（秒）
+RECEIPT_VISIBILITY_TIMEOUT_SECONDS = float(
+    os.environ.get('RECEIPT_VISIBILITY_TIMEOUT_SECONDS', 30))
+# ローカルキューで処理に失敗したメッセージを再処理するまでの秒数
+RECEIPT_RETRY_DELAY_SECONDS = float(
+    os.environ.get('RECEIPT_RETRY_DELAY_SECONDS', 0))
+
+
+def build_message(order_info, paid_date_time, details_url):
+    """
+    レシート送信依頼のメッセージを生成する
+
+    Parameters
+    ----------
+    order_info : dict
+        注文情報（orderId, userId, amount）
+    paid_date_time : str
+        決済日時
+    details_url : str
+        注文明細のURL
+
+    Returns
+    -------
+    message : dict
+        メッセージ
+    """
+    return {
+        'orderId': order_info['orderId'],
+        'userId': order_info['userId'],
+        'amount': order_info['amount'],
+        'paidDateTime': paid_date_time,
+        'detailsUrl': details_url,
+    }
+
+
+def _dumps(message):
+    return json.dumps(message, ensure_ascii=False,
+                      default=utils.decimal_to_int)
+
+
+class SqsReceiptQueue:
+    """SQSのレシート送信キュー"""
+    __slots__ = ['_queue_url', '_fifo']
+
+    def __init__(self, queue_url):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        queue_url : str
+            キューURL
+            FIFOキュー（.fifo）の場合は注文IDで重複排除します
+        """
+        self._queue_url = queue_url
+        self._fifo = queue_url.endswith('.fifo')
+
+    def enqueue(self, message):
+        """
+        メッセージを登録する
+
+        Parameters
+        ----------
+        message : dict
+            build_messageで生成したメッセージ
+
+        Returns
+        -------
+        message_id : str
+            メッセージID
+        """
+        from aws import resources
+
+        params = {
+            'QueueUrl': self._queue_url,
+            'MessageBody': _dumps(message),
+        }
+        if self._fifo:
+            params['MessageGroupId'] = message['orderId']
+            params['MessageDeduplicationId'] = message['orderId']
+        try:
+            response = resources.get_client('sqs').send_message(**params)
+        except Exception as e:
+            raise e
+        return response['MessageId']
+
+
+class LocalReceiptQueue:
+    """
+    SQLiteのレシート送信キュー（テスト・ローカル実行用）
+    ※SQSと同じく、処理中のメッセージは不可視時間の間は受信されず、
+    ※最大処理回数を超えたメッセージはデッドレターに移動します
+    """
+    __slots__ = ['_connection', '_lock', '_max_attempts',
+                 '_visibility_timeout', '_retry_delay']
+
+    def __init__(self, path=':memory:', max_attempts=RECEIPT_MAX_ATTEMPTS,
+                 visibility_timeout=RECEIPT_VISIBILITY_TIMEOUT_SECONDS,
+                 retry_delay=RECEIPT_RETRY_DELAY_SECONDS):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        path : str, optional
+            SQLiteのファイルパス, by default ':memory:'
+        max_attempts : int, optional
+            最大処理回数, by default RECEIPT_MAX_ATTEMPTS
+        visibility_timeout : float, optional
+            処理中メッセージの不可視時間（秒）
+        retry_delay : float, optional
+            処理失敗から再処理までの秒数
+        """
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._max_attempts = max_attempts
+        self._visibility_timeout = visibility_timeout
+        self._retry_delay = retry_delay
+        with self._lock, self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at REAL NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS messages_visible_at
+                    ON messages (visible_at);
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY,
+                    order_id TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    failed_at REAL NOT NULL
+                );
+            ''')
+
+    def enqueue(self, message):
+        """
+        メッセージを登録する
+        ※同じ注文IDのメッセージが未処理の場合は登録しません（FIFOキューと同等）
+
+        Parameters
+        ----------
+        message : dict
+            build_messageで生成したメッセージ
+
+        Returns
+        -------
+        message_id : str
+            メッセージID（重複の場合は登録済みのメッセージID）
+        """
+        order_id = message['orderId']
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT id FROM messages WHERE order_id = ?',
+                (order_id,)).fetchone()
+            if row is not None:
+                return str(row['id'])
+            cursor = self._connection.execute(
+                'INSERT INTO messages (order_id, body) VALUES (?, ?)',
+                (order_id, _dumps(message)))
+        return str(cursor.lastrowid)
+
+    def receive(self, max_messages=10):
+        """
+        処理可能なメッセージを受信する
+        ※受信したメッセージは不可視時間の間、再受信されません
+
+        Parameters
+        ----------
+        max_messages : int, optional
+            最大受信件数, by default 10
+
+        Returns
+        -------
+        records : list
+            SQSイベントのRecordsと同じ形式（messageId, body, attempts）
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                'SELECT id, body, attempts FROM messages '
+                'WHERE visible_at <= ? ORDER BY id LIMIT ?',
+                (now, max_messages)).fetchall()
+            self._connection.executemany(
+                'UPDATE messages SET attempts = attempts + 1, '
+                'visible_at = ? WHERE id = ?',
+                [(now + self._visibility_timeout, row['id'])
+                 for row in rows])
+        return [{'messageId': str(row['id']), 'body': row['body'],
+                 'attempts': row['attempts'] + 1} for row in rows]
+
+    def delete(self, message_id):
+        """
+        処理済みのメッセージを削除する
+
+        Parameters
+        ----------
+        message_id : str
+            メッセージID
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM messages WHERE id = ?', (int(message_id),))
+
+    def fail(self, message_id):
+        """
+        処理に失敗したメッセージを再処理待ちに戻す
+        ※最大処理回数に達した場合はデッドレターに移動します
+
+        Parameters
+        ----------
+        message_id : str
+            メッセージID
+
+        Returns
+        -------
+        dead_lettered : bool
+            デッドレターに移動した場合はTrue
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT id, order_id, body, attempts FROM messages '
+                'WHERE id = ?', (int(message_id),)).fetchone()
+            if row is None:
+                return False
+            if row['attempts'] < self._max_attempts:
+                self._connection.execute(
+                    'UPDATE messages SET visible_at = ? WHERE id = ?',
+                    (now + self._retry_delay, row['id']))
+                return False
+            self._connection.execute(
+                'INSERT OR REPLACE INTO dead_letters '
+                '(id, order_id, body, attempts, failed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (row['id'], row['order_id'], row['body'], row['attempts'],
+                 now))
+            self._connection.execute(
+                'DELETE FROM messages WHERE id = ?', (row['id'],))
+        logger.error('レシート送信が%s回失敗したため、デッドレターに移動しました: %s',
+                     row['attempts'], row['order_id'])
+        return True
+
+    def drain(self, process, batch_size=10):
+        """
+        処理可能なメッセージがなくなるまで、バッチ単位で処理する
+
+        Parameters
+        ----------
+        process : callable
+            受信したメッセージのリストを引数とし、
+            処理に失敗したメッセージIDのリストを返す関数
+        batch_size : int, optional
+            1回に処理する件数, by default 10
+
+        Returns
+        -------
+        stats : dict
+            処理件数（processed）・失敗件数（failed）・
+            デッドレターへの移動件数（deadLettered）
+        """
+        stats = {'processed': 0, 'failed': 0, 'deadLettered': 0}
+        while True:
+            records = self.receive(batch_size)
+            if not records:
+                return stats
+            failures = set(process(records))
+            for record in records:
+                message_id = record['messageId']
+                if message_id not in failures:
+                    self.delete(message_id)
+                    stats['processed'] += 1
+                    continue
+                stats['failed'] += 1
+                if self.fail(message_id):
+                    stats['deadLettered'] += 1
+
+    def dead_letters(self):
+        """
+        デッドレターのメッセージを取得する
+
+        Returns
+        -------
+        messages : list
+            メッセージ（attempts: 処理回数を付与）
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT body, attempts FROM dead_letters ORDER BY id'
+            ).fetchall()
+        return [dict(json.loads(row['body']), attempts=row['attempts'])
+                for row in rows]
+
+    def redrive(self):
+        """
+        デッドレターのメッセージを再処理待ちに戻す
+
+        Returns
+        -------
+        count : int
+            戻した件数
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO messages (order_id, body) '
+                'SELECT order_id, body FROM dead_letters ORDER BY id')
+            self._connection.execute('DELETE FROM dead_letters')
+        return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM messages').fetchone()[0]
+
+    def close(self):
+        """接続を閉じる"""
+        self._connection.close()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """
+    環境変数で指定したキューを取得する
+    ※コンテナが再利用される間は同じキューを使用します
+
+    Returns
+    -------
+    queue : SqsReceiptQueue or LocalReceiptQueue
+        レシート送信キュー
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if RECEIPT_QUEUE_BACKEND == 'local':
+                    _queue = LocalReceiptQueue(RECEIPT_QUEUE_PATH)
+                elif RECEIPT_QUEUE_URL:
+                    _queue = SqsReceiptQueue(RECEIPT_QUEUE_URL)
+                else:
+                    raise ValueError(
+                        'Specify RECEIPT_QUEUE_URL as environment variable.')
+    return _queue
+
+
+def set_queue(queue):
+    """
+    使用するキューを差し替える（テスト用）
+
+    Parameters
+    ----------
+    queue : SqsReceiptQueue or LocalReceiptQueue
+        レシート送信キュー（Noneの場合は環境変数から再生成）
+    """
+    global _queue
+    with _queue_lock:
+        _queue = queue
+
+
+def enqueue_receipt(order_info, paid_date_time, details_url):
+    """
+    レシートの送信を依頼する
+
+    Parameters
+    ----------
+    order_info : dict
+        注文情報（orderId, userId, amount）
+    paid_date_time : str
+        決済日時
+    details_url : str
+        注文明細のURL
+
+    Returns
+    -------
+    message_id : str
+        メッセージID
+    """
+    return get_queue().enqueue(
+        build_message(order_info, paid_date_time, details_url))
+
+
+def enqueue_receipt_safely(order_info, paid_date_time, details_url):
+    """
+    レシートの送信を依頼する（決済処理から呼び出す）
+    ※プッシュ送信はキューを処理するLambda（send_receipt）が行います
+    ※決済は完了しているため、依頼に失敗した場合もエラーにはしません
+
+    Parameters
+    ----------
+    order_info : dict
+        注文情報（orderId, userId, amount）
+    paid_date_time : str
+        決済日時
+    details_url : str
+        注文明細のURL
+
+    Returns
+    -------
+    message_id : str
+        メッセージID（依頼に失敗した場合はNone）
+    """
+    try:
+        return enqueue_receipt(order_info, paid_date_time, details_url)
+    except Exception:
+        logger.exception('レシートの送信依頼に失敗しました: %s',
+                         order_info['orderId'])
+        return None
@@ -0,0 +1,146 @@
+"""
+遅延生成リソースの登録モジュール
+※テーブル操作クラスや外部SDKのクライアントを初回使用時に生成します
+※モジュールを「パッケージ.モジュール:属性名」の文字列で登録すると、
+※importも初回使用時まで遅延するため、コールドスタート時の読み込みを減らせます
+
+"""
+import importlib
+import threading
+
+
+def resolve(target):
+    """
+    「パッケージ.モジュール:属性名」形式の文字列から属性を取得する
+    ※属性名は「クラス名.メソッド名」のようにドット区切りで指定できます
+
+    Parameters
+    ----------
+    target : str or callable
+        属性のパス（callableの場合はそのまま返却）
+
+    Returns
+    -------
+    attribute : object
+        モジュールの属性
+    """
+    if callable(target):
+        return target
+    module_name, _, attribute = target.partition(':')
+    result = importlib.import_module(module_name)
+    for name in filter(None, attribute.split('.')):
+        result = getattr(result, name)
+    return result
+
+
+class LazyRegistry:
+    """
+    遅延生成リソースの登録クラス
+    ※登録したリソースは属性として参照できます（registry.item_info_table）
+    """
+
+    def __init__(self):
+        """初期化メソッド"""
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, *args, **kwargs):
+        """
+        リソースを登録する
+
+        Parameters
+        ----------
+        name : str
+            リソース名
+        factory : str or callable
+            リソースを生成する関数・クラス
+            文字列の場合は「パッケージ.モジュール:属性名」形式
+        *args, **kwargs
+            生成時に渡す引数
+        """
+        with self._lock:
+            self._factories[name] = (factory, args, kwargs)
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        """
+        リソースを取得する
+        ※初回呼び出し時に生成し、以降は同じインスタンスを返却します
+
+        Parameters
+        ----------
+        name : str
+            リソース名
+
+        Returns
+        -------
+        instance : object
+            リソース
+
+        Raises
+        ------
+        KeyError
+            登録されていない場合
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                factory, args, kwargs = self._factories[name]
+                instance = resolve(factory)(*args, **kwargs)
+                self._instances[name] = instance
+        return instance
+
+    def set(self, name, instance):
+        """
+        生成済みのリソースを登録する（差し替え用）
+
+        Parameters
+        ----------
+        name : str
+            リソース名
+        instance : object
+            リソース
+        """
+        with self._lock:
+            self._factories.setdefault(name, (lambda: instance, (), {}))
+            self._instances[name] = instance
+
+    def reset(self, name=None):
+        """
+        生成済みのリソースを破棄する（次回参照時に再生成します）
+
+        Parameters
+        ----------
+        name : str, optional
+            リソース名, by default None（全件）
+        """
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def is_loaded(self, name):
+        """
+        リソースが生成済みか判定する
+
+        Parameters
+        ----------
+        name : str
+            リソース名
+
+        Returns
+        -------
+        loaded : bool
+            生成済みの場合はTrue
+        """
+        return name in self._instances
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._factories:
+            raise AttributeError(name)
+        return self.get(name)
@@ -0,0 +1,192 @@
+"""
+stale-while-revalidate方式のスナップショットキャッシュモジュール
+※有効期限を過ぎたスナップショットはそのまま返却し、裏でスレッドを起動して再取得します
+※最大保持期間を過ぎた場合は呼び出し元で再取得し、失敗した場合は古いスナップショットを返します
+※取得（loader の呼び出し）は同時に1スレッドでのみ実行します
+※Lambdaではレスポンス返却後にコンテナが停止するため、
+※裏での再取得は次回以降の呼び出し中に完了する場合があります
+
+"""
+import logging
+import threading
+import time
+
+# ログ出力の設定
+logger = logging.getLogger()
+
+
+class Snapshot:
+    """取得済みのスナップショット"""
+    __slots__ = ['data', 'loaded_at']
+
+    def __init__(self, data, loaded_at):
+        self.data = data
+        self.loaded_at = loaded_at
+
+    def age(self):
+        """取得してからの経過秒数"""
+        return time.monotonic() - self.loaded_at
+
+
+class SnapshotCache:
+    """stale-while-revalidate方式のスナップショットキャッシュ"""
+    __slots__ = ['name', 'loader', 'ttl', 'max_age', 'retry_interval',
+                 'background', '_snapshot', '_refreshing', '_failed_at',
+                 '_lock', '_load_lock', '_counters']
+
+    def __init__(self, name, loader, ttl, max_age, retry_interval=5.0,
+                 background=True):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        name : str
+            ログ出力用の名前
+        loader : callable
+            スナップショットのデータを取得する関数
+            （裏での再取得時は別スレッドから呼び出されます）
+            ※同時に複数のスレッドから呼び出されることはありません
+        ttl : float
+            再取得を始めるまでの秒数
+        max_age : float
+            古いスナップショットを返却できる最大秒数
+        retry_interval : float, optional
+            再取得に失敗した後、次に再取得するまでの秒数, by default 5.0
+        background : bool, optional
+            有効期限切れの再取得を別スレッドで行う場合はTrue, by default True
+        """
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_age = max(max_age, ttl)
+        self.retry_interval = retry_interval
+        self.background = background
+        self._snapshot = None
+        self._refreshing = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+        # loaderの呼び出しを1スレッドに限定する
+        self._load_lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ['fresh', 'stale', 'loads', 'backgroundLoads', 'failures',
+             'staleFallbacks'], 0)
+
+    def get(self):
+        """
+        スナップショットを取得する
+
+        Returns
+        -------
+        snapshot : Snapshot
+            スナップショット
+
+        Raises
+        ------
+        Exception
+            初回取得に失敗した場合
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._load_sync(None)
+
+        age = snapshot.age()
+        if age < self.ttl:
+            self._count('fresh')
+            return snapshot
+        if age < self.max_age:
+            self._count('stale')
+            self._start_refresh()
+            return snapshot
+        return self._load_sync(snapshot)
+
+    def invalidate(self):
+        """スナップショットを破棄する"""
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self):
+        """
+        スナップショットの利用状況を取得する
+
+        Returns
+        -------
+        stats : dict
+            取得・返却の回数と、現在のスナップショットの経過秒数
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            return dict(self._counters, age=round(
+                snapshot.age(), 3) if snapshot else None)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _load(self):
+        data = self.loader()
+        snapshot = Snapshot(data, time.monotonic())
+        with self._lock:
+            self._snapshot = snapshot
+            self._failed_at = None
+        return snapshot
+
+    def _load_sync(self, stale):
+        with self._lock:
+            # 直前に失敗している場合は再取得せず古いデータを返却する
+            if stale is not None and self._failed_at is not None \
+                    and time.monotonic() - self._failed_at \
+                    < self.retry_interval:
+                self._counters['staleFallbacks'] += 1
+                return stale
+        with self._load_lock:
+            # 待機中に他のスレッドが取得した場合はそのスナップショットを返却する
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot is not stale \
+                    and snapshot.age() < self.max_age:
+                return snapshot
+            self._count('loads')
+            try:
+                return self._load()
+            except Exception as e:
+                if stale is None:
+                    raise e
+                with self._lock:
+                    self._failed_at = time.monotonic()
+                    self._counters['failures'] += 1
+                    self._counters['staleFallbacks'] += 1
+                logger.warning(
+                    '%s: 再取得に失敗したため古いデータを返却します(%.0f秒経過) %s',
+                    self.name, stale.age(), e)
+                return stale
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._refreshing or (
+                    self._failed_at is not None
+                    and time.monotonic() - self._failed_at
+                    < self.retry_interval):
+                return
+            self._refreshing = True
+        if not self.background:
+            self._refresh()
+            return
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self._load_lock:
+                # 待機中に呼び出し元で再取得済みの場合は取得しない
+                snapshot = self._snapshot
+                if snapshot is not None and snapshot.age() < self.ttl:
+                    return
+                self._count('backgroundLoads')
+                self._load()
+        except Exception as e:
+            with self._lock:
+                self._failed_at = time.monotonic()
+                self._counters['failures'] += 1
+            logger.warning('%s: 再取得に失敗しました %s', self.name, e)
+        finally:
+            with self._lock:
+                self._refreshing = False
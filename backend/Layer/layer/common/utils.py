@@ -3,11 +3,31 @@
 """
 from decimal import Decimal
 from datetime import (datetime, timedelta)
+import base64
+import binascii
 import decimal
+import gzip
+import hashlib
+import json
 import os
 
 from common import common_const
 
+# レスポンスを圧縮する最小サイズ（バイト）
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+# gzipの圧縮レベル（1〜9）
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+# brotliの圧縮品質（0〜11）
+COMPRESSION_BROTLI_QUALITY = int(
+    os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+# API GatewayのBinaryMediaTypes（template.yaml）に指定したメディアタイプ
+# ※Acceptヘッダーの先頭の型が一致しない場合、API GatewayはBase64のボディを
+# ※バイナリに変換しないため圧縮しません
+COMPRESSION_BINARY_MEDIA_TYPES = frozenset(
+    media_type.strip().lower() for media_type in os.environ.get(
+        'COMPRESSION_BINARY_MEDIA_TYPES', 'application/json').split(',')
+    if media_type.strip())
+
 
 def create_response(status_code, body):
     """
@@ -66,6 +86,330 @@ def create_success_response(body):
     return create_response(200, body)
 
 
+def get_header(event, name):
+    """
+    リクエストヘッダーを取得する（ヘッダー名の大文字・小文字は区別しない）
+
+    Parameters
+    ----------
+    event : dict
+        Lambdaのイベント
+    name : str
+        ヘッダー名
+
+    Returns
+    -------
+    value : str
+        ヘッダーの値（存在しない場合はNone）
+    """
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def get_request_body(event):
+    """
+    リクエストボディを取得する
+    ※API GatewayのバイナリメディアタイプによりBase64エンコードされた場合は
+    ※デコードして返却します
+
+    Parameters
+    ----------
+    event : dict
+        Lambdaのイベント
+
+    Returns
+    -------
+    body : str
+        リクエストボディ
+    """
+    body = event.get('body')
+    if body is not None and event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def _get_brotli():
+    # brotliは任意の依存パッケージのため、未インストールの場合はgzipのみ使用する
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def accepts_binary(accept):
+    """
+    API Gatewayが圧縮したレスポンスをバイナリに変換するか判定する
+    ※Acceptヘッダーの先頭の型がCOMPRESSION_BINARY_MEDIA_TYPESに含まれる場合のみ
+    ※変換されます
+
+    Parameters
+    ----------
+    accept : str
+        Acceptヘッダーの値
+
+    Returns
+    -------
+    accepted : bool
+        変換される場合はTrue
+    """
+    if not accept:
+        return False
+    media_type = accept.split(',')[0].split(';')[0].strip().lower()
+    return media_type in COMPRESSION_BINARY_MEDIA_TYPES
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Accept-Encodingから使用する圧縮方式を決定する
+    ※品質値（q）の高い方式を優先し、同じ場合はbr、gzipの順に優先します
+
+    Parameters
+    ----------
+    accept_encoding : str
+        Accept-Encodingヘッダーの値
+
+    Returns
+    -------
+    encoding : str
+        'br'・'gzip'（圧縮しない場合はNone）
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            qualities[coding] = quality
+
+    candidates = ['br', 'gzip'] if _get_brotli() is not None else ['gzip']
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress_body(body, encoding):
+    """
+    レスポンスボディを圧縮する
+
+    Parameters
+    ----------
+    body : str or bytes
+        レスポンスボディ
+    encoding : str
+        'br'または'gzip'
+
+    Returns
+    -------
+    compressed : bytes
+        圧縮したボディ
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if encoding == 'br':
+        return _get_brotli().compress(
+            body, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0として、同じボディからは同じ圧縮結果を生成する
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, event, min_bytes=None):
+    """
+    Accept-Encodingに応じてレスポンスボディを圧縮する
+    ※圧縮したボディはBase64エンコードし、isBase64Encodedを設定します
+    ※（API GatewayのBinaryMediaTypesによりバイナリとして返却されます）
+    ※Acceptヘッダーがバイナリに変換される型でない場合は圧縮しません
+    ※大きなJSONを返却するハンドラで、create_success_responseの結果に適用します
+
+    Parameters
+    ----------
+    response : dict
+        create_responseで作成したレスポンス
+    event : dict
+        Lambdaのイベント
+    min_bytes : int, optional
+        圧縮する最小サイズ, by default COMPRESSION_MIN_BYTES
+
+    Returns
+    -------
+    response : dict
+        レスポンス（圧縮しない場合は元のレスポンス）
+    """
+    if min_bytes is None:
+        min_bytes = COMPRESSION_MIN_BYTES
+    headers = response.setdefault('headers', {})
+    # キャッシュが圧縮方式ごとにレスポンスを区別できるよう、常に付与する
+    headers['Vary'] = 'Accept, Accept-Encoding'
+    body = response.get('body')
+    if (response.get('statusCode') != 200 or response.get('isBase64Encoded')
+            or not isinstance(body, str)):
+        return response
+    data = body.encode('utf-8')
+    if len(data) < min_bytes:
+        return response
+    if not accepts_binary(get_header(event, 'Accept')):
+        return response
+    encoding = negotiate_encoding(get_header(event, 'Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    compressed = compress_body(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    headers['Content-Encoding'] = encoding
+    # 圧縮後は元のボディとバイト列が異なるため、ETagは弱いETagとする
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = 'W/' + etag
+    headers.setdefault('Content-Type', 'application/json; charset=utf-8')
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
+
+
+def compute_etag(body=None, version=None):
+    """
+    レスポンスのETagを生成する
+
+    Parameters
+    ----------
+    body : str, optional
+        レスポンスボディ（同じボディからは常に同じETagを生成します）
+    version : str, optional
+        カタログのバージョン
+        指定した場合はボディの代わりにバージョンから生成します
+        ※同じバージョン・リクエストで常に同じボディとなる場合に使用します
+
+    Returns
+    -------
+    etag : str
+        ETag（ダブルクォートで囲んだ文字列）
+    """
+    source = 'version:%s' % version if version is not None else body
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    return '"%s"' % hashlib.blake2b(source, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """
+    If-None-MatchのいずれかのETagと一致するか判定する
+    ※If-None-Matchは弱い比較（W/の有無を区別しない）で判定します
+
+    Parameters
+    ----------
+    if_none_match : str
+        If-None-Matchヘッダーの値
+    etag : str
+        現在のETag
+
+    Returns
+    -------
+    matched : bool
+        一致する場合はTrue
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+
+def build_cache_control(max_age, stale_while_revalidate=0, private=False):
+    """
+    Cache-Controlヘッダーの値を生成する
+
+    Parameters
+    ----------
+    max_age : int
+        キャッシュの有効秒数（0以下の場合は毎回ETagで再検証）
+    stale_while_revalidate : int, optional
+        有効期限後に古いキャッシュを返しつつ再検証する秒数, by default 0
+    private : bool, optional
+        ブラウザのみキャッシュする場合はTrue, by default False（CDNも可）
+
+    Returns
+    -------
+    cache_control : str
+        Cache-Controlヘッダーの値
+    """
+    if max_age <= 0:
+        return 'no-cache'
+    directives = ['private' if private else 'public', 'max-age=%d' % max_age]
+    if stale_while_revalidate > 0:
+        directives.append(
+            'stale-while-revalidate=%d' % stale_while_revalidate)
+    return ', '.join(directives)
+
+
+def cache_response(response, event, max_age=0, stale_while_revalidate=0,
+                   version=None, private=False):
+    """
+    レスポンスにETag・Cache-Controlを設定する
+    ※If-None-MatchがETagと一致する場合は、ボディなしの304を返却します
+    ※compress_responseより前に適用してください（ETagは圧縮前のボディから生成）
+
+    Parameters
+    ----------
+    response : dict
+        create_responseで作成したレスポンス
+    event : dict
+        Lambdaのイベント
+    max_age : int, optional
+        キャッシュの有効秒数, by default 0
+    stale_while_revalidate : int, optional
+        有効期限後に古いキャッシュを返しつつ再検証する秒数, by default 0
+    version : str, optional
+        カタログのバージョン（compute_etagを参照）, by default None
+    private : bool, optional
+        ブラウザのみキャッシュする場合はTrue, by default False
+
+    Returns
+    -------
+    response : dict
+        ETag・Cache-Controlを設定したレスポンス、または304のレスポンス
+    """
+    body = response.get('body')
+    if response.get('statusCode') != 200 or not isinstance(body, str):
+        return response
+    etag = compute_etag(body, version)
+    headers = response.setdefault('headers', {})
+    headers['ETag'] = etag
+    headers['Cache-Control'] = build_cache_control(
+        max_age, stale_while_revalidate, private)
+    if_none_match = get_header(event, 'If-None-Match')
+    if not etag_matches(if_none_match, etag):
+        return response
+    # 圧縮したレスポンスの弱いETagで再検証された場合は、同じETagを返却する
+    if 'W/' + etag in if_none_match:
+        headers['ETag'] = 'W/' + etag
+    not_modified = create_response(304, '')
+    not_modified['headers'].update(headers)
+    return not_modified
+
+
 def separate_comma(num):
     """
     数値を3桁毎のカンマ区切りにする
@@ -104,6 +448,156 @@ def decimal_to_int(obj):
         return int(obj)
 
 
+def encode_cursor(key):
+    """
+    DynamoDBのLastEvaluatedKeyを、APIで返却するカーソル文字列に変換する
+
+    Parameters
+    ----------
+    key : dict
+        LastEvaluatedKey（Noneの場合は最終ページ）
+
+    Returns
+    -------
+    cursor : str
+        URLセーフなBase64文字列（最終ページの場合はNone）
+    """
+    if not key:
+        return None
+    data = json.dumps(key, default=decimal_to_int, separators=(',', ':'),
+                      sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列をExclusiveStartKeyに変換する
+
+    Parameters
+    ----------
+    cursor : str
+        encode_cursorで生成した文字列
+
+    Returns
+    -------
+    key : dict
+        ExclusiveStartKey
+
+    Raises
+    ------
+    ValueError
+        カーソルの形式が不正な場合
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(data.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('invalid cursor: %s' % cursor)
+    if not isinstance(key, dict):
+        raise ValueError('invalid cursor: %s' % cursor)
+    return key
+
+
+class ResponseBuffer:
+    """
+    レスポンスボディの書き込み先
+    ※Lambda（Python）はレスポンスストリーミングに対応していないため、その代替として
+    ※書き込まれた文字列を保持し、getvalue()で1つのボディとして返却します
+    """
+    __slots__ = ['_chunks', 'writes', 'size']
+
+    def __init__(self):
+        """初期化メソッド"""
+        self._chunks = []
+        self.writes = 0
+        self.size = 0
+
+    def write(self, data):
+        """
+        文字列を書き込む
+
+        Parameters
+        ----------
+        data : str
+            書き込む文字列
+        """
+        self._chunks.append(data)
+        self.writes += 1
+        self.size += len(data)
+
+    def getvalue(self):
+        """
+        書き込まれた文字列を取得する
+
+        Returns
+        -------
+        body : str
+            書き込まれた文字列を連結したもの
+        """
+        return ''.join(self._chunks)
+
+
+def write_json_array(pages, stream, default=decimal_to_int,
+                     ensure_ascii=False):
+    """
+    DynamoDBのページ単位のレスポンスを、JSON配列として1ページずつ書き込む
+    ※json.dumps(全アイテムのリスト, default=default, ensure_ascii=ensure_ascii)
+    ※と同じ文字列を出力し、保持するアイテムは1ページ分のみです
+
+    Parameters
+    ----------
+    pages : iterator
+        ページ単位のレスポンス（Itemsを含むdict）のイテレータ
+    stream : object
+        write(str)を持つ書き込み先（ResponseBufferなど）
+    default : callable, optional
+        JSONに変換できない値の変換関数, by default decimal_to_int
+    ensure_ascii : bool, optional
+        非ASCII文字をエスケープする場合はTrue, by default False
+
+    Returns
+    -------
+    count : int
+        書き込んだアイテム数
+    """
+    encoder = json.JSONEncoder(default=default, ensure_ascii=ensure_ascii)
+    stream.write('[')
+    count = 0
+    for page in pages:
+        items = page.get('Items', [])
+        if not items:
+            continue
+        chunk = ', '.join(encoder.encode(item) for item in items)
+        stream.write(chunk if count == 0 else ', ' + chunk)
+        count += len(items)
+    stream.write(']')
+    return count
+
+
+def dumps_json_array(pages, default=decimal_to_int, ensure_ascii=False):
+    """
+    DynamoDBのページ単位のレスポンスをJSON配列の文字列に変換する
+    ※write_json_arrayでResponseBufferに書き込みます
+
+    Parameters
+    ----------
+    pages : iterator
+        ページ単位のレスポンス（Itemsを含むdict）のイテレータ
+    default : callable, optional
+        JSONに変換できない値の変換関数, by default decimal_to_int
+    ensure_ascii : bool, optional
+        非ASCII文字をエスケープする場合はTrue, by default False
+
+    Returns
+    -------
+    body : str
+        JSON配列の文字列
+    """
+    buffer = ResponseBuffer()
+    write_json_array(pages, buffer, default, ensure_ascii)
+    return buffer.getvalue()
+
+
 def float_to_int(obj):
     """
     float型をint型に変換する。
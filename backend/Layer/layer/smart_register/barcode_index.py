@@ -0,0 +1,278 @@
+"""
+商品情報のバーコード索引モジュール
+※ビルド時に商品情報をバイナリ形式の索引ファイルに変換してLayerに同梱し、
+※実行時はメモリマップしてDynamoDBを呼び出さずに検索します
+※索引はtools/build_barcode_index.pyで作成します
+
+索引ファイルの形式（リトルエンディアン）
+-----------------------------------------
+ヘッダ（64バイト）
+    magic(4) 'SRBI' / 形式バージョン(2) / キー幅(2) / 件数(4) /
+    レコード開始位置(4) / 文字列プール開始位置(8) / 作成日時(8, UNIX秒) /
+    索引バージョン(32, UTF-8をNUL埋め)
+レコード（件数 × (キー幅 + 8)バイト、バーコード昇順）
+    バーコード(キー幅, ASCIIをNUL埋め) / プール内の位置(4) / 長さ(4)
+文字列プール
+    商品情報のJSON（UTF-8）を連結したもの
+
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from decimal import Decimal
+
+# ログ出力の設定
+logger = logging.getLogger()
+
+MAGIC = b'SRBI'
+FORMAT_VERSION = 1
+KEY_WIDTH = 16
+HEADER = struct.Struct('<4sHHIIQQ32s')
+RECORD_VALUE = struct.Struct('<II')
+
+# 索引ファイルのパス（存在しない場合は索引を使用しない）
+INDEX_PATH = os.environ.get('ITEM_INDEX_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'item_index.bin')
+# 使用する索引バージョン（指定した場合は一致しない索引を使用しない）
+EXPECTED_VERSION = os.environ.get('ITEM_INDEX_VERSION', '')
+# 索引の有効秒数（作成日時からの経過秒数、0以下で無制限）
+MAX_AGE_SECONDS = float(os.environ.get('ITEM_INDEX_MAX_AGE_SECONDS', 0))
+
+
+class IndexFormatError(Exception):
+    """索引ファイルの形式が不正な場合のエラー"""
+
+
+def _encode_key(barcode):
+    key = str(barcode).encode('ascii')
+    if not key or len(key) > KEY_WIDTH or b'\0' in key:
+        raise ValueError('barcode: %r' % barcode)
+    return key.ljust(KEY_WIDTH, b'\0')
+
+
+def _default(value):
+    # DynamoDBの数値（Decimal）はJSONの数値として出力する
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() \
+            else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError('%s is not JSON serializable' % type(value).__name__)
+
+
+def write_index(items, path, version):
+    """
+    商品情報から索引ファイルを作成する
+    ※同じバーコードが複数ある場合は後のものを使用します
+
+    Parameters
+    ----------
+    items : iterable
+        商品情報（barcodeを含むdict）
+    path : str
+        出力先のパス
+    version : str
+        索引バージョン（32バイト以内）
+
+    Returns
+    -------
+    count : int
+        登録件数
+    """
+    version_bytes = version.encode('utf-8')
+    if len(version_bytes) > 32:
+        raise ValueError('version must be 32 bytes or less: %s' % version)
+
+    records = {}
+    for item in items:
+        try:
+            key = _encode_key(item['barcode'])
+        except (KeyError, ValueError, UnicodeEncodeError):
+            logger.warning('索引に登録できない商品です: %s', item.get('barcode'))
+            continue
+        records[key] = json.dumps(
+            item, ensure_ascii=False, separators=(',', ':'),
+            default=_default).encode('utf-8')
+
+    keys = sorted(records)
+    records_offset = HEADER.size
+    pool_offset = records_offset + len(keys) * (KEY_WIDTH + RECORD_VALUE.size)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, KEY_WIDTH, len(keys),
+                            records_offset, pool_offset, int(time.time()),
+                            version_bytes))
+        position = 0
+        for key in keys:
+            f.write(key)
+            f.write(RECORD_VALUE.pack(position, len(records[key])))
+            position += len(records[key])
+        for key in keys:
+            f.write(records[key])
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class _Keys:
+    """レコードのバーコードをシーケンスとして参照する（二分探索用）"""
+    __slots__ = ['_mm', '_offset', '_count', '_size']
+
+    def __init__(self, mm, offset, count):
+        self._mm = mm
+        self._offset = offset
+        self._count = count
+        self._size = KEY_WIDTH + RECORD_VALUE.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = self._offset + i * self._size
+        return self._mm[start:start + KEY_WIDTH]
+
+
+class BarcodeIndex:
+    """メモリマップした索引ファイルの検索クラス"""
+    __slots__ = ['path', 'version', 'built_at', '_file', '_mm', '_keys',
+                 '_count', '_records_offset', '_pool_offset']
+
+    def __init__(self, path):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        path : str
+            索引ファイルのパス
+
+        Raises
+        ------
+        IndexFormatError
+            索引ファイルの形式が不正な場合
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise IndexFormatError('%s: %s' % (path, e))
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise IndexFormatError('%s: too short' % path)
+        (magic, format_version, key_width, self._count, self._records_offset,
+         self._pool_offset, self.built_at, version) = HEADER.unpack_from(
+            self._mm)
+        if magic != MAGIC or format_version != FORMAT_VERSION \
+                or key_width != KEY_WIDTH:
+            self.close()
+            raise IndexFormatError('%s: unsupported format' % path)
+        self.version = version.rstrip(b'\0').decode('utf-8')
+        self._keys = _Keys(self._mm, self._records_offset, self._count)
+
+    def __len__(self):
+        return self._count
+
+    def age(self):
+        """作成してからの経過秒数"""
+        return time.time() - self.built_at
+
+    def get(self, barcode, fields=None):
+        """
+        バーコードに対応する商品情報を取得する
+
+        Parameters
+        ----------
+        barcode : str
+            バーコードナンバー
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Returns
+        -------
+        item : dict
+            商品情報（数値はDecimal型）
+            索引に存在しない場合はNone
+        """
+        try:
+            key = _encode_key(barcode)
+        except (ValueError, UnicodeEncodeError):
+            return None
+        i = bisect_left(self._keys, key)
+        if i >= self._count or self._keys[i] != key:
+            return None
+        position, length = RECORD_VALUE.unpack_from(
+            self._mm, self._records_offset
+            + i * (KEY_WIDTH + RECORD_VALUE.size) + KEY_WIDTH)
+        start = self._pool_offset + position
+        item = json.loads(self._mm[start:start + length].decode('utf-8'),
+                          parse_float=Decimal, parse_int=Decimal)
+        if fields:
+            item = {field: item[field] for field in fields if field in item}
+        return item
+
+    def close(self):
+        """メモリマップを解放する"""
+        self._mm.close()
+        self._file.close()
+
+
+_index = None
+_loaded = False
+
+
+def get_index():
+    """
+    Layerに同梱した索引を取得する
+    ※初回呼び出し時に読み込み、コンテナが再利用される間は使い回します
+
+    Returns
+    -------
+    index : BarcodeIndex
+        索引
+        索引ファイルが存在しない・形式が不正・古い場合はNone
+    """
+    global _index, _loaded
+    if _loaded:
+        return _index
+    _loaded = True
+    if not os.path.exists(INDEX_PATH):
+        return None
+    try:
+        index = BarcodeIndex(INDEX_PATH)
+    except (OSError, IndexFormatError) as e:
+        logger.warning('商品索引を読み込めません: %s', e)
+        return None
+    if EXPECTED_VERSION and index.version != EXPECTED_VERSION:
+        logger.warning('商品索引のバージョンが一致しないため使用しません: %s (expected %s)',  # noqa: E501
+                       index.version, EXPECTED_VERSION)
+        index.close()
+        return None
+    if 0 < MAX_AGE_SECONDS < index.age():
+        logger.warning('商品索引が古いため使用しません: %s (%.0f秒経過)',
+                       index.version, index.age())
+        index.close()
+        return None
+    logger.info('商品索引を使用します: %s (%d件)', index.version, len(index))
+    _index = index
+    return _index
+
+
+def set_index(index):
+    """
+    使用する索引を差し替える
+    ※Noneを指定すると索引を使用しません
+
+    Parameters
+    ----------
+    index : BarcodeIndex
+        索引
+    """
+    global _index, _loaded
+    _index = index
+    _loaded = True
@@ -1,9 +1,20 @@
 """
 SmartRegisterCouponInfo操作用モジュール
+※クーポン情報はテーブル全体のスナップショットをコンテナ内で保持し、
+※有効期限切れ後は古いスナップショットを返却しながら裏で再取得します
 
 """
 import os
 from aws.dynamodb.base import DynamoDB
+from common.snapshot import SnapshotCache
+
+# クーポン情報のスナップショットの有効期限・最大保持期間（秒、0で無効）
+CATALOG_TTL_SECONDS = float(
+    os.environ.get('COUPON_CATALOG_TTL_SECONDS', 60))
+CATALOG_MAX_AGE_SECONDS = float(
+    os.environ.get('COUPON_CATALOG_MAX_AGE_SECONDS', 600))
+
+_catalog = None
 
 
 class SmartRegisterCouponInfo(DynamoDB):
@@ -16,14 +27,71 @@ class SmartRegisterCouponInfo(DynamoDB):
         super().__init__(table_name)
         self._table = self._db.Table(table_name)
 
-    def get_item(self, coupon_id):
+    def _load_catalog(self):
+        """
+        テーブル全体を取得する
+        ※裏での再取得時は別スレッドから呼び出されるため、再取得専用のテーブルを使用します
+
+        Returns
+        -------
+        catalog : dict
+            クーポンIDをキーとするクーポン情報（削除済みを含む）
+
+        """
+        pages = self._paginate(self._snapshot_table().scan)
+        return {item['couponId']: item for item in self._iter_items(pages)}
+
+    def _get_catalog(self):
+        """
+        クーポン情報のスナップショットを取得する
+
+        Returns
+        -------
+        catalog : dict
+            クーポンIDをキーとするクーポン情報
+            スナップショットが無効な場合はNone
+
+        """
+        global _catalog
+        if CATALOG_TTL_SECONDS <= 0:
+            return None
+        if _catalog is None:
+            _catalog = SnapshotCache(
+                'クーポン情報', self._load_catalog, CATALOG_TTL_SECONDS,
+                CATALOG_MAX_AGE_SECONDS)
+        return _catalog.get().data
+
+    @staticmethod
+    def catalog_stats():
+        """
+        クーポン情報のスナップショットの利用状況を取得する
+
+        Returns
+        -------
+        stats : dict
+            取得・返却の回数と経過秒数
+            スナップショット未使用の場合はNone
+
+        """
+        return _catalog.stats() if _catalog is not None else None
+
+    @staticmethod
+    def _project(item, fields):
+        if not fields:
+            return dict(item)
+        return {field: item[field] for field in fields if field in item}
+
+    def get_item(self, coupon_id, fields=None):
         """
         データ取得
+        ※スナップショットにない場合のみテーブルから取得します
 
         Parameters
         ----------
         coupon_id : str
             クーポンID
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -31,17 +99,98 @@ class SmartRegisterCouponInfo(DynamoDB):
             クーポン情報
 
         """
+        catalog = self._get_catalog()
+        if catalog is not None and coupon_id in catalog:
+            return self._project(catalog[coupon_id], fields)
+
         key = {'couponId': coupon_id}
 
         try:
-            item = self._get_item(key)
+            item = self._get_item(key, fields)
         except Exception as e:
             raise e
         return item
 
+    def batch_get_items(self, coupon_ids, fields=None):
+        """
+        複数データを一括取得
+        ※スナップショットにないクーポンIDのみテーブルから取得します
+
+        Parameters
+        ----------
+        coupon_ids : list
+            クーポンIDのリスト
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Returns
+        -------
+        items : dict
+            クーポンIDをキーとするクーポン情報
+
+        """
+        items = {}
+        catalog = self._get_catalog()
+        if catalog is not None:
+            items = {coupon_id: self._project(catalog[coupon_id], fields)
+                     for coupon_id in coupon_ids if coupon_id in catalog}
+            coupon_ids = [coupon_id for coupon_id in coupon_ids
+                          if coupon_id not in items]
+            if not coupon_ids:
+                return items
+
+        try:
+            items.update(
+                self._batch_get_item('couponId', coupon_ids, fields))
+        except Exception as e:
+            raise e
+        return items
+
+    def iter_not_deleted(self, page_size=None, max_items=None):
+        """
+        削除済みでないアイテムを1件ずつ取得する
+
+        Parameters
+        ----------
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+
+        Yields
+        -------
+        item : dict
+            クーポン情報
+
+        """
+        return self._scan_iter('deleted', '', page_size, max_items)
+
+    def iter_not_deleted_pages(self, page_size=None):
+        """
+        削除済みでないアイテムをページ単位で取得する
+        ※スナップショットが有効な場合はテーブルを参照せず、1ページで返却します
+
+        Parameters
+        ----------
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報（Items）
+
+        """
+        catalog = self._get_catalog()
+        if catalog is not None:
+            return iter([{'Items': [dict(item) for item in catalog.values()
+                                    if item.get('deleted') == '']}])
+        return self._scan_pages('deleted', '', page_size)
+
     def scan_not_deleted(self):
         """
         削除済みでないアイテムを取得する
+        ※スナップショットが有効な場合はテーブルを参照しません
 
         Returns
         -------
@@ -49,8 +198,13 @@ class SmartRegisterCouponInfo(DynamoDB):
             クーポン情報
 
         """
+        catalog = self._get_catalog()
+        if catalog is not None:
+            return [dict(item) for item in catalog.values()
+                    if item.get('deleted') == '']
+
         try:
-            items = self._scan('deleted', '')
+            items = list(self.iter_not_deleted())
         except Exception as e:
             raise e
         return items
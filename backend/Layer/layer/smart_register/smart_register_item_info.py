@@ -1,10 +1,24 @@
 """
 SmartRegisterItemInfo操作用モジュール
+※取得結果はコンテナ内でキャッシュし、存在しない商品も一定時間キャッシュします
+※Layerに商品索引を同梱している場合は、索引に存在する商品をテーブルから取得しません
 
 """
+import copy
 import os
 
 from aws.dynamodb.base import DynamoDB
+from common.cache import MISSING, TTLCache
+from smart_register import barcode_index
+
+# 商品情報キャッシュ（Lambdaの呼び出しをまたいで保持）
+_cache = TTLCache(
+    ttl=float(os.environ.get('ITEM_CACHE_TTL_SECONDS', 300)),
+    negative_ttl=float(os.environ.get(
+        'ITEM_CACHE_NEGATIVE_TTL_SECONDS', 60)),
+    max_entries=int(os.environ.get('ITEM_CACHE_MAX_ENTRIES', 10000)),
+    max_bytes=int(os.environ.get('ITEM_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+)
 
 
 class SmartRegisterItemInfo(DynamoDB):
@@ -17,14 +31,55 @@ class SmartRegisterItemInfo(DynamoDB):
         super().__init__(table_name)
         self._table = self._db.Table(table_name)
 
-    def get_item(self, barcode):
+    @staticmethod
+    def _cache_key(barcode, fields):
+        return (barcode, tuple(fields) if fields else None)
+
+    @staticmethod
+    def cache_stats():
+        """
+        商品情報キャッシュの利用状況を取得する
+
+        Returns
+        -------
+        stats : dict
+            ヒット・ミス・削除の回数と、現在の件数・メモリ使用量
+
+        """
+        return _cache.stats()
+
+    @staticmethod
+    def clear_cache():
+        """商品情報キャッシュを全件削除する"""
+        _cache.clear()
+
+    def scan_barcodes(self):
+        """
+        登録済みの全バーコードを取得する
+        ※Bloomフィルタの再作成時は別スレッドから呼び出されるため、再取得専用のテーブルを使用します
+
+        Yields
+        -------
+        barcode : str
+            バーコードナンバー
+
+        """
+        pages = self._paginate(self._snapshot_table().scan,
+                               ProjectionExpression='barcode')
+        for item in self._iter_items(pages):
+            yield item['barcode']
+
+    def get_item(self, barcode, fields=None):
         """
         データ取得
+        ※索引・キャッシュにない場合のみテーブルから取得します
 
         Parameters
         ----------
         barcode : str
             バーコードナンバー
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -32,10 +87,68 @@ class SmartRegisterItemInfo(DynamoDB):
             クーポン情報
 
         """
+        index = barcode_index.get_index()
+        if index is not None:
+            item = index.get(barcode, fields)
+            if item is not None:
+                return item
+
+        cache_key = self._cache_key(barcode, fields)
+        item = _cache.get(cache_key)
+        if item is not MISSING:
+            return copy.deepcopy(item)
+
         key = {'barcode': barcode}
 
         try:
-            item = self._get_item(key)
+            item = self._get_item(key, fields)
         except Exception as e:
             raise e
+        _cache.set(cache_key, copy.deepcopy(item), negative=not item)
         return item
+
+    def batch_get_items(self, barcodes, fields=None):
+        """
+        複数データを一括取得
+        ※索引・キャッシュにないバーコードのみテーブルから取得します
+
+        Parameters
+        ----------
+        barcodes : list
+            バーコードナンバーのリスト
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Returns
+        -------
+        items : dict
+            バーコードナンバーをキーとする商品情報
+
+        """
+        items = {}
+        misses = []
+        index = barcode_index.get_index()
+        for barcode in dict.fromkeys(barcodes):
+            if index is not None:
+                item = index.get(barcode, fields)
+                if item is not None:
+                    items[barcode] = item
+                    continue
+            item = _cache.get(self._cache_key(barcode, fields))
+            if item is MISSING:
+                misses.append(barcode)
+            elif item:
+                items[barcode] = copy.deepcopy(item)
+        if not misses:
+            return items
+
+        try:
+            fetched = self._batch_get_item('barcode', misses, fields)
+        except Exception as e:
+            raise e
+        for barcode in misses:
+            item = fetched.get(barcode, {})
+            _cache.set(self._cache_key(barcode, fields), copy.deepcopy(item),
+                       negative=not item)
+        items.update(fetched)
+        return items
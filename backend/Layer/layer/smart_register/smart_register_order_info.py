@@ -2,15 +2,52 @@
 SmartRegisterOrderInfo操作用モジュール
 # TODO: 動作確認後docString記載
 """
-from logging import Logger
+import logging
 import os
+import time
+import uuid
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 from datetime import datetime
 from dateutil.tz import gettz
 
 
 from aws.dynamodb.base import DynamoDB
 
+# ログ出力の設定
+logger = logging.getLogger()
+
+# 注文日時順の取得に使用するインデックス（射影属性は注文履歴の要約のみ）
+SUMMARY_INDEX = 'userId-orderDateTime-index'
+# 注文履歴の要約の属性名（SUMMARY_INDEXの射影属性）
+SUMMARY_FIELDS = (
+    'orderId', 'orderDateTime', 'paidDateTime', 'amount', 'discountWay',
+    'discountRate', 'itemCount',
+)
+# 注文履歴（要約以外）のページ取得で既定で返却する属性名
+# （userId-orderId-indexの射影属性と注文日時、全件取得と同じ属性を返却する）
+HISTORY_FIELDS = (
+    'orderId', 'userId', 'orderDateTime', 'paidDateTime', 'amount', 'item',
+    'discountWay', 'discountRate',
+)
+
+
+def count_items(item):
+    """
+    注文明細の購入点数（数量の合計）を取得する
+
+    Parameters
+    ----------
+    item : list
+        注文明細
+
+    Returns
+    -------
+    item_count : int
+        購入点数
+    """
+    return sum(int(order_item.get('quantity', 0)) for order_item in item)
+
 
 class SmartRegisterOrderInfo(DynamoDB):
     """SmartRegisterOrderInfo操作用クラス"""
@@ -22,7 +59,7 @@ class SmartRegisterOrderInfo(DynamoDB):
         super().__init__(table_name)
         self._table = self._db.Table(table_name)
 
-    def get_item(self, order_id):
+    def get_item(self, order_id, fields=None):
         """
         データ取得
 
@@ -30,6 +67,8 @@ class SmartRegisterOrderInfo(DynamoDB):
         ----------
         order_id : str
             注文ID
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
 
         Returns
         -------
@@ -40,7 +79,7 @@ class SmartRegisterOrderInfo(DynamoDB):
         key = {'orderId': order_id}
 
         try:
-            item = self._get_item(key)
+            item = self._get_item(key, fields)
         except Exception as e:
             raise e
         return item
@@ -110,6 +149,7 @@ class SmartRegisterOrderInfo(DynamoDB):
         update_expression = (
             'set #item = :item, '
             '#amount = :amount, '
+            '#itemCount = :itemCount, '
             '#discountWay = :discountWay, '
             '#discountRate = :discountRate, '
             '#orderDateTime = :orderDateTime, '
@@ -119,6 +159,7 @@ class SmartRegisterOrderInfo(DynamoDB):
         expression_attribute_names = {
             '#item': 'item',
             '#amount': 'amount',
+            '#itemCount': 'itemCount',
             '#discountWay': 'discountWay',
             '#discountRate': 'discountRate',
             '#orderDateTime': 'orderDateTime',
@@ -128,6 +169,7 @@ class SmartRegisterOrderInfo(DynamoDB):
         expression_value = {
             ':item': item,
             ':amount': amount,
+            ':itemCount': count_items(item),
             ':discountWay': amount_discount_way,
             ':discountRate': amount_discount_rate,
             ':oid': order_id,
@@ -194,6 +236,102 @@ class SmartRegisterOrderInfo(DynamoDB):
             raise e
         return item
 
+    def claim_receipt(self, order_id, timeout_seconds):
+        """
+        レシートの送信処理中であることを記録する（送信の開始前に呼び出す）
+        ※送信済み、または他の処理が送信中の注文は記録できないため、
+        ※同じ注文のレシートを同時に送信することはありません
+        ※送信中の記録からtimeout_seconds経過した場合は、送信処理が中断した
+        ※（タイムアウト・異常終了）とみなし、再試行の処理が引き継ぎます
+
+        Parameters
+        ----------
+        order_id : str
+            注文ID
+        timeout_seconds : int
+            送信中の記録を引き継ぐまでの秒数
+
+        Returns
+        -------
+        claimed : bool
+            記録できた場合はTrue
+            送信済み・送信中、または注文が存在しない場合はFalse
+        """
+        now = int(time.time())
+        key = {'orderId': order_id}
+        update_expression = 'set #receiptClaimedAt = :receiptClaimedAt'
+        condition_expression = (
+            'attribute_exists(#orderId) AND '
+            'attribute_not_exists(#receiptSentDateTime) AND '
+            '(attribute_not_exists(#receiptClaimedAt) OR '
+            '#receiptClaimedAt < :staleBefore)')
+        expression_attribute_names = {
+            '#orderId': 'orderId',
+            '#receiptSentDateTime': 'receiptSentDateTime',
+            '#receiptClaimedAt': 'receiptClaimedAt',
+        }
+        expression_value = {
+            ':receiptClaimedAt': now,
+            ':staleBefore': now - timeout_seconds,
+        }
+        try:
+            self._update_item_optional(
+                key, update_expression,
+                condition_expression, expression_attribute_names,
+                expression_value, 'NONE')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':  # noqa: E501
+                raise
+            return False
+        return True
+
+    def complete_receipt(self, order_id):
+        """
+        レシートの送信済み日時を記録する（送信の成功後に呼び出す）
+
+        Parameters
+        ----------
+        order_id : str
+            注文ID
+        """
+        now_str = datetime.now(
+            gettz('Asia/Tokyo')).strftime("%Y/%m/%d %H:%M:%S")
+        try:
+            self._call(
+                self._table.update_item,
+                Key={'orderId': order_id},
+                UpdateExpression=(
+                    'set #receiptSentDateTime = :receiptSentDateTime '
+                    'remove #receiptClaimedAt'),
+                ExpressionAttributeNames={
+                    '#receiptSentDateTime': 'receiptSentDateTime',
+                    '#receiptClaimedAt': 'receiptClaimedAt'},
+                ExpressionAttributeValues={
+                    ':receiptSentDateTime': now_str},
+            )
+        except Exception as e:
+            raise e
+
+    def release_receipt(self, order_id):
+        """
+        レシートの送信中の記録を削除する（送信失敗時の再送用）
+
+        Parameters
+        ----------
+        order_id : str
+            注文ID
+        """
+        try:
+            self._call(
+                self._table.update_item,
+                Key={'orderId': order_id},
+                UpdateExpression='remove #receiptClaimedAt',
+                ExpressionAttributeNames={
+                    '#receiptClaimedAt': 'receiptClaimedAt'},
+            )
+        except Exception as e:
+            raise e
+
     def put_item(self, order_id, user_id, item, amount, 
                  discount_way, discount_rate, transaction_id, expiration_date):
         now_str = datetime.now(
@@ -207,44 +345,285 @@ class SmartRegisterOrderInfo(DynamoDB):
             'transactionId': transaction_id,
             'expirationDate': expiration_date,
             'item': item,
+            'itemCount': count_items(item),
             'orderDateTime': now_str,
             'updateDateTime': now_str,
         }
         # 決済金額が0以下の場合は、支払処理を実施
         if amount<=0:
             item['paidDateTime'] = now_str
-        print(item)
+        logger.debug('注文情報を登録します: %s', order_id)
         try:
             self._put_item(item)
         except Exception as e:
             raise e
         return item
 
-    def query_index_hash(self, user_id):
+    def upsert_item(self, order_id, user_id, item, amount,
+                    discount_way, discount_rate, expiration_date):
         """
-        userId-orderId-indexのインデックスで検索を行う
+        未会計の注文情報を更新する
+        更新できない場合は、新しい注文IDで新規登録する
+        ※存在確認の読み込みは行わず、1回の条件付き書き込みで更新します
+        ※存在しない（TTLで削除済み・クライアントが生成した）注文ID、会計済み、
+        ※または他ユーザーの注文IDが指定された場合は条件チェックで失敗するため、
+        ※指定された注文IDは再利用せず、新しい注文IDで新規登録します
 
         Parameters
         ----------
+        order_id : str
+            注文ID
         user_id : str
             ユーザーID
+        item : dict
+            注文情報
+        amount : int
+            合計金額
+        discount_way : int
+            合計金額に対するクーポンの割引種別
+        discount_rate : int
+            合計金額に対するクーポンの割引率/額
+        expiration_date : str
+            TTLの削除日
 
         Returns
         -------
-        items : list
+        order_id : str
+            更新・登録した注文ID
+
+        """
+        now_str = datetime.now(
+            gettz('Asia/Tokyo')).strftime("%Y/%m/%d %H:%M:%S")
+        key = {'orderId': order_id}
+        update_expression = (
+            'set #userId = :userId, '
+            '#item = :item, '
+            '#amount = :amount, '
+            '#itemCount = :itemCount, '
+            '#discountWay = :discountWay, '
+            '#discountRate = :discountRate, '
+            '#transactionId = if_not_exists(#transactionId, :transactionId), '
+            '#orderDateTime = :orderDateTime, '
+            '#updateDateTime = :updateDateTime, '
+            '#expirationDate = :expirationDate')
+        # 登録済みの本人の未会計の注文のみ更新可能
+        condition_expression = (
+            'attribute_exists(#orderId) AND '
+            'attribute_not_exists(#paidDateTime) AND #userId = :userId')
+        expression_attribute_names = {
+            '#orderId': 'orderId',
+            '#userId': 'userId',
+            '#item': 'item',
+            '#amount': 'amount',
+            '#itemCount': 'itemCount',
+            '#discountWay': 'discountWay',
+            '#discountRate': 'discountRate',
+            '#transactionId': 'transactionId',
+            '#orderDateTime': 'orderDateTime',
+            '#updateDateTime': 'updateDateTime',
+            '#expirationDate': 'expirationDate',
+            '#paidDateTime': 'paidDateTime',
+        }
+        expression_value = {
+            ':userId': user_id,
+            ':item': item,
+            ':amount': amount,
+            ':itemCount': count_items(item),
+            ':discountWay': discount_way,
+            ':discountRate': discount_rate,
+            ':transactionId': 0,
+            ':orderDateTime': now_str,
+            ':updateDateTime': now_str,
+            ':expirationDate': expiration_date,
+        }
+        # 決済金額が0以下の場合は、支払処理を実施
+        if amount <= 0:
+            update_expression = update_expression + ', #paidDateTime = :paidDateTime'  # noqa: E501
+            expression_value[':paidDateTime'] = now_str
+        return_value = 'NONE'
+        try:
+            self._update_item_optional(
+                key, update_expression,
+                condition_expression, expression_attribute_names,
+                expression_value, return_value)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':  # noqa: E501
+                raise
+            # 未登録・会計済み・他ユーザーの注文は更新せず、新しい注文として登録
+            order_id = str(uuid.uuid4())
+            self.put_item(order_id, user_id, item, amount,
+                          discount_way, discount_rate, 0, expiration_date)
+        return order_id
+
+    def iter_index_hash(self, user_id, page_size=None, max_items=None,
+                        fields=None):
+        """
+        userId-orderId-indexのインデックスで検索を行い、1件ずつ返却する
+        ※1MBを超える結果もページをたどって取得します
+
+        Parameters
+        ----------
+        user_id : str
+            ユーザーID
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        max_items : int, optional
+            取得する最大件数, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Yields
+        -------
+        item : dict
             注文情報
 
         """
         index = 'userId-orderId-index'
         expression = Key('userId').eq(user_id)
 
+        return self._query_index_iter(
+            index, expression, page_size=page_size, max_items=max_items,
+            fields=fields)
+
+    def iter_index_hash_pages(self, user_id, page_size=None, fields=None):
+        """
+        userId-orderId-indexのインデックスで検索を行い、ページ単位で返却する
+        ※次のページは前のページを消費した時点で取得します
+
+        Parameters
+        ----------
+        user_id : str
+            ユーザーID
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報
+
+        """
+        index = 'userId-orderId-index'
+        expression = Key('userId').eq(user_id)
+
+        return self._query_index_pages(
+            index, expression, page_size=page_size, fields=fields)
+
+    def query_index_hash(self, user_id, fields=None):
+        """
+        userId-orderId-indexのインデックスで検索を行う
+
+        Parameters
+        ----------
+        user_id : str
+            ユーザーID
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
+        Returns
+        -------
+        items : list
+            注文情報
+
+        """
         try:
-            items = self._query_index(index, expression)
+            items = list(self.iter_index_hash(user_id, fields=fields))
         except Exception as e:
             raise e
         return items
 
-    def query_index_hash_range(self, user_id, order_id):
+    def iter_summary_pages(self, user_id, page_size=None, ascending=False,
+                           fields=None):
+        """
+        注文履歴の要約を注文日時順にページ単位で返却する
+        ※要約用のインデックスは注文明細（item）を含まないため、
+        ※注文件数が多い場合も読み込み量は注文明細を含む場合の数分の1です
+
+        Parameters
+        ----------
+        user_id : str
+            ユーザーID
+        page_size : int, optional
+            1ページあたりの最大評価件数, by default None
+        ascending : bool, optional
+            注文日時の古い順の場合はTrue, by default False（新しい順）
+        fields : list, optional
+            取得する属性名のリスト, by default None（SUMMARY_FIELDS）
+
+        Yields
+        -------
+        response : dict
+            1ページ分のレスポンス情報
+
+        """
+        expression = Key('userId').eq(user_id)
+
+        return self._query_index_pages(
+            SUMMARY_INDEX, expression, page_size=page_size,
+            fields=fields or SUMMARY_FIELDS, scan_index_forward=ascending)
+
+    def query_page_by_user(self, user_id, limit, exclusive_start_key=None,
+                           ascending=False, fields=None, summary=False):
+        """
+        userId-orderDateTime-indexのインデックスで、注文日時順に1ページ分を取得する
+        ※取得件数はlimitまでのため、注文件数によらず応答サイズは一定です
+        ※インデックスの射影属性は注文履歴の要約のみのため、summary以外の場合は
+        ※インデックスから1ページ分の注文IDを取得し、テーブルから一括取得します
+
+        Parameters
+        ----------
+        user_id : str
+            ユーザーID
+        limit : int
+            取得する最大件数
+        exclusive_start_key : dict, optional
+            前ページのLastEvaluatedKey, by default None（先頭から取得）
+        ascending : bool, optional
+            注文日時の古い順の場合はTrue, by default False（新しい順）
+        fields : list, optional
+            取得する属性名のリスト, by default None
+            （HISTORY_FIELDS、summaryの場合はSUMMARY_FIELDS）
+        summary : bool, optional
+            注文履歴の要約を取得する場合はTrue, by default False
+
+        Returns
+        -------
+        items : list
+            注文情報
+        last_evaluated_key : dict
+            次ページの開始キー（最終ページの場合はNone）
+
+        """
+        expression = Key('userId').eq(user_id)
+        index_fields = (fields or SUMMARY_FIELDS) if summary else ['orderId']
+
+        items = []
+        last_evaluated_key = None
+        try:
+            for page in self._query_index_pages(
+                    SUMMARY_INDEX, expression, page_size=limit,
+                    max_items=limit, exclusive_start_key=exclusive_start_key,
+                    fields=index_fields, scan_index_forward=ascending):
+                items.extend(page.get('Items', []))
+                last_evaluated_key = page.get('LastEvaluatedKey')
+            if not summary:
+                order_ids = [item['orderId'] for item in items]
+                # 取引ID・レシート送信状況などの内部属性は返却しない
+                orders = self._batch_get_item(
+                    'orderId', order_ids, fields or HISTORY_FIELDS)
+                # インデックスの順序で並べ、指定外のキー属性は除外する
+                items = [orders[order_id] for order_id in order_ids
+                         if order_id in orders]
+                if fields and 'orderId' not in fields:
+                    for item in items:
+                        del item['orderId']
+        except Exception as e:
+            raise e
+        return items, last_evaluated_key
+
+    def query_index_hash_range(self, user_id, order_id, fields=None):
         """
         userId-orderId-indexのインデックスで検索を行う
 
@@ -254,6 +633,9 @@ class SmartRegisterOrderInfo(DynamoDB):
             ユーザーID
         order_id : str
             注文ID
+        fields : list, optional
+            取得する属性名のリスト, by default None（全属性）
+
         Returns
         -------
         items : list
@@ -264,7 +646,81 @@ class SmartRegisterOrderInfo(DynamoDB):
         expression = Key('userId').eq(user_id) & Key('orderId').eq(order_id)
 
         try:
-            items = self._query_index(index, expression)
+            items = self._query_index(index, expression, fields=fields)
         except Exception as e:
             raise e
         return items
+
+    def update_item_count(self, order_id, item_count):
+        """
+        購入点数を更新する
+        ※購入点数の追加前に登録された注文情報の移行に使用します
+
+        Parameters
+        ----------
+        order_id : str
+            注文ID
+        item_count : int
+            購入点数
+
+        """
+        key = {'orderId': order_id}
+        update_expression = 'set #itemCount = :itemCount'
+        # 移行中に削除（TTL）された注文は登録し直さない
+        condition_expression = 'attribute_exists(#orderId)'
+        expression_attribute_names = {
+            '#orderId': 'orderId',
+            '#itemCount': 'itemCount',
+        }
+        expression_value = {
+            ':itemCount': item_count
+        }
+        try:
+            self._update_item_optional(
+                key, update_expression,
+                condition_expression, expression_attribute_names,
+                expression_value, 'NONE')
+        except Exception as e:
+            raise e
+
+    def scan_all(self, total_segments=None, max_workers=None):
+        """
+        全注文情報を並列scanで1件ずつ取得する
+        ※集計処理など、テーブル全体を走査する場合に使用します
+
+        Parameters
+        ----------
+        total_segments : int, optional
+            分割数, by default PARALLEL_SCAN_SEGMENTS
+        max_workers : int, optional
+            スレッド数, by default total_segmentsと同数
+
+        Yields
+        -------
+        item : dict
+            注文情報（順序は不定）
+
+        """
+        return self._parallel_scan_iter(
+            total_segments=total_segments, max_workers=max_workers)
+
+    def count(self, total_segments=None):
+        """
+        注文情報の件数を取得する
+
+        Parameters
+        ----------
+        total_segments : int, optional
+            指定した場合は指定数のセグメントで並列scanする, by default None
+
+        Returns
+        -------
+        count : int
+            注文情報の件数
+
+        """
+        try:
+            count = self._get_table_size(total_segments)
+        except Exception as e:
+            raise e
+        return count
@@ -0,0 +1,387 @@
+"""
+バーコードの事前チェックモジュール
+※JAN-8(EAN-8)・UPC-A・JAN-13(EAN-13)のチェックディジットを検証し、
+※商品マスタから作成したBloomフィルタで「確実に未登録」のバーコードを判定します
+※Bloomフィルタは誤って「登録済みかもしれない」と判定する（偽陽性）ことはありますが、
+※登録済みのバーコードを未登録と判定することはありません
+※（作成後に追加された商品は、再作成されるまで未登録と判定されます）
+
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+
+from common.snapshot import SnapshotCache
+
+# ログ出力の設定
+logger = logging.getLogger()
+
+# チェックディジットを検証するか
+CHECK_DIGIT = os.environ.get('BARCODE_CHECK_DIGIT', 'true').lower() == 'true'
+# Bloomフィルタの取得方法（off:使用しない、file:ファイル、table:商品マスタから作成）
+FILTER_MODE = os.environ.get('BARCODE_FILTER_MODE', 'off').lower()
+# Bloomフィルタのファイルパス（file の場合）
+FILTER_PATH = os.environ.get('BARCODE_FILTER_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'barcode_filter.bin')
+# 目標とする偽陽性率・最大メモリ使用量（超える場合は偽陽性率が上がります）
+FILTER_ERROR_RATE = float(os.environ.get('BARCODE_FILTER_ERROR_RATE', 0.001))
+FILTER_MAX_BYTES = int(
+    os.environ.get('BARCODE_FILTER_MAX_BYTES', 4 * 1024 * 1024))
+# 商品マスタから作成したBloomフィルタの再作成間隔・最大保持期間（秒）
+FILTER_TTL_SECONDS = float(os.environ.get('BARCODE_FILTER_TTL_SECONDS', 300))
+FILTER_MAX_AGE_SECONDS = float(
+    os.environ.get('BARCODE_FILTER_MAX_AGE_SECONDS', 3600))
+
+# バーコードの桁数（JAN-8・UPC-A・JAN-13）
+BARCODE_LENGTHS = frozenset([8, 12, 13])
+
+MAGIC = b'SRBF'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHQQd')
+
+
+def is_valid_check_digit(barcode):
+    """
+    チェックディジット（モジュラス10・ウェイト3-1）を検証する
+
+    Parameters
+    ----------
+    barcode : str
+        バーコードナンバー（8・12・13桁）
+
+    Returns
+    -------
+    valid : bool
+        桁数・チェックディジットが正しい場合はTrue
+    """
+    if len(barcode) not in BARCODE_LENGTHS or not barcode.isdigit() \
+            or not barcode.isascii():
+        return False
+    # チェックディジットの左隣から順にウェイト3・1を掛けて合計する
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1)
+                for i, digit in enumerate(reversed(barcode[:-1])))
+    return (10 - total % 10) % 10 == int(barcode[-1])
+
+
+class BloomFilter:
+    """Bloomフィルタ"""
+    __slots__ = ['bits', 'hashes', 'count', 'error_rate', '_array']
+
+    def __init__(self, bits, hashes, error_rate=None, array=None, count=0):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        bits : int
+            ビット数
+        hashes : int
+            ハッシュ関数の数
+        error_rate : float, optional
+            目標とした偽陽性率, by default None
+        array : bytearray, optional
+            ビット配列, by default None（全ビット0）
+        count : int, optional
+            登録件数, by default 0
+        """
+        self.bits = bits
+        self.hashes = hashes
+        self.error_rate = error_rate
+        self.count = count
+        self._array = array if array is not None \
+            else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=FILTER_ERROR_RATE,
+                     max_bytes=FILTER_MAX_BYTES):
+        """
+        登録件数と偽陽性率からBloomフィルタを生成する
+
+        Parameters
+        ----------
+        capacity : int
+            登録件数
+        error_rate : float, optional
+            目標とする偽陽性率, by default FILTER_ERROR_RATE
+        max_bytes : int, optional
+            最大メモリ使用量（バイト）, by default FILTER_MAX_BYTES
+
+        Returns
+        -------
+        bloom_filter : BloomFilter
+            Bloomフィルタ
+        """
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        bits = max(8, min(bits, max_bytes * 8))
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        return cls(bits, hashes, error_rate)
+
+    @classmethod
+    def from_barcodes(cls, barcodes, error_rate=FILTER_ERROR_RATE,
+                      max_bytes=FILTER_MAX_BYTES):
+        """
+        バーコードのリストからBloomフィルタを作成する
+
+        Parameters
+        ----------
+        barcodes : iterable
+            バーコードナンバー
+        error_rate : float, optional
+            目標とする偽陽性率, by default FILTER_ERROR_RATE
+        max_bytes : int, optional
+            最大メモリ使用量（バイト）, by default FILTER_MAX_BYTES
+
+        Returns
+        -------
+        bloom_filter : BloomFilter
+            Bloomフィルタ
+        """
+        barcodes = set(str(barcode) for barcode in barcodes)
+        bloom_filter = cls.for_capacity(len(barcodes), error_rate, max_bytes)
+        for barcode in barcodes:
+            bloom_filter.add(barcode)
+        return bloom_filter
+
+    def _positions(self, barcode):
+        # 2つのハッシュ値の線形結合でk個の位置を求める（ダブルハッシュ法）
+        digest = hashlib.blake2b(barcode.encode('utf-8'),
+                                 digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, barcode):
+        """
+        バーコードを登録する
+
+        Parameters
+        ----------
+        barcode : str
+            バーコードナンバー
+        """
+        for position in self._positions(barcode):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, barcode):
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(barcode))
+
+    def expected_error_rate(self):
+        """
+        登録件数から見込まれる偽陽性率を算出する
+
+        Returns
+        -------
+        error_rate : float
+            偽陽性率
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) \
+            ** self.hashes
+
+    def stats(self):
+        """
+        Bloomフィルタのサイズ・偽陽性率を取得する
+
+        Returns
+        -------
+        stats : dict
+            件数・ビット数・バイト数・ハッシュ関数の数・偽陽性率
+        """
+        return {
+            'count': self.count,
+            'bits': self.bits,
+            'bytes': len(self._array),
+            'hashes': self.hashes,
+            'targetErrorRate': self.error_rate,
+            'expectedErrorRate': round(self.expected_error_rate(), 6),
+        }
+
+    def save(self, path):
+        """
+        ファイルに保存する
+
+        Parameters
+        ----------
+        path : str
+            出力先のパス
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.hashes,
+                                self.bits, self.count,
+                                self.error_rate or 0.0))
+            f.write(self._array)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        ファイルから読み込む
+
+        Parameters
+        ----------
+        path : str
+            ファイルパス
+
+        Returns
+        -------
+        bloom_filter : BloomFilter
+            Bloomフィルタ
+
+        Raises
+        ------
+        ValueError
+            ファイルの形式が不正な場合
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError('%s: too short' % path)
+        magic, format_version, hashes, bits, count, error_rate = \
+            HEADER.unpack_from(data)
+        array = bytearray(data[HEADER.size:])
+        if magic != MAGIC or format_version != FORMAT_VERSION \
+                or len(array) != (bits + 7) // 8:
+            raise ValueError('%s: unsupported format' % path)
+        return cls(bits, hashes, error_rate or None, array, count)
+
+
+class BarcodePrefilter:
+    """
+    バーコードの事前チェッククラス
+    ※テーブルを参照せずに、読み取りミスや未登録のバーコードを判定します
+    """
+    __slots__ = ['check_digit', '_bloom_filter', '_snapshot', '_lock',
+                 '_counters']
+
+    def __init__(self, check_digit=CHECK_DIGIT, bloom_filter=None,
+                 barcode_loader=None, ttl=FILTER_TTL_SECONDS,
+                 max_age=FILTER_MAX_AGE_SECONDS):
+        """
+        初期化メソッド
+
+        Parameters
+        ----------
+        check_digit : bool, optional
+            チェックディジットを検証する場合はTrue, by default CHECK_DIGIT
+        bloom_filter : BloomFilter, optional
+            使用するBloomフィルタ, by default None
+        barcode_loader : callable, optional
+            登録済みのバーコードを返す関数, by default None
+            指定した場合はBloomフィルタを作成し、ttl秒ごとに再作成します
+        ttl : float, optional
+            Bloomフィルタの再作成間隔（秒）, by default FILTER_TTL_SECONDS
+        max_age : float, optional
+            Bloomフィルタの最大保持期間（秒）, by default FILTER_MAX_AGE_SECONDS
+        """
+        self.check_digit = check_digit
+        self._bloom_filter = bloom_filter
+        self._snapshot = None
+        if barcode_loader is not None:
+            def load():
+                bloom_filter = BloomFilter.from_barcodes(barcode_loader())
+                logger.info('バーコードのBloomフィルタを作成しました: %s',
+                            bloom_filter.stats())
+                return bloom_filter
+            self._snapshot = SnapshotCache(
+                'barcode filter', load, ttl=ttl, max_age=max_age)
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ['checked', 'invalidCheckDigit', 'unknown', 'passed',
+             'filterUnavailable'], 0)
+
+    @classmethod
+    def from_environment(cls, barcode_loader=None):
+        """
+        環境変数の設定から事前チェッククラスを生成する
+
+        Parameters
+        ----------
+        barcode_loader : callable, optional
+            登録済みのバーコードを返す関数（BARCODE_FILTER_MODE=table の場合）
+
+        Returns
+        -------
+        prefilter : BarcodePrefilter
+            事前チェッククラス
+        """
+        if FILTER_MODE == 'file':
+            try:
+                bloom_filter = BloomFilter.load(FILTER_PATH)
+            except (OSError, ValueError) as e:
+                logger.warning('バーコードのBloomフィルタを読み込めません: %s', e)
+                return cls()
+            logger.info('バーコードのBloomフィルタを読み込みました: %s',
+                        bloom_filter.stats())
+            return cls(bloom_filter=bloom_filter)
+        if FILTER_MODE == 'table' and barcode_loader is not None:
+            return cls(barcode_loader=barcode_loader)
+        return cls()
+
+    def _get_filter(self):
+        if self._snapshot is None:
+            return self._bloom_filter
+        try:
+            self._bloom_filter = self._snapshot.get().data
+            return self._bloom_filter
+        except Exception as e:
+            # 作成できない場合は絞り込まずにテーブルを参照させる
+            logger.warning('バーコードのBloomフィルタを作成できません: %s', e)
+            return None
+
+    def _count(self, name):
+        with self._lock:
+            self._counters['checked'] += 1
+            self._counters[name] += 1
+
+    def check(self, barcode):
+        """
+        バーコードが登録されている可能性があるか判定する
+
+        Parameters
+        ----------
+        barcode : str
+            バーコードナンバー
+
+        Returns
+        -------
+        reason : str
+            登録されていないと判定した理由
+            （invalidCheckDigit:チェックディジット不正、unknown:未登録）
+            登録されている可能性がある場合はNone
+        """
+        barcode = str(barcode)
+        if self.check_digit and not is_valid_check_digit(barcode):
+            self._count('invalidCheckDigit')
+            return 'invalidCheckDigit'
+        bloom_filter = self._get_filter()
+        if bloom_filter is None:
+            self._count('passed' if self._snapshot is None
+                        else 'filterUnavailable')
+            return None
+        if barcode not in bloom_filter:
+            self._count('unknown')
+            return 'unknown'
+        self._count('passed')
+        return None
+
+    def stats(self):
+        """
+        事前チェックの利用状況を取得する
+
+        Returns
+        -------
+        stats : dict
+            判定結果ごとの件数と、Bloomフィルタのサイズ・偽陽性率
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        bloom_filter = self._bloom_filter
+        stats['filter'] = bloom_filter.stats() if bloom_filter else None
+        return stats
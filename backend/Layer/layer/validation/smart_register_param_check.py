@@ -1,5 +1,26 @@
+import re
+
+from common import utils
 from validation.param_check import ParamCheck
 
+# 注文履歴取得APIで指定可能な属性名
+# ※orderDateTimeはuserId-orderId-index（全件・orderId指定時）の射影属性では
+# ※ないため、limit・cursor指定時（テーブルから取得）のみ返却されます
+ORDER_INFO_FIELDS = (
+    'orderId', 'userId', 'orderDateTime', 'paidDateTime', 'amount', 'item',
+    'discountWay', 'discountRate',
+)
+# 注文履歴の要約（summary=true）で指定可能な属性名
+# （userId-orderDateTime-indexの射影属性）
+ORDER_SUMMARY_FIELDS = (
+    'orderId', 'orderDateTime', 'paidDateTime', 'amount', 'discountWay',
+    'discountRate', 'itemCount',
+)
+# 注文履歴取得APIの1ページあたりの最大件数
+ORDER_PAGE_MAX_LIMIT = 100
+# 注文履歴のカーソル（userId-orderDateTime-indexのLastEvaluatedKey）の属性名
+ORDER_CURSOR_KEYS = frozenset(['orderId', 'userId', 'orderDateTime'])
+
 
 class SmartRegisterParamCheck(ParamCheck):
     def __init__(self, params):
@@ -7,6 +28,12 @@ class SmartRegisterParamCheck(ParamCheck):
         self.order_id = params['orderId'] if 'orderId' in params else None
         self.items = params['items'] if 'items' in params else None  # noqa:E501
         self.transaction_id = params['transactionId'] if 'transactionId' in params else None  # noqa:E501
+        self.fields = params['fields'] if 'fields' in params else None
+        self.limit = params['limit'] if 'limit' in params else None
+        self.cursor = params['cursor'] if 'cursor' in params else None
+        self.order = params['order'] if 'order' in params else None
+        self.summary = params['summary'] if 'summary' in params else None
+        self.user_id = params['userId'] if 'userId' in params else None
 
         self.error_msg = []
 
@@ -16,6 +43,12 @@ class SmartRegisterParamCheck(ParamCheck):
         return self.error_msg
 
     def check_api_get_order_info(self):
+        self.check_summary()
+        self.check_fields(ORDER_SUMMARY_FIELDS if self.summary == 'true'
+                          else ORDER_INFO_FIELDS)
+        self.check_limit(ORDER_PAGE_MAX_LIMIT)
+        self.check_order()
+        self.check_cursor(ORDER_CURSOR_KEYS)
 
         return self.error_msg
 
@@ -60,6 +93,54 @@ class SmartRegisterParamCheck(ParamCheck):
         if error := self.check_length(self.transaction_id, 'transactionId', 1, None):  # noqa:E501
             self.error_msg.append(error)
 
+    def check_fields(self, allowed_fields):
+        # 未指定の場合は全属性を返却するためチェック無し
+        if self.fields is None:
+            return
+
+        for field in self.fields.split(','):
+            if not re.fullmatch(r'[A-Za-z0-9_]+', field) \
+                    or field not in allowed_fields:
+                self.error_msg.append(f'形式エラー:fields({field})')
+
+    def check_limit(self, max_limit):
+        # 未指定の場合は既定の件数を使用するためチェック無し
+        if self.limit is None:
+            return
+
+        if not re.fullmatch(r'[0-9]+', self.limit) \
+                or not 1 <= int(self.limit) <= max_limit:
+            self.error_msg.append(f'形式エラー:limit({self.limit})')
+
+    def check_order(self):
+        if self.order is None:
+            return
+
+        if self.order not in ('asc', 'desc'):
+            self.error_msg.append(f'形式エラー:order({self.order})')
+
+    def check_summary(self):
+        if self.summary is None:
+            return
+
+        if self.summary not in ('true', 'false'):
+            self.error_msg.append(f'形式エラー:summary({self.summary})')
+
+    def check_cursor(self, cursor_keys):
+        if self.cursor is None:
+            return
+
+        try:
+            key = utils.decode_cursor(self.cursor)
+        except ValueError:
+            self.error_msg.append('形式エラー:cursor')
+            return
+        # 他ユーザーの注文履歴を指すカーソルは使用不可
+        if set(key) != cursor_keys \
+                or not all(isinstance(value, str) for value in key.values()) \
+                or key['userId'] != self.user_id:
+            self.error_msg.append('形式エラー:cursor')
+
     def check_item(self):
         def check_item_barcode(self, barcode):
             if error := self.check_required(barcode, 'barcode'):
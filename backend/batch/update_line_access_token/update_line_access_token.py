@@ -1,11 +1,9 @@
 import os
 import logging
-import json
-import requests
 from datetime import (datetime, timedelta)
 from dateutil.tz import gettz
 
-from common import common_const as const
+from common import invocation, line
 from common.channel_access_token import ChannelAccessToken
 
 # 環境変数
@@ -44,34 +42,7 @@ def update_limited_channel_access_token(channel_id, channel_access_token):  # no
                                                       limit_date)
 
 
-def get_channel_access_token(channel_id, channel_secret):
-    """
-    LINEチャネルの短期チャネルアクセストークンを新規で取得する
-
-    Returns
-    -------
-    str
-        access_token:短期のチャネルアクセストークン
-    """
-
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    body = {
-        'grant_type': 'client_credentials',
-        'client_id': channel_id,
-        'client_secret': channel_secret
-    }
-
-    response = requests.post(
-        const.const.API_ACCESSTOKEN_URL,
-        headers=headers,
-        data=body
-    )
-    logger.debug('new_channel_access_token %s', response.text)
-    res_body = json.loads(response.text)
-
-    return res_body['access_token']
-
-
+@invocation.handler
 def lambda_handler(event, contexts):
     """
     dbの短期チャネルアクセストークンの期限をチェックし更新する
@@ -91,7 +62,7 @@ def lambda_handler(event, contexts):
                 now = datetime.now(gettz('Asia/Tokyo'))
                 # 本日以前の場合トークン再取得する
                 if limit_date < now:
-                    channel_access_token = get_channel_access_token(
+                    channel_access_token = line.issue_channel_access_token(
                         item['channelId'], item['channelSecret'])
                     # DBのチャネルアクセストークンを更新
                     update_limited_channel_access_token(
@@ -101,7 +72,7 @@ def lambda_handler(event, contexts):
                     channel_access_token = item['channelAccessToken']  # noqa: E501
             # 1度もアクセストークン取得していない場合は新規取得する
             else:
-                channel_access_token = get_channel_access_token(
+                channel_access_token = line.issue_channel_access_token(
                     item['channelId'], item['channelSecret'])
                 update_limited_channel_access_token(
                     item['channelId'], channel_access_token)
@@ -0,0 +1,91 @@
+"""
+IDトークンのローカル検証（common.line.IdTokenVerifier）のテスト
+
+ローカルで生成したES256の鍵でIDトークンを署名し、各ハンドラと同じ
+int型のLIFFチャネルIDで検証する。
+※PyJWT・cryptography（Layer/layer/requirements.txt）が必要です
+
+Usage
+-----
+python -m pytest backend/tests
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+
+from common import common_const, line  # noqa: E402
+
+CHANNEL_ID = 1234567890
+KID = 'test-kid'
+
+
+class IdTokenVerifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.private_key = ec.generate_private_key(ec.SECP256R1())
+        jwk = jwt.algorithms.ECAlgorithm.to_jwk(
+            self.private_key.public_key(), as_dict=True)
+        jwk['kid'] = KID
+        self.key_store = line.SigningKeyStore(
+            fetcher=lambda: {'keys': [jwk]})
+        self.verifier = line.IdTokenVerifier(key_store=self.key_store)
+
+    def sign(self, **claims):
+        payload = {
+            'iss': common_const.const.ID_TOKEN_ISSUER,
+            'sub': 'U0123456789abcdef',
+            'aud': str(CHANNEL_ID),
+            'exp': int(time.time()) + 600,
+            'iat': int(time.time()),
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.private_key, algorithm='ES256',
+                          headers={'kid': KID})
+
+    def test_int_channel_id(self):
+        claims = self.verifier.verify(self.sign(), CHANNEL_ID)
+        self.assertEqual(claims['sub'], 'U0123456789abcdef')
+        # キャッシュからの取得もint型のチャネルIDで成功する
+        claims = self.verifier.verify(self.sign(), CHANNEL_ID)
+        self.assertEqual(claims['sub'], 'U0123456789abcdef')
+
+    def test_other_channel_id(self):
+        result = self.verifier.verify(self.sign(aud='9999999999'), CHANNEL_ID)
+        self.assertEqual(result['error_description'],
+                         'Invalid IdToken Audience.')
+
+    def test_expired(self):
+        result = self.verifier.verify(
+            self.sign(exp=int(time.time()) - 10), CHANNEL_ID)
+        self.assertEqual(result['error_description'], 'IdToken expired.')
+
+    def test_unexpected_error_is_undecidable(self):
+        token = self.sign()
+        with mock.patch.object(line.SigningKeyStore, 'get_key',
+                               return_value=object()):
+            with self.assertRaises(line.IdTokenUndecidable):
+                self.verifier.verify(token, CHANNEL_ID)
+
+    def test_get_profile_falls_back_to_verify_api(self):
+        token = self.sign()
+        response = mock.Mock(text='{"sub": "U0123456789abcdef"}')
+        with mock.patch.object(line, '_id_token_verifier', self.verifier), \
+                mock.patch.object(line.SigningKeyStore, 'get_key',
+                                  return_value=object()), \
+                mock.patch.object(line.http_client, 'post',
+                                  return_value=response) as post:
+            profile = line.get_profile(token, CHANNEL_ID)
+        self.assertEqual(profile['sub'], 'U0123456789abcdef')
+        post.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
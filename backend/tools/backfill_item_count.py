@@ -0,0 +1,67 @@
+"""
+購入点数（itemCount）移行ツール
+
+注文情報テーブルを並列scanし、購入点数（itemCount）が未登録の注文情報に
+注文明細（item）の数量の合計を登録する。
+購入点数は注文履歴の要約（get_order_info の summary=true）で返却するため、
+購入点数の追加前に登録された注文情報に対して1回実行する。
+※注文情報の登録・更新時は SmartRegisterOrderInfo が購入点数を登録します
+※実行には注文情報テーブルへの読み込み・書き込み権限が必要です
+
+Usage
+-----
+# 更新対象の件数のみ確認する
+python backfill_item_count.py SmaRegiOrderInfo --dry-run
+
+# 8分割の並列scanで移行する
+python backfill_item_count.py SmaRegiOrderInfo --segments 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+from smart_register.smart_register_order_info import (  # noqa: E402
+    SmartRegisterOrderInfo, count_items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('table_name', help='注文情報テーブル名')
+    parser.add_argument('--segments', type=int, default=4,
+                        help='並列scanの分割数')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='更新せずに対象件数のみ出力する')
+    args = parser.parse_args()
+    os.environ['LINE_PAY_ORDER_INFO_DB'] = args.table_name
+
+    table = SmartRegisterOrderInfo()
+    start = time.perf_counter()
+    scanned = updated = skipped = 0
+    for order in table.scan_all(total_segments=args.segments):
+        scanned += 1
+        if 'itemCount' in order or 'item' not in order:
+            continue
+        if args.dry_run:
+            updated += 1
+            continue
+        try:
+            table.update_item_count(order['orderId'],
+                                    count_items(order['item']))
+        except Exception as e:
+            # 移行中にTTLで削除された注文情報は対象外
+            print(f'skip {order["orderId"]}: {e}')
+            skipped += 1
+            continue
+        updated += 1
+
+    action = 'to update' if args.dry_run else 'updated'
+    print(f'scanned {scanned}, {action} {updated}, skipped {skipped} '
+          f'({time.perf_counter() - start:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
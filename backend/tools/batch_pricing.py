@@ -0,0 +1,419 @@
+"""
+クーポン適用シミュレーション用 一括金額計算ツール
+
+過去の注文データを列指向のNumPy配列に読み込み、商品単位・合計金額の
+クーポン割引（DISCOUNT_BY_PRICE / DISCOUNT_BY_PERCENTAGE）を
+ベクトル演算でまとめて計算する。
+計算結果は put_cart_data の calc_amount（common.pricing）と一致する。
+※金額の加算順序を calc_amount と揃えるため、カート内の明細は
+※1列ずつ順番に加算しています
+※配列への読み込みは calc_amount による1回分の計算より時間がかかるため、
+※読み込んだ配列で複数のクーポンルールを比較する場合に効果があります
+※（--benchmark で読み込みを含めた所要時間と損益分岐のルール数を出力します）
+
+Usage
+-----
+# エクスポートした注文データを、記録済みのクーポンのまま再計算する
+python batch_pricing.py orders.jsonl
+
+# 候補のクーポンルールで再計算し、結果をCSVに出力する
+python batch_pricing.py orders.jsonl --rules rules.json --output result.csv
+
+# calc_amount とのベンチマーク（ランダムな注文データを使用）
+python batch_pricing.py --synthetic 100000 --benchmark
+
+rules.json の形式
+-----------------
+{
+  "items": {"<barcode>": {"discountWay": 1, "discountRate": 10}},
+  "coupons": {"<couponId>": {"discountWay": 2, "discountRate": 20}},
+  "cartCoupon": {"discountWay": 1, "discountRate": 5}
+}
+- items   : 対象バーコードの明細に適用する（couponsより優先）
+- coupons : 明細に記録されたクーポンIDに適用する
+- cartCoupon : 全注文の合計金額に適用する（null の場合は合計割引なし）
+ルールを指定した場合、注文に記録済みの割引は使用しない。
+"""
+import argparse
+import csv
+import functools
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+from common.pricing import (  # noqa: E402
+    calc_amount, DISCOUNT_BY_PERCENTAGE, DISCOUNT_BY_PRICE)
+import dynamodb_export  # noqa: E402
+
+
+class CartBatch:
+    """
+    複数カートの明細を (カート数, 最大明細数) の2次元配列で保持するクラス
+    ※明細数が最大明細数に満たないカートは、価格・数量0で埋めます
+    """
+
+    def __init__(self, orders):
+        """
+        注文情報のリストから配列を生成する
+
+        Parameters
+        ----------
+        orders : list
+            注文情報（orderId, item, discountWay, discountRate, amount）
+        """
+        self.orders = orders
+        cart_count = len(orders)
+        order_items = [order.get('item') or [] for order in orders]
+        line_counts = np.array([len(items) for items in order_items],
+                               dtype=np.int64)
+        shape = (cart_count, int(line_counts.max(initial=0)))
+
+        # 明細を1次元のリストに展開し、列ごとに1回で配列に変換する
+        # ※要素ごとに2次元配列へ代入すると、calc_amountの計算より遅くなるため
+        # ※明細の位置（行: カート、列: 明細の順番）は添字の配列でまとめて代入します
+        self._lines = [item for items in order_items for item in items]
+        self._rows = np.repeat(np.arange(cart_count), line_counts)
+        self._columns = np.arange(len(self._lines)) - np.repeat(
+            np.cumsum(line_counts) - line_counts, line_counts)
+        self._shape = shape
+
+        self.order_ids = [order.get('orderId') for order in orders]
+        self.recorded_amounts = np.array(
+            [order.get('amount') or 0 for order in orders], dtype=np.float64)
+        self.prices = self._to_matrix(np.array(
+            [item['itemPrice'] for item in self._lines], dtype=np.float64))
+        self.quantities = self._to_matrix(np.array(
+            [item['quantity'] for item in self._lines], dtype=np.float64))
+        # 注文時に記録された割引（discountWay未設定の明細は0）
+        self.line_ways = self._to_matrix(np.array(
+            [item.get('discountWay') or 0 for item in self._lines],
+            dtype=np.int64))
+        self.line_rates = self._to_matrix(np.array(
+            [item.get('discountRate') or 0 if 'discountWay' in item else 0
+             for item in self._lines], dtype=np.float64))
+        self.cart_ways = np.array(
+            [order.get('discountWay') or 0 for order in orders],
+            dtype=np.int64)
+        self.cart_rates = np.array(
+            [order.get('discountRate') or 0 if order.get('discountWay')
+             else 0 for order in orders], dtype=np.float64)
+
+    def _to_matrix(self, values):
+        """
+        明細単位の1次元配列を (カート数, 最大明細数) の2次元配列に変換する
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            明細単位の値
+
+        Returns
+        -------
+        matrix : numpy.ndarray
+            2次元配列（明細のない要素は0、object型の場合はNone）
+        """
+        matrix = np.zeros(self._shape, dtype=values.dtype)
+        if values.dtype == object:
+            matrix.fill(None)
+        matrix[self._rows, self._columns] = values
+        return matrix
+
+    @functools.cached_property
+    def barcodes(self):
+        """バーコード（クーポンルールの適用時のみ使用するため初回参照時に生成）"""
+        return self._to_matrix(np.array(
+            [item.get('barcode') for item in self._lines], dtype=object))
+
+    @functools.cached_property
+    def coupon_ids(self):
+        """クーポンID（クーポンルールの適用時のみ使用するため初回参照時に生成）"""
+        return self._to_matrix(np.array(
+            [item.get('couponId') for item in self._lines], dtype=object))
+
+    def __len__(self):
+        return len(self.orders)
+
+    def discounts(self, rules=None):
+        """
+        明細ごと・カートごとに適用する割引を求める
+
+        Parameters
+        ----------
+        rules : dict, optional
+            クーポンルール, by default None（記録済みの割引を使用）
+
+        Returns
+        -------
+        discounts : tuple
+            (明細の割引種別, 明細の割引率/額, カートの割引種別, カートの割引率/額)
+        """
+        if rules is None:
+            return (self.line_ways, self.line_rates,
+                    self.cart_ways, self.cart_rates)
+
+        line_ways = np.zeros_like(self.line_ways)
+        line_rates = np.zeros_like(self.line_rates)
+        # クーポンID単位のルールを適用したのち、バーコード単位のルールで上書き
+        for column, rule_key in ((self.coupon_ids, 'coupons'),
+                                 (self.barcodes, 'items')):
+            for key, rule in (rules.get(rule_key) or {}).items():
+                mask = column == key
+                line_ways[mask] = _to_way(rule['discountWay'])
+                line_rates[mask] = _to_float(rule['discountRate'])
+
+        cart_rule = rules.get('cartCoupon') or {}
+        cart_ways = np.full(len(self), _to_way(cart_rule.get('discountWay')),
+                            dtype=np.int64)
+        cart_rates = np.full(len(self),
+                             _to_float(cart_rule.get('discountRate')))
+        return line_ways, line_rates, cart_ways, cart_rates
+
+
+def price_batch(batch, rules=None):
+    """
+    カートの合計金額をベクトル演算で一括計算する
+
+    Parameters
+    ----------
+    batch : CartBatch
+        カートの配列
+    rules : dict, optional
+        クーポンルール, by default None（記録済みの割引を使用）
+
+    Returns
+    -------
+    amounts : numpy.ndarray
+        カートごとの合計金額（int64）
+    """
+    line_ways, line_rates, cart_ways, cart_rates = batch.discounts(rules)
+
+    # 商品単位割引計算
+    prices = batch.prices
+    prices = np.where(line_ways == DISCOUNT_BY_PRICE,
+                      prices - line_rates, prices)
+    prices = np.where(line_ways == DISCOUNT_BY_PERCENTAGE,
+                      prices * (1 - line_rates * 0.01), prices)
+    line_amounts = prices * batch.quantities
+
+    # calc_amountと同じ順序で明細を加算する
+    amounts = np.zeros(len(batch))
+    for j in range(line_amounts.shape[1]):
+        amounts = amounts + line_amounts[:, j]
+
+    # 全体割引計算
+    amounts = np.where(cart_ways == DISCOUNT_BY_PRICE,
+                       amounts - cart_rates, amounts)
+    amounts = np.where(cart_ways == DISCOUNT_BY_PERCENTAGE,
+                       amounts * (1 - cart_rates * 0.01), amounts)
+    amounts = np.floor(amounts)
+    # 0以下の場合は０円とする
+    return np.where(amounts <= 0, 0, amounts).astype(np.int64)
+
+
+def price_orders_scalar(orders, rules=None):
+    """
+    calc_amountで1カートずつ合計金額を計算する（比較用）
+
+    Parameters
+    ----------
+    orders : list
+        注文情報のリスト
+    rules : dict, optional
+        クーポンルール, by default None（記録済みの割引を使用）
+
+    Returns
+    -------
+    amounts : list
+        カートごとの合計金額
+    """
+    amounts = []
+    for order in orders:
+        order_items, cart_way, cart_rate = _apply_rules(order, rules)
+        amounts.append(int(calc_amount(order_items, cart_way, cart_rate)))
+    return amounts
+
+
+def _apply_rules(order, rules):
+    # put_cart_data.set_order_item と同じ形式の明細を組み立てる
+    if rules is None:
+        return (order.get('item') or [], order.get('discountWay'),
+                order.get('discountRate'))
+
+    order_items = []
+    for item in order.get('item') or []:
+        order_item = {
+            'itemPrice': item['itemPrice'],
+            'quantity': item['quantity'],
+        }
+        rule = ((rules.get('items') or {}).get(item.get('barcode'))
+                or (rules.get('coupons') or {}).get(item.get('couponId')))
+        if rule:
+            order_item['discountWay'] = rule['discountWay']
+            order_item['discountRate'] = rule['discountRate']
+        order_items.append(order_item)
+    cart_rule = rules.get('cartCoupon') or {}
+    return (order_items, cart_rule.get('discountWay'),
+            cart_rule.get('discountRate'))
+
+
+def _to_float(value):
+    return 0.0 if value is None else float(value)
+
+
+def _to_way(value):
+    return 0 if value is None else int(value)
+
+
+def synthetic_orders(count, seed=0):
+    """
+    ベンチマーク用のランダムな注文データを生成する
+
+    Parameters
+    ----------
+    count : int
+        生成する注文数
+    seed : int, optional
+        乱数シード, by default 0
+
+    Returns
+    -------
+    orders : list
+        注文情報のリスト
+    """
+    rnd = random.Random(seed)
+    coupons = {
+        'c_price': (DISCOUNT_BY_PRICE, 20),
+        'c_percent': (DISCOUNT_BY_PERCENTAGE, 15),
+    }
+    orders = []
+    for i in range(count):
+        items = []
+        for _ in range(rnd.randint(1, 30)):
+            item = {
+                'barcode': '49%011d' % rnd.randint(0, 500),
+                'itemPrice': rnd.choice([50, 98, 100, 128, 198, 298, 1980]),
+                'quantity': rnd.randint(1, 5),
+                'couponId': None,
+            }
+            if rnd.random() < 0.2:
+                coupon_id = rnd.choice(list(coupons))
+                item['couponId'] = coupon_id
+                item['discountWay'], item['discountRate'] = coupons[coupon_id]
+            items.append(item)
+        order = {'orderId': 'synthetic-%d' % i, 'item': items,
+                 'discountWay': None, 'discountRate': None}
+        if rnd.random() < 0.1:
+            order['discountWay'], order['discountRate'] = rnd.choice(
+                [(DISCOUNT_BY_PRICE, 100), (DISCOUNT_BY_PERCENTAGE, 7)])
+        order['amount'] = int(calc_amount(
+            items, order['discountWay'], order['discountRate']))
+        orders.append(order)
+    return orders
+
+
+def benchmark(orders, rules, repeat):
+    """
+    calc_amountとのベンチマークを行い、結果の一致を確認する
+
+    Parameters
+    ----------
+    orders : list
+        注文情報のリスト
+    rules : dict
+        クーポンルール
+    repeat : int
+        計測回数（最速値を採用）
+    """
+    scalar_seconds = load_seconds = vector_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scalar = price_orders_scalar(orders, rules)
+        scalar_seconds = min(scalar_seconds, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch = CartBatch(orders)
+        load_seconds = min(load_seconds, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        vector = price_batch(batch, rules)
+        vector_seconds = min(vector_seconds, time.perf_counter() - start)
+
+    # 配列への読み込みも含めた所要時間で比較する
+    total_seconds = load_seconds + vector_seconds
+    mismatches = int(np.count_nonzero(np.array(scalar) != vector))
+    print(f'orders={len(orders)} lines={int(np.count_nonzero(batch.quantities))}')  # noqa: E501
+    print(f'calc_amount loop  : {scalar_seconds:9.4f}s')
+    print(f'load (columnar)   : {load_seconds:9.4f}s')
+    print(f'vectorized        : {vector_seconds:9.4f}s')
+    print(f'load + vectorized : {total_seconds:9.4f}s '
+          f'(x{scalar_seconds / max(total_seconds, 1e-9):.1f})')
+    # 読み込み済みの配列は複数のクーポンルールで再利用できるため、
+    # 何通りのルールを計算すると calc_amount より速くなるかを出力する
+    if scalar_seconds > vector_seconds:
+        rule_sets = math.ceil(load_seconds / (scalar_seconds - vector_seconds))
+        print(f'break-even        : {rule_sets} rule sets per load')
+    print(f'mismatches        : {mismatches}')
+    if mismatches:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('paths', nargs='*',
+                        help='エクスポートした注文データ（ファイル・ディレクトリ）')
+    parser.add_argument('--rules', help='クーポンルールのJSONファイル')
+    parser.add_argument('--output', help='注文ごとの計算結果を出力するCSVファイル')
+    parser.add_argument('--synthetic', type=int,
+                        help='ランダムな注文データを指定件数生成して使用する')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='calc_amountとのベンチマークを行う')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='ベンチマークの計測回数')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        orders = synthetic_orders(args.synthetic)
+    elif args.paths:
+        orders = [order for order in dynamodb_export.iter_items(args.paths)
+                  if 'item' in order]
+    else:
+        parser.error('paths または --synthetic を指定してください')
+
+    rules = None
+    if args.rules:
+        with open(args.rules, encoding='utf-8') as f:
+            rules = json.load(f)
+
+    if args.benchmark:
+        benchmark(orders, rules, args.repeat)
+        return
+
+    batch = CartBatch(orders)
+    amounts = price_batch(batch, rules)
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['orderId', 'recordedAmount', 'simulatedAmount'])
+            for row in zip(batch.order_ids,
+                           batch.recorded_amounts.astype(np.int64), amounts):
+                writer.writerow(row)
+
+    recorded_total = int(batch.recorded_amounts.sum())
+    simulated_total = int(amounts.sum())
+    print(f'orders           : {len(batch)}')
+    print(f'recorded total   : {recorded_total:,}')
+    print(f'simulated total  : {simulated_total:,}')
+    print(f'difference       : {simulated_total - recorded_total:,}')
+
+
+if __name__ == '__main__':
+    main()
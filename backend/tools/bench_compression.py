@@ -0,0 +1,218 @@
+"""
+レスポンス圧縮ベンチマーク
+
+注文履歴（get_order_info）・クーポン一覧（get_coupons_info）と同じ形式の
+JSONを生成し、圧縮方式・レベルごとに圧縮後のサイズとCPU時間を比較する。
+注文履歴はサンプルデータ（backend/APP/dynamodb_data）の商品・クーポンから
+put_cart_data と同じ明細形式で生成する。
+※brotliは未インストールの場合は計測しません（pip install brotli）
+※「base64」はLambdaからAPI Gatewayに返却するサイズ、「bytes」は
+※API Gatewayがバイナリに戻して送信するサイズです
+
+Usage
+-----
+# 注文件数 10, 50, 200, 1000 件の履歴とクーポン一覧で計測する
+python bench_compression.py
+
+# 注文件数・計測回数を指定し、結果をJSONで出力する
+python bench_compression.py --orders 20,500 --repeat 50 --json result.json
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+from common import utils  # noqa: E402
+import dynamodb_export  # noqa: E402
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'APP', 'dynamodb_data')
+
+# 計測する圧縮方式とレベル
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 11)
+
+
+def load_catalog():
+    """
+    サンプルデータの商品・クーポンを読み込む
+
+    Returns
+    -------
+    items : list
+        商品情報
+    coupons : list
+        クーポン情報
+    """
+    items = list(dynamodb_export.iter_items(
+        [os.path.join(DATA_DIR, 'SmaRegiItemInfo')]))
+    coupons = list(dynamodb_export.iter_items(
+        [os.path.join(DATA_DIR, 'SmaRegiCouponInfo')]))
+    return items, coupons
+
+
+def synthetic_orders(count, items, coupons, seed=0):
+    """
+    1ユーザー分の注文履歴を生成する
+
+    Parameters
+    ----------
+    count : int
+        注文件数
+    items : list
+        商品情報
+    coupons : list
+        クーポン情報
+    seed : int, optional
+        乱数のシード, by default 0
+
+    Returns
+    -------
+    orders : list
+        userId-orderId-indexの射影属性と同じ形式の注文情報
+    """
+    rand = random.Random(seed)
+    user_id = 'U' + uuid.UUID(int=rand.getrandbits(128)).hex
+    coupon_by_barcode = {coupon['barcode']: coupon for coupon in coupons}
+    orders = []
+    for i in range(count):
+        order_items = []
+        amount = 0
+        for item in rand.sample(items, rand.randint(1, len(items))):
+            quantity = rand.randint(1, 3)
+            coupon = coupon_by_barcode.get(item['barcode'])
+            order_item = {
+                'barcode': item['barcode'],
+                'itemName': item['itemName'],
+                'itemPrice': item['itemPrice'],
+                'quantity': quantity,
+                'itemUrl': item['imageUrl'],
+                'couponId': coupon['couponId'] if coupon else None,
+            }
+            if coupon:
+                order_item['discountWay'] = coupon['discountWay']
+                order_item['discountRate'] = coupon['discountRate']
+            order_items.append(order_item)
+            amount += item['itemPrice'] * quantity
+        orders.append({
+            'orderId': str(uuid.UUID(int=rand.getrandbits(128))),
+            'userId': user_id,
+            'paidDateTime': '2024/%02d/%02d %02d:%02d:00' % (
+                i % 12 + 1, i % 28 + 1, i % 24, i % 60),
+            'amount': amount,
+            'item': order_items,
+            'discountWay': 0,
+            'discountRate': 0,
+        })
+    return orders
+
+
+def encoders():
+    """
+    計測する圧縮方式の一覧を取得する
+
+    Returns
+    -------
+    encoders : list
+        (名前, 圧縮関数) のリスト
+    """
+    import gzip
+
+    result = [(f'gzip-{level}',
+               lambda data, level=level: gzip.compress(
+                   data, compresslevel=level, mtime=0))
+              for level in GZIP_LEVELS]
+    brotli = utils._get_brotli()
+    if brotli is not None:
+        result += [(f'br-{quality}',
+                    lambda data, quality=quality: brotli.compress(
+                        data, quality=quality))
+                   for quality in BROTLI_QUALITIES]
+    return result
+
+
+def measure(body, repeat):
+    """
+    1つのレスポンスボディを各方式で圧縮して計測する
+
+    Parameters
+    ----------
+    body : str
+        レスポンスボディ（JSON）
+    repeat : int
+        計測回数（CPU時間は中央値を使用）
+
+    Returns
+    -------
+    results : list
+        方式ごとの {'encoder', 'bytes', 'base64', 'ratio', 'cpuMs'}
+    """
+    data = body.encode('utf-8')
+    results = [{'encoder': 'none', 'bytes': len(data), 'base64': len(data),
+                'ratio': 1.0, 'cpuMs': 0.0}]
+    for name, compress in encoders():
+        samples = []
+        for _ in range(repeat):
+            start = time.process_time()
+            compressed = compress(data)
+            # base64エンコードもLambda内の処理のため含める
+            encoded = base64.b64encode(compressed)
+            samples.append(time.process_time() - start)
+        results.append({
+            'encoder': name,
+            'bytes': len(compressed),
+            'base64': len(encoded),
+            'ratio': round(len(compressed) / len(data), 3),
+            'cpuMs': round(statistics.median(samples) * 1000, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', default='10,50,200,1000',
+                        help='注文件数（カンマ区切り）')
+    parser.add_argument('--repeat', type=int, default=20, help='計測回数')
+    parser.add_argument('--json', metavar='PATH',
+                        help='計測結果をJSONで出力する')
+    args = parser.parse_args()
+
+    items, coupons = load_catalog()
+    bodies = [('coupons', json.dumps(
+        coupons, default=utils.decimal_to_int, ensure_ascii=False))]
+    for count in (int(value) for value in args.orders.split(',')):
+        orders = synthetic_orders(count, items, coupons)
+        bodies.append((f'orders-{count}', json.dumps(
+            orders, default=utils.decimal_to_int, ensure_ascii=False)))
+
+    report = {}
+    print(f'threshold: {utils.COMPRESSION_MIN_BYTES} bytes '
+          f'(gzip level {utils.COMPRESSION_GZIP_LEVEL}, '
+          f'brotli quality {utils.COMPRESSION_BROTLI_QUALITY})')
+    for name, body in bodies:
+        results = measure(body, args.repeat)
+        report[name] = results
+        print(name)
+        for result in results:
+            saved = results[0]['bytes'] - result['bytes']
+            print(f'    {result["encoder"]:<8} {result["bytes"]:>9} bytes '
+                  f'(base64 {result["base64"]:>9}) '
+                  f'ratio {result["ratio"]:5.3f} '
+                  f'cpu {result["cpuMs"]:8.3f}ms '
+                  f'saved {saved:>9} bytes')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+JSON配列のページ単位書き込みベンチマーク
+
+インメモリのDynamoDBに1ユーザー分の注文履歴を登録し、get_order_info の
+レスポンスボディを以下の2つの方法で生成して、ピークメモリ・所要時間を比較する。
+- list: 全件をリストに取得してから json.dumps で変換する（従来の方法）
+- stream: utils.dumps_json_array でページ単位に書き込む
+2つの方法の出力が一致することも確認する（一致しない場合は終了コード1）。
+※注文履歴は bench_compression.py と同じ方法で生成します
+※ピークメモリはtracemallocで計測した、ボディ生成中に確保したメモリです
+
+Usage
+-----
+python bench_json_stream.py
+python bench_json_stream.py --orders 2000 --page-items 100
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+os.environ.setdefault('LINE_PAY_ORDER_INFO_DB', 'SmaRegiOrderInfo')
+
+from aws import resources  # noqa: E402
+from aws.dynamodb.memory import MemoryDynamoDB  # noqa: E402
+from common import utils  # noqa: E402
+from smart_register.smart_register_order_info import SmartRegisterOrderInfo  # noqa: E402,E501
+from bench_compression import load_catalog, synthetic_orders  # noqa: E402
+
+
+def setup_orders(count, page_items):
+    """
+    インメモリのテーブルに注文履歴を登録する
+
+    Parameters
+    ----------
+    count : int
+        注文件数
+    page_items : int
+        1ページで評価する最大件数（1MB制限の模擬）
+
+    Returns
+    -------
+    user_id : str
+        登録した注文のユーザーID
+    """
+    db = MemoryDynamoDB(max_page_items=page_items)
+    db.create_smart_register_tables()
+    resources.register_resource('dynamodb', db)
+    items, coupons = load_catalog()
+    orders = synthetic_orders(count, items, coupons)
+    table = db.Table(os.environ['LINE_PAY_ORDER_INFO_DB'])
+    with table.batch_writer() as writer:
+        for order in orders:
+            writer.put_item(Item=order)
+    return orders[0]['userId']
+
+
+def measure(build):
+    """
+    ボディの生成にかかる時間とピークメモリを計測する
+
+    Parameters
+    ----------
+    build : callable
+        ボディを生成する関数
+
+    Returns
+    -------
+    body : str
+        生成したボディ
+    elapsed : float
+        所要秒数
+    peak : int
+        ピークメモリ（バイト）
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return body, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=1000, help='注文件数')
+    parser.add_argument('--page-items', type=int, default=100,
+                        help='1ページで評価する最大件数')
+    args = parser.parse_args()
+    # tracemallocの計測中は処理が遅くなるため、DynamoDBの遅延ログを抑止する
+    logging.getLogger().setLevel(logging.ERROR)
+
+    user_id = setup_orders(args.orders, args.page_items)
+    table = SmartRegisterOrderInfo()
+
+    def build_list():
+        return json.dumps(table.query_index_hash(user_id),
+                          default=utils.decimal_to_int, ensure_ascii=False)
+
+    def build_stream():
+        return utils.dumps_json_array(table.iter_index_hash_pages(user_id))
+
+    results = {}
+    for name, build in (('list', build_list), ('stream', build_stream)):
+        body, elapsed, peak = measure(build)
+        results[name] = body
+        print(f'{name:<7} {elapsed * 1000:8.1f}ms  peak {peak / 1024:9.1f}KB '
+              f'(body {len(body.encode("utf-8")) / 1024:.1f}KB, '
+              f'{args.orders} orders, {args.page_items} items/page)')
+
+    if results['list'] != results['stream']:
+        print('output mismatch')
+        sys.exit(1)
+    print('output identical')
+
+
+if __name__ == '__main__':
+    main()
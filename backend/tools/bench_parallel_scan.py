@@ -0,0 +1,114 @@
+"""
+並列スキャンの並列度ベンチマーク
+
+指定したテーブルを並列度を変えながら全件scanし、所要時間を比較する。
+
+Usage
+-----
+python bench_parallel_scan.py TABLE_NAME [--segments 1,2,4,8] [--count]
+python bench_parallel_scan.py bench --memory 100000 [--latency 0.02]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+from aws import resources  # noqa: E402
+from aws.dynamodb.base import DynamoDB  # noqa: E402
+from aws.dynamodb.memory import MemoryDynamoDB  # noqa: E402
+
+
+class BenchTable(DynamoDB):
+    """ベンチマーク用テーブル操作クラス"""
+    __slots__ = ['_table']
+
+    def __init__(self, table_name):
+        """初期化メソッド"""
+        super().__init__(table_name)
+        self._table = self._db.Table(table_name)
+
+
+def setup_memory_table(table_name, item_count, latency, page_items):
+    """
+    インメモリのテーブルを作成し、ダミーデータを登録する
+
+    Parameters
+    ----------
+    table_name : str
+        テーブル名
+    item_count : int
+        登録件数
+    latency : float
+        1回の呼び出しごとの遅延秒数
+    page_items : int
+        1ページで評価する最大件数
+    """
+    db = MemoryDynamoDB(max_page_items=page_items)
+    table = db.create_table(table_name, 'orderId')
+    with table.batch_writer() as writer:
+        for i in range(item_count):
+            writer.put_item(Item={
+                'orderId': f'order-{i:09d}', 'userId': f'user-{i % 1000}',
+                'amount': i % 10000})
+    # 登録後に遅延を設定する
+    db.latency = latency
+    resources.register_resource('dynamodb', db)
+
+
+def run(table, segments, count_only):
+    """
+    指定の並列度で全件scanを実行する
+
+    Parameters
+    ----------
+    table : BenchTable
+        テーブル操作クラス
+    segments : int
+        分割数
+    count_only : bool
+        Select='COUNT'で件数のみ取得する場合はTrue
+
+    Returns
+    -------
+    result : tuple
+        (件数, 所要秒数)
+    """
+    start = time.perf_counter()
+    if count_only:
+        count = table._get_table_size(segments)
+    else:
+        count = sum(1 for _ in table._parallel_scan_iter(
+            total_segments=segments))
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('table_name')
+    parser.add_argument('--segments', default='1,2,4,8',
+                        help='カンマ区切りの分割数')
+    parser.add_argument('--count', action='store_true',
+                        help="Select='COUNT'で件数のみ取得する")
+    parser.add_argument('--memory', type=int, default=0,
+                        help='指定件数のインメモリのテーブルで計測する')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='インメモリのテーブルの1ページあたりの遅延秒数')
+    parser.add_argument('--page-items', type=int, default=1000,
+                        help='インメモリのテーブルの1ページあたりの件数')
+    args = parser.parse_args()
+
+    if args.memory:
+        setup_memory_table(args.table_name, args.memory, args.latency,
+                           args.page_items)
+    table = BenchTable(args.table_name)
+    for segments in [int(s) for s in args.segments.split(',')]:
+        count, elapsed = run(table, segments, args.count)
+        print(f'segments={segments:>3} items={count:>9} '
+              f'elapsed={elapsed:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+商品索引（バーコード索引）作成ツール
+
+商品情報（backend/APP/dynamodb_data/SmaRegiItemInfo の形式、または
+DynamoDBのエクスポートデータ）を、Layerに同梱するバイナリ形式の索引に変換する。
+作成した索引は SmartRegisterItemInfo.get_item がDynamoDBより先に参照する。
+--filter を指定すると、商品情報取得APIの事前チェックで使用する
+バーコードのBloomフィルタも作成する（BARCODE_FILTER_MODE=file で使用）。
+※Layerのビルド（sam build）前に実行してください
+※索引バージョンをLambdaの環境変数 ITEM_INDEX_VERSION に設定すると、
+※バージョンが一致しない（古い）索引は使用されません
+
+Usage
+-----
+# サンプルデータから索引を作成する
+python build_barcode_index.py ../APP/dynamodb_data/SmaRegiItemInfo
+
+# エクスポートデータから、バージョンを指定して作成する
+python build_barcode_index.py export/ --version 2024-06-01
+
+# Bloomフィルタも作成する（偽陽性率0.1%）
+python build_barcode_index.py ../APP/dynamodb_data/SmaRegiItemInfo \
+    --filter ../Layer/layer/validation/barcode_filter.bin --error-rate 0.001
+
+# ランダムな商品データで検索速度を計測する
+python build_barcode_index.py --synthetic 1000000 --benchmark
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer'))
+
+from smart_register import barcode_index  # noqa: E402
+from validation.barcode_filter import BloomFilter  # noqa: E402
+import dynamodb_export  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Layer', 'layer',
+    'smart_register', 'item_index.bin')
+
+
+def synthetic_items(count, seed=0):
+    """
+    ランダムな商品データを生成する
+
+    Parameters
+    ----------
+    count : int
+        件数
+    seed : int, optional
+        乱数のシード, by default 0
+
+    Yields
+    -------
+    item : dict
+        商品情報
+    """
+    rand = random.Random(seed)
+    for i in range(count):
+        yield {
+            'barcode': '%013d' % (4900000000000 + i * 7919 % 10 ** 11),
+            'itemName': f'item-{i}',
+            'itemPrice': rand.randint(1, 100) * 10,
+            'imageUrl': f'https://example.com/items/{i}.png',
+        }
+
+
+def benchmark(index, barcodes, lookups):
+    """
+    索引の検索速度を計測する
+
+    Parameters
+    ----------
+    index : BarcodeIndex
+        索引
+    barcodes : list
+        索引に登録したバーコード
+    lookups : int
+        検索回数
+    """
+    rand = random.Random(1)
+    hits = [rand.choice(barcodes) for _ in range(lookups)]
+    misses = ['%013d' % rand.randrange(10 ** 12) for _ in range(lookups)]
+    fields = ['itemName', 'itemPrice', 'imageUrl']
+    for name, targets in (('hit', hits), ('miss', misses)):
+        start = time.perf_counter()
+        for barcode in targets:
+            index.get(barcode, fields)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>5}: {elapsed / lookups * 1e6:8.2f} us/lookup '
+              f'({lookups} lookups, {len(index)} items)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('paths', nargs='*',
+                        help='商品情報のファイルまたはディレクトリ')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='索引ファイルの出力先')
+    parser.add_argument('--version',
+                        help='索引バージョン（省略時は作成日時）')
+    parser.add_argument('--filter', metavar='PATH',
+                        help='バーコードのBloomフィルタの出力先')
+    parser.add_argument('--error-rate', type=float, default=0.001,
+                        help='Bloomフィルタの偽陽性率')
+    parser.add_argument('--max-bytes', type=int, default=4 * 1024 * 1024,
+                        help='Bloomフィルタの最大メモリ使用量（バイト）')
+    parser.add_argument('--synthetic', type=int, metavar='N',
+                        help='ランダムな商品データをN件使用する')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='作成後に検索速度を計測する')
+    parser.add_argument('--lookups', type=int, default=100000,
+                        help='計測時の検索回数')
+    args = parser.parse_args()
+    if not args.paths and not args.synthetic:
+        parser.error('paths or --synthetic is required')
+
+    version = args.version or time.strftime('%Y%m%d%H%M%S')
+    output = args.output
+    temp_dir = None
+    if args.synthetic:
+        items = list(synthetic_items(args.synthetic))
+        # 出力先の指定がない場合はLayerの索引を上書きしない
+        if output == DEFAULT_OUTPUT:
+            temp_dir = tempfile.TemporaryDirectory()
+            output = os.path.join(temp_dir.name, 'item_index.bin')
+    else:
+        items = list(dynamodb_export.iter_items(args.paths))
+
+    start = time.perf_counter()
+    count = barcode_index.write_index(items, output, version)
+    print(f'{count} items -> {output} (version {version}, '
+          f'{os.path.getsize(output)} bytes, '
+          f'{time.perf_counter() - start:.2f}s)')
+
+    if args.filter:
+        bloom_filter = BloomFilter.from_barcodes(
+            (item['barcode'] for item in items if 'barcode' in item),
+            args.error_rate, args.max_bytes)
+        bloom_filter.save(args.filter)
+        print(f'bloom filter -> {args.filter} {bloom_filter.stats()}')
+
+    if args.benchmark:
+        index = barcode_index.BarcodeIndex(output)
+        benchmark(index, [str(item['barcode']) for item in items],
+                  args.lookups)
+        index.close()
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
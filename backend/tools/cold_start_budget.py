@@ -0,0 +1,295 @@
+"""
+コールドスタート予算チェックツール
+
+Lambdaハンドラごとに新しいPythonプロセスを起動してモジュールを読み込み、
+初期化時間（import・モジュール変数の生成）とピークメモリ使用量を計測する。
+cold_start_budget.json の予算を超えたハンドラがある場合は終了コード1で終了する。
+※AWS・LINEへの通信は発生しません
+※（ダミーの認証情報とインメモリのDynamoDB（DYNAMODB_BACKEND=memory）を使用します）
+※-X importtime の結果から、時間のかかったimportをハンドラごとに出力します
+
+Usage
+-----
+# 全ハンドラを計測し、予算と比較する
+python cold_start_budget.py
+
+# 3回計測した中央値で比較し、importの上位20件を出力する
+python cold_start_budget.py --runs 3 --top 20
+
+# 指定のハンドラのみ計測し、結果をJSONで出力する
+python cold_start_budget.py put_cart_data get_item_info --json result.json
+
+cold_start_budget.json の形式
+-----------------------------
+{
+  "default": {"initMs": 400, "peakRssMb": 80},
+  "handlers": {"put_cart_data": {"initMs": 500}}
+}
+- initMs    : モジュール読み込みにかかる時間の上限（ミリ秒）
+- peakRssMb : 読み込み後のピークメモリ使用量の上限（MB）
+※Lambda（MemorySize: 128）はCPU性能が低いため、予算は実環境の時間ではなく
+※開発環境での計測値を基準に、増加を検知できる値を設定しています
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAYER_DIR = os.path.join(BACKEND_DIR, 'Layer', 'layer')
+DEFAULT_BUDGET_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cold_start_budget.json')
+
+# ハンドラ名とモジュールのパス
+HANDLERS = {
+    'get_item_info': 'APP/get_item_info/app.py',
+    'get_coupons_info': 'APP/get_coupons_info/app.py',
+    'get_order_info': 'APP/get_order_info/app.py',
+    'put_cart_data': 'APP/put_cart_data/app.py',
+    'put_linepay_request': 'APP/put_linepay_request/app.py',
+    'put_linepay_confirm': 'APP/put_linepay_confirm/app.py',
+    'send_receipt': 'APP/send_receipt/app.py',
+    'update_line_access_token':
+        'batch/update_line_access_token/update_line_access_token.py',
+}
+
+# 計測用の環境変数（template.yamlの環境変数をダミー値で設定する）
+STUB_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'AWS_ACCESS_KEY_ID': 'dummy',
+    'AWS_SECRET_ACCESS_KEY': 'dummy',
+    'DYNAMODB_BACKEND': 'memory',
+    'LINE_PAY_ITEM_INFO_DB': 'SmaRegiItemInfo',
+    'LINE_PAY_ORDER_INFO_DB': 'SmaRegiOrderInfo',
+    'LINE_PAY_COUPON_INFO_DB': 'SmaRegiCouponInfo',
+    'CHANNEL_ACCESS_TOKEN_DB': 'ChannelAccessToken',
+    'LIFF_CHANNEL_ID': '1234567890',
+    'OA_CHANNEL_ID': '1234567890',
+    'LIFF_URL': 'https://liff.line.me/dummy',
+    'DETAILS_PASS': '/history.html',
+    'CONFIRM_URL_PASS': '/completed.html',
+    'CANCEL_URL': 'https://example.com/',
+    'PAYMENT_IMG_URL': 'https://example.com/payment.png',
+    'LINE_PAY_CHANNEL_ID': 'dummy',
+    'LINE_PAY_CHANNEL_SECRET': 'dummy',
+    'LINE_PAY_IS_SANDBOX': 'true',
+    'TTL': 'False',
+    'TTL_DAY': '1',
+    'LOGGER_LEVEL': 'INFO',
+}
+
+# 子プロセスで実行する計測処理
+BOOTSTRAP = '''
+import importlib.util, json, resource, sys, time
+path, layer_dir = sys.argv[1], sys.argv[2]
+sys.path.insert(0, layer_dir)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('handler_module', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+# ru_maxrssの単位はKB（Linux）
+print(json.dumps({
+    'initMs': elapsed * 1000,
+    'peakRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    -X importtime の出力を解析する
+
+    Parameters
+    ----------
+    stderr : str
+        子プロセスの標準エラー出力
+
+    Returns
+    -------
+    imports : list
+        (モジュール名, 自身の時間(us), 累積時間(us), 階層) のリスト
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split(
+                '|')
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            # 見出し行
+            continue
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((name.strip(), self_us, cumulative_us, depth))
+    return imports
+
+
+def rank_packages(imports, top):
+    """
+    トップレベルのパッケージごとにimport時間を集計し、時間の長い順に並べる
+
+    Parameters
+    ----------
+    imports : list
+        parse_importtimeの結果
+    top : int
+        出力する件数
+
+    Returns
+    -------
+    ranking : list
+        {'package', 'selfMs', 'modules'} のリスト
+    """
+    packages = {}
+    for name, self_us, _, _ in imports:
+        package = packages.setdefault(name.split('.')[0], [0, 0])
+        package[0] += self_us
+        package[1] += 1
+    ranking = sorted(packages.items(), key=lambda item: -item[1][0])[:top]
+    return [{'package': name, 'selfMs': round(self_us / 1000, 1),
+             'modules': count}
+            for name, (self_us, count) in ranking]
+
+
+def measure(handler, runs):
+    """
+    ハンドラのモジュールを新しいプロセスで読み込んで計測する
+
+    Parameters
+    ----------
+    handler : str
+        ハンドラ名
+    runs : int
+        計測回数（初期化時間・メモリは中央値を使用）
+
+    Returns
+    -------
+    result : dict
+        初期化時間・ピークメモリ使用量・モジュール数・import時間の内訳
+    """
+    path = os.path.join(BACKEND_DIR, HANDLERS[handler])
+    env = dict(os.environ, **STUB_ENVIRONMENT)
+    env.pop('PYTHONPATH', None)
+    samples = []
+    imports = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOTSTRAP, path,
+             LAYER_DIR],
+            cwd=os.path.dirname(path), env=env, capture_output=True,
+            text=True)
+        if completed.returncode != 0:
+            raise RuntimeError('%s: %s' % (handler, completed.stderr[-2000:]))
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        imports = parse_importtime(completed.stderr)
+    return {
+        'initMs': round(statistics.median(
+            sample['initMs'] for sample in samples), 1),
+        'peakRssMb': round(statistics.median(
+            sample['peakRssMb'] for sample in samples), 1),
+        'modules': samples[-1]['modules'],
+        'imports': imports,
+    }
+
+
+def load_budget(path):
+    """
+    予算ファイルを読み込む
+
+    Parameters
+    ----------
+    path : str
+        予算ファイルのパス
+
+    Returns
+    -------
+    budget : function
+        ハンドラ名を受け取り、{'initMs', 'peakRssMb'} を返す関数
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    default = config.get('default', {})
+    handlers = config.get('handlers', {})
+    return lambda handler: dict(default, **handlers.get(handler, {}))
+
+
+def check(result, budget):
+    """
+    計測結果が予算内か判定する
+
+    Parameters
+    ----------
+    result : dict
+        measureの結果
+    budget : dict
+        {'initMs', 'peakRssMb'}
+
+    Returns
+    -------
+    violations : list
+        予算を超えた項目の説明
+    """
+    violations = []
+    for name in ('initMs', 'peakRssMb'):
+        if name in budget and result[name] > budget[name]:
+            violations.append(f'{name} {result[name]} > {budget[name]}')
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('handlers', nargs='*',
+                        help='計測するハンドラ（省略時は全ハンドラ）: %s'
+                        % ', '.join(HANDLERS))
+    parser.add_argument('--budget', default=DEFAULT_BUDGET_PATH,
+                        help='予算ファイルのパス')
+    parser.add_argument('--runs', type=int, default=1, help='計測回数')
+    parser.add_argument('--top', type=int, default=10,
+                        help='出力するimportの件数')
+    parser.add_argument('--json', metavar='PATH',
+                        help='計測結果をJSONで出力する')
+    args = parser.parse_args()
+    unknown = [handler for handler in args.handlers
+               if handler not in HANDLERS]
+    if unknown:
+        parser.error('unknown handler: %s' % ', '.join(unknown))
+
+    budget_of = load_budget(args.budget)
+    report = {}
+    failed = []
+    for handler in args.handlers or list(HANDLERS):
+        result = measure(handler, args.runs)
+        budget = budget_of(handler)
+        violations = check(result, budget)
+        ranking = rank_packages(result.pop('imports'), args.top)
+        report[handler] = dict(result, budget=budget, violations=violations,
+                               imports=ranking)
+        status = 'FAIL' if violations else 'ok'
+        print(f'{handler:<26} {status:<4} init {result["initMs"]:7.1f}ms '
+              f'(budget {budget.get("initMs", "-")})  '
+              f'rss {result["peakRssMb"]:6.1f}MB '
+              f'(budget {budget.get("peakRssMb", "-")})  '
+              f'modules {result["modules"]}')
+        for violation in violations:
+            print(f'    over budget: {violation}')
+        for rank, item in enumerate(ranking, 1):
+            print(f'    {rank:2}. {item["package"]:<28} '
+                  f'{item["selfMs"]:7.1f}ms ({item["modules"]} modules)')
+        if violations:
+            failed.append(handler)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if failed:
+        print('over budget: %s' % ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+DynamoDBエクスポートデータ読み込み用モジュール
+
+以下の形式のファイルからアイテムを読み込む。
+- JSON配列、またはJSONオブジェクト（backend/APP/dynamodb_data の形式）
+- JSON Lines（1行1アイテム）
+- DynamoDBのS3エクスポート形式（1行ごとに {"Item": {"属性名": {"S": ...}}}）
+"""
+import glob
+import gzip
+import json
+import os
+from decimal import Decimal
+
+
+def deserialize(value):
+    """
+    DynamoDB JSON形式の属性値をPythonの値に変換する
+
+    Parameters
+    ----------
+    value : dict
+        {"S": "..."} 形式の属性値
+
+    Returns
+    -------
+    result : object
+        変換後の値（数値はDecimal型）
+    """
+    (type_name, data), = value.items()
+    if type_name == 'S':
+        return data
+    if type_name == 'N':
+        return Decimal(data)
+    if type_name == 'BOOL':
+        return data
+    if type_name == 'NULL':
+        return None
+    if type_name == 'L':
+        return [deserialize(v) for v in data]
+    if type_name == 'M':
+        return {k: deserialize(v) for k, v in data.items()}
+    if type_name == 'SS':
+        return set(data)
+    if type_name == 'NS':
+        return {Decimal(v) for v in data}
+    raise ValueError(f'Unsupported attribute type: {type_name}')
+
+
+def _to_item(record):
+    # S3エクスポート形式は {"Item": {...}} で属性値が型付き
+    if set(record) == {'Item'} and isinstance(record['Item'], dict):
+        return {k: deserialize(v) for k, v in record['Item'].items()}
+    return record
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def iter_file(path):
+    """
+    1ファイルからアイテムを1件ずつ読み込む
+
+    Parameters
+    ----------
+    path : str
+        読み込むファイルのパス
+
+    Yields
+    -------
+    item : dict
+        アイテム
+    """
+    with _open(path) as f:
+        first_line = f.readline()
+        while first_line and not first_line.strip():
+            first_line = f.readline()
+        if not first_line:
+            return
+        if first_line.lstrip().startswith('['):
+            records = json.loads(first_line + f.read(), parse_float=Decimal)
+            for record in records:
+                yield _to_item(record)
+            return
+        try:
+            record = json.loads(first_line, parse_float=Decimal)
+        except json.JSONDecodeError:
+            # 整形された単一のJSONオブジェクト
+            yield _to_item(json.loads(first_line + f.read(),
+                                      parse_float=Decimal))
+            return
+        # JSON Lines
+        yield _to_item(record)
+        for line in f:
+            if line.strip():
+                yield _to_item(json.loads(line, parse_float=Decimal))
+
+
+def iter_items(paths):
+    """
+    ファイル・ディレクトリのリストからアイテムを1件ずつ読み込む
+    ※ディレクトリの場合は配下の *.json, *.json.gz, *.jsonl を対象とします
+
+    Parameters
+    ----------
+    paths : list
+        ファイルまたはディレクトリのパス
+
+    Yields
+    -------
+    item : dict
+        アイテム
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                glob.glob(os.path.join(path, '**', '*.json'), recursive=True)
+                + glob.glob(os.path.join(path, '**', '*.json.gz'),
+                            recursive=True)
+                + glob.glob(os.path.join(path, '**', '*.jsonl'),
+                            recursive=True))
+        else:
+            files = [path]
+        for file_path in files:
+            yield from iter_file(file_path)